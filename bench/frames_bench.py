@@ -0,0 +1,79 @@
+# bench/frames_bench.py
+# Microbenchmark : blob encodé en trames binaires (shared/frames.py) vs texte JSON/base64
+# (broadcaster.broadcast_blob_textb64), encodage côté serveur + décodage/réassemblage côté client.
+#
+#   python -m bench.frames_bench                     # tailles 64k, 1m, 10m
+#   python -m bench.frames_bench --sizes 20m --repeat 5
+import argparse, base64, json, os, time, uuid
+
+from livetchat.shared import frames
+from livetchat.server.broadcaster import RAW_B64_CHUNK, FRAME_CHUNK
+
+
+def encode_b64(event_id: str, blob: bytes) -> list[str]:
+    prefix = json.dumps({"type": "image_chunk_b64", "event_id": event_id, "b64": ""})[:-2]
+    view = memoryview(blob)
+    return [prefix + base64.b64encode(view[i:i + RAW_B64_CHUNK]).decode("ascii") + '"}'
+            for i in range(0, len(view), RAW_B64_CHUNK)]
+
+
+def decode_b64(msgs: list[str]) -> bytes:
+    buf = bytearray()
+    for m in msgs:
+        buf.extend(base64.b64decode(json.loads(m)["b64"]))
+    return bytes(buf)
+
+
+def encode_frames(event_id: str, blob: bytes) -> list[bytes]:
+    eid = frames.event_bytes(event_id)
+    view = memoryview(blob)
+    return [frames.encode(frames.CHUNK, eid, n, i, view[i:i + FRAME_CHUNK])
+            for n, i in enumerate(range(0, len(view), FRAME_CHUNK))]
+
+
+def decode_frames(msgs: list[bytes]) -> bytes:
+    buf = bytearray()
+    for m in msgs:
+        f = frames.decode(m)
+        if f.offset != len(buf):
+            raise AssertionError("morceau hors séquence")
+        buf.extend(f.payload)
+    return bytes(buf)
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def parse_size(s: str) -> int:
+    mult = {"k": 1_000, "m": 1_000_000}.get(s[-1].lower(), 1)
+    return int(float(s[:-1] if mult > 1 else s) * mult)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="trames binaires vs JSON/base64")
+    ap.add_argument("--sizes", default="64k,1m,10m")
+    ap.add_argument("--repeat", type=int, default=7)
+    args = ap.parse_args(argv)
+
+    print(f"{'taille':>8} {'codec':>7} {'trames':>7} {'octets fil':>11} {'surcoût':>8} {'encode ms':>10} {'décode ms':>10} {'Mo/s':>8}")
+    for size in map(parse_size, args.sizes.split(",")):
+        blob = os.urandom(size)
+        eid = uuid.uuid4().hex
+        for name, enc, dec in (("b64", encode_b64, decode_b64), ("frames", encode_frames, decode_frames)):
+            msgs = enc(eid, blob)
+            assert dec(msgs) == blob
+            wire = sum(len(m) for m in msgs)
+            t_enc = best_of(lambda: enc(eid, blob), args.repeat)
+            t_dec = best_of(lambda: dec(msgs), args.repeat)
+            print(f"{size:>8} {name:>7} {len(msgs):>7} {wire:>11} {wire / size - 1:>+8.1%} "
+                  f"{t_enc * 1000:>10.2f} {t_dec * 1000:>10.2f} {size / (t_enc + t_dec) / 1e6:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
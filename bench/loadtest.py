@@ -0,0 +1,331 @@
+# bench/loadtest.py
+# Banc de charge reproductible du serveur LiveTchat.
+#
+#   python -m bench.loadtest                          # config par défaut, résultats -> bench/results.json
+#   python -m bench.loadtest --viewers 200 --uploaders 8 --uploads 10 --mix image:150k:0.7,audio:400k:0.3
+#   python -m bench.loadtest --baseline bench/baseline.json          # compare, code retour 1 si régression
+#   python -m bench.loadtest --save-baseline bench/baseline.json     # fige la référence
+#
+# Démarre livetchat.server.main:app via bench/server.py (uvicorn, données dans un dossier temporaire, limiteur coupé),
+# ouvre N viewers WebSocket et M uploaders, puis mesure :
+#  - latence d'upload (HTTP /upload/ complet)
+#  - latence de notice : upload accepté (server_ts_ms de la notice, même horloge que le banc) ->
+#    media_notice reçue par chaque viewer (p50/p95/p99) ; hors temps de transfert, déjà dans upload_ms
+#  - débit /files/* (requêtes/s, Mo/s) avec K lecteurs concurrents
+#  - RSS du serveur (workers compris) : départ, pic, fin
+# Les viewers et uploaders tournent dans ce process : au-delà de quelques centaines de viewers,
+# c'est le banc lui-même qui sature (surveiller sa charge CPU).
+# Dépend de websockets >= 13 (websockets.asyncio.client), cf. requirements-dev.txt.
+import argparse, asyncio, json, os, random, shutil, socket, subprocess, sys, tempfile, time, platform
+
+import requests
+from websockets.asyncio.client import connect
+
+MAGIC = {   # assez pour passer la reconnaissance de contenu de /upload/
+    "image": (".png", b"\x89PNG\r\n\x1a\n"),
+    "video": (".mp4", b"\x00\x00\x00\x18ftypmp42"),
+    "audio": (".mp3", b"ID3\x03\x00\x00\x00\x00\x00\x00"),
+}
+# métrique -> sens (+1 : plus haut = mieux, -1 : plus bas = mieux) pour la comparaison
+COMPARED = {
+    "upload_ms.p50": -1, "upload_ms.p95": -1, "upload_ms.p99": -1,
+    "notice_ms.p50": -1, "notice_ms.p95": -1, "notice_ms.p99": -1,
+    "notice_delivery": +1,
+    "files.req_s": +1, "files.mb_s": +1,
+    "rss_mb.peak": -1,
+}
+
+# ---------------- mesures ----------------
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"n": 0}
+    v = sorted(values)
+    pick = lambda q: v[min(len(v) - 1, int(q * len(v)))]
+    return {"n": len(v), "p50": round(pick(0.50), 2), "p95": round(pick(0.95), 2), "p99": round(pick(0.99), 2),
+            "max": round(v[-1], 2)}
+
+
+def tree_rss_mb(pid: int) -> float:
+    """RSS du process et de ses descendants (uvicorn --workers), via /proc (Linux)."""
+    total, todo = 0, [pid]
+    while todo:
+        p = todo.pop()
+        try:
+            with open(f"/proc/{p}/status") as f:
+                total += next(int(l.split()[1]) for l in f if l.startswith("VmRSS:"))
+            for t in os.listdir(f"/proc/{p}/task"):
+                with open(f"/proc/{p}/task/{t}/children") as f:
+                    todo += [int(c) for c in f.read().split()]
+        except (OSError, StopIteration):
+            continue
+    return total / 1024
+
+
+def parse_size(s: str) -> int:
+    mult = {"k": 1_000, "m": 1_000_000}.get(s[-1].lower(), 1)
+    return int(float(s[:-1] if mult > 1 else s) * mult)
+
+
+def parse_mix(spec: str) -> list[tuple[str, int, float]]:
+    out = []
+    for item in spec.split(","):
+        kind, size, weight = item.split(":")
+        if kind not in MAGIC:
+            raise SystemExit(f"type inconnu dans --mix : {kind}")
+        out.append((kind, parse_size(size), float(weight)))
+    return out
+
+
+def make_payload(kind: str, size: int, rng: random.Random) -> tuple[str, bytes]:
+    ext, magic = MAGIC[kind]
+    return ext, magic + rng.randbytes(max(0, size - len(magic)))   # contenu unique : jamais dédupliqué
+
+
+# ---------------- acteurs ----------------
+class Viewer:
+
+    def __init__(self, url: str, received: dict):
+        self.url = url
+        self.received = received      # filename -> [latences de notice (ms)]
+        self.frames = 0
+        self.bytes = 0
+        self.ready = asyncio.Event()
+
+    async def run(self, stop: asyncio.Event):
+        async with connect(self.url, max_size=None, ping_interval=None) as ws:
+            self.ready.set()
+            while not stop.is_set():
+                try:
+                    msg = await asyncio.wait_for(ws.recv(), 0.5)
+                except asyncio.TimeoutError:
+                    continue
+                now_ms = time.time() * 1000       # horloge murale : comparable à server_ts_ms (même machine)
+                self.frames += 1
+                self.bytes += len(msg)
+                if isinstance(msg, bytes):
+                    continue
+                obj = json.loads(msg)
+                t = obj.get("type")
+                if t == "ping":
+                    await ws.send(json.dumps({"type": "pong", "t": obj.get("t")}))
+                elif t == "media_notice":
+                    self.received.setdefault(obj["filename"], []).append(now_ms - obj["server_ts_ms"])
+                elif t == "media_notice_batch":
+                    for n in obj["notices"]:
+                        self.received.setdefault(n["filename"], []).append(now_ms - n["server_ts_ms"])
+
+
+async def uploader(base: str, count: int, mix, rng: random.Random, interval_s: float, sent: dict, errors: list):
+    session = requests.Session()
+    weights = [w for _, _, w in mix]
+    for i in range(count):
+        kind, size, _ = rng.choices(mix, weights)[0]
+        ext, data = make_payload(kind, size, rng)
+        t0 = time.perf_counter()
+        try:
+            r = await asyncio.to_thread(session.post, f"{base}/upload/",
+                                        files={"file": (f"bench{i}{ext}", data)},
+                                        data={"display_time": "1", "username": "bench"}, timeout=120)
+            t1 = time.perf_counter()
+            if r.ok:
+                sent[r.json()["filename"]] = (kind, t0, t1)
+            else:
+                errors.append(r.status_code)
+        except requests.RequestException as e:
+            errors.append(type(e).__name__)
+        if interval_s:
+            await asyncio.sleep(interval_s)
+
+
+async def files_phase(base: str, sent: dict, readers: int, duration_s: float) -> dict:
+    """K lecteurs en boucle sur les médias uploadés pendant `duration_s` (sans cache HTTP client)."""
+    routes = {"image": "images", "video": "videos", "audio": "audios"}
+    urls = [f"{base}/files/{routes[k]}/{fn}" for fn, (k, _, _) in sent.items()]
+    if not urls:
+        return {"req_s": 0, "mb_s": 0}
+    stats = {"n": 0, "bytes": 0, "errors": 0}
+    deadline = time.perf_counter() + duration_s
+
+    def reader(seed: int):
+        s, rng = requests.Session(), random.Random(seed)
+        while time.perf_counter() < deadline:
+            r = s.get(rng.choice(urls), timeout=60)
+            if r.ok:
+                stats["n"] += 1; stats["bytes"] += len(r.content)
+            else:
+                stats["errors"] += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(asyncio.to_thread(reader, i) for i in range(readers)))
+    dt = time.perf_counter() - t0
+    return {"req_s": round(stats["n"] / dt, 1), "mb_s": round(stats["bytes"] / dt / 1e6, 2),
+            "requests": stats["n"], "errors": stats["errors"]}
+
+
+# ---------------- serveur ----------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, workers: int, data_dir: str) -> subprocess.Popen:
+    overrides = {
+        "IMAGE_DIR": f"{data_dir}/images", "VIDEO_DIR": f"{data_dir}/videos", "AUDIO_DIR": f"{data_dir}/audios",
+        "UPLOAD_TMP_DIR": f"{data_dir}/tmp", "MEDIA_INDEX": f"{data_dir}/index.jsonl",
+        "DOWNLOAD_DIR": f"{data_dir}/download", "BACKPLANE_DIR": f"{data_dir}/backplane",
+        "BACKPLANE": "unix" if workers > 1 else "inprocess",
+        "RATE_UPLOADS_PER_S": 0, "RATE_BYTES_PER_S": 0, "MAX_INFLIGHT_UPLOADS": 0,   # on mesure le serveur, pas le limiteur
+    }
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, LIVETCHAT_BENCH_SETTINGS=json.dumps(overrides))
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "bench.server:app", "--host", "127.0.0.1",
+                             "--port", str(port), "--workers", str(workers), "--no-access-log", "--log-level", "warning"],
+                            cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit("le serveur s'est arrêté :\n" + proc.stderr.read().decode(errors="replace"))
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/metrics", timeout=1).ok:
+                return proc
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise SystemExit("le serveur n'a pas démarré en 30 s")
+
+
+# ---------------- scénario ----------------
+async def run(args) -> dict:
+    mix = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+    data_dir = tempfile.mkdtemp(prefix="livetchat-bench-")
+    port = free_port()
+    base, ws_url = f"http://127.0.0.1:{port}", f"ws://127.0.0.1:{port}/ws"
+    proc = start_server(port, args.workers, data_dir)
+    rss = {"start": tree_rss_mb(proc.pid), "peak": 0.0}
+
+    async def sample_rss(stop):
+        while not stop.is_set():
+            rss["peak"] = max(rss["peak"], tree_rss_mb(proc.pid))
+            await asyncio.sleep(0.2)
+
+    stop = asyncio.Event()
+    received: dict[str, list[float]] = {}
+    sent: dict[str, tuple] = {}
+    errors: list = []
+    try:
+        viewers = [Viewer(ws_url, received) for _ in range(args.viewers)]
+        tasks = [asyncio.create_task(v.run(stop)) for v in viewers]
+        sampler = asyncio.create_task(sample_rss(stop))
+        await asyncio.wait_for(asyncio.gather(*(v.ready.wait() for v in viewers)), 60)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(uploader(base, args.uploads, mix, random.Random(rng.random()), args.interval,
+                                        sent, errors) for _ in range(args.uploaders)))
+        upload_wall = time.perf_counter() - t0
+
+        # attendre les dernières notices (variantes, batch) avant de compter
+        deadline = time.perf_counter() + args.drain
+        while time.perf_counter() < deadline and sum(len(received.get(f, ())) for f in sent) < len(sent) * len(viewers):
+            await asyncio.sleep(0.05)
+
+        files = await files_phase(base, sent, args.readers, args.files_seconds)
+        stop.set()
+        await asyncio.gather(*tasks, sampler, return_exceptions=True)
+        rss["end"] = tree_rss_mb(proc.pid)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    notice_ms = [ms for f in sent for ms in received.get(f, ())]
+    by_kind = {k: percentiles([(sent[f][2] - sent[f][1]) * 1000 for f in sent if sent[f][0] == k])
+               for k, _, _ in mix}
+    expected = len(sent) * len(viewers)
+    return {
+        "config": {k: getattr(args, k) for k in ("viewers", "uploaders", "uploads", "mix", "interval", "readers",
+                                                 "files_seconds", "workers", "seed")},
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "results": {
+            "upload_ms": percentiles([(t1 - t0) * 1000 for _, t0, t1 in sent.values()]),
+            "upload_ms_by_kind": by_kind,
+            "uploads_per_s": round(len(sent) / upload_wall, 2) if upload_wall else 0,
+            "upload_errors": len(errors),
+            "notice_ms": percentiles(notice_ms),
+            "notice_delivery": round(len(notice_ms) / expected, 4) if expected else 0,
+            "ws_frames": sum(v.frames for v in viewers),
+            "ws_mb": round(sum(v.bytes for v in viewers) / 1e6, 2),
+            "files": files,
+            "rss_mb": {k: round(v, 1) for k, v in rss.items()},
+        },
+    }
+
+
+def lookup(results: dict, dotted: str):
+    cur = results
+    for part in dotted.split("."):
+        if not isinstance(cur, dict) or part not in cur:
+            return None
+        cur = cur[part]
+    return cur
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Affiche la comparaison ; renvoie les métriques en régression au-delà de `tolerance`."""
+    regressions = []
+    print(f"\n{'métrique':<22}{'référence':>12}{'mesure':>12}{'écart':>9}")
+    for name, sense in COMPARED.items():
+        old, new = lookup(baseline["results"], name), lookup(results["results"], name)
+        if old is None or new is None:
+            continue
+        delta = (new - old) / old if old else 0.0
+        bad = delta * sense < -tolerance
+        if bad:
+            regressions.append(name)
+        print(f"{name:<22}{old:>12}{new:>12}{delta:>+8.0%}" + ("  <-- régression" if bad else ""))
+    if baseline.get("config") != results.get("config"):
+        print("\n(attention : configuration différente de la référence)")
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Banc de charge LiveTchat")
+    ap.add_argument("--viewers", type=int, default=50, help="connexions WebSocket simulées")
+    ap.add_argument("--uploaders", type=int, default=4, help="uploaders concurrents")
+    ap.add_argument("--uploads", type=int, default=10, help="uploads par uploader")
+    ap.add_argument("--mix", default="image:150k:0.6,audio:400k:0.3,video:3m:0.1",
+                    help="type:taille:poids,... (tailles en octets, k ou m)")
+    ap.add_argument("--interval", type=float, default=0.0, help="pause entre deux uploads d'un uploader (s)")
+    ap.add_argument("--readers", type=int, default=8, help="lecteurs concurrents pour la phase /files/*")
+    ap.add_argument("--files-seconds", type=float, default=5.0, help="durée de la phase /files/*")
+    ap.add_argument("--drain", type=float, default=5.0, help="attente max des dernières notices (s)")
+    ap.add_argument("--workers", type=int, default=1, help="workers uvicorn (>1 : backplane unix)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default="bench/results.json")
+    ap.add_argument("--baseline", help="référence à comparer (code retour 1 si régression)")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="écart toléré avant régression (0.25 = 25%%)")
+    ap.add_argument("--save-baseline", help="écrit aussi les résultats comme nouvelle référence")
+    args = ap.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    for path in filter(None, (args.out, args.save_baseline)):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results["results"], indent=2))
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} régression(s) : {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,11 @@
+# bench/server.py
+# Application du banc : applique les réglages de LIVETCHAT_BENCH_SETTINGS (JSON) avant d'importer
+# le serveur. Importé par chaque worker uvicorn (processus "spawn" qui ne voient pas les patches du parent).
+import json, os
+
+from livetchat.server import settings
+
+for _k, _v in json.loads(os.environ.get("LIVETCHAT_BENCH_SETTINGS", "{}")).items():
+    setattr(settings, _k, _v)
+
+from livetchat.server.main import app  # noqa: E402
@@ -1,19 +1,31 @@
-import json, threading, tempfile
+import json, threading, tempfile, base64, time
 from tkinter import Tk, Label, Button, Entry, StringVar, filedialog, messagebox
 from pathlib import Path
 
-import requests, websocket
-
 from livetchat.shared.version import VERSION
-from livetchat.client.config import load_username_from_config, save_username_to_config, WS_URL, API_BASE
+from livetchat.shared.utils import content_hasher
+from livetchat.shared import frames
+from livetchat.shared.timesync import ClockSync, now_ms, sync_loop
+from livetchat.client.timing import StartupTimer
+
+# Démarrage : fenêtre et connexion WS d'abord. requests / websocket sont importés par les threads
+# qui s'en servent, PIL et VLC (media.py) au premier usage ou par le préchargement de fond.
+STARTUP = StartupTimer(VERSION)
+STARTUP_REPORT_S = 20             # rapport de démarrage forcé si le WS n'est toujours pas connecté
+
+from livetchat.client.config import (load_username_from_config, save_username_to_config, WS_URL, API_BASE,
+                                     RESUMABLE_MIN_BYTES, RESUMABLE_PARALLEL, DOWNLOAD_WORKERS)
+from livetchat.client.downloads import DownloadPool
+from livetchat.client.notices import SeenSeqs
 from livetchat.client.overlays import show_overlay_username_top_left, show_overlay_text_bottom
-from livetchat.client.media import show_image_with_caption, play_video_overlay, play_audio_tempfile
+from livetchat.client.media import show_image_with_caption, play_video_overlay, play_audio_tempfile, warm_up
 
 ALLOWED_IMG_EXT = {".jpg", ".jpeg", ".png", ".gif"}
 ALLOWED_VIDEO_EXT = {".mp4"}
 ALLOWED_AUDIO_EXT = {".mp3", ".wav", ".ogg", ".m4a"}
 
 def main():
+    STARTUP.mark("imports")
     root = Tk()
     root.title("Live Overlay — HTTP upload + WS notif")
 
@@ -46,15 +58,30 @@ def main():
 
     Label(root, textvariable=status_var, fg="gray").grid(row=5, column=0, columnspan=3, sticky="w", padx=6, pady=6)
 
-    from livetchat.client.updater import check_update
-    Button(root, text="Vérifier mise à jour", command=lambda: check_update(VERSION))\
+    Button(root, text="Vérifier mise à jour", command=_check_update)\
         .grid(row=6, column=0, columnspan=3, padx=6, pady=8, sticky="we")
+    root.after_idle(STARTUP.mark, "window")
+    root.after(STARTUP_REPORT_S * 1000, STARTUP.flush)
 
     # Thread WS -> réception des notifications et affichage
-    threading.Thread(target=_ws_listen, args=(root, status_var), daemon=True).start()
+    screen = (root.winfo_screenwidth(), root.winfo_screenheight())
+    threading.Thread(target=_ws_listen, args=(root, status_var, screen), daemon=True).start()
+    # backends média chargés pendant que l'utilisateur regarde la fenêtre
+    threading.Thread(target=_warm_up, daemon=True).start()
 
     root.mainloop()
 
+def _warm_up():
+    t0 = time.perf_counter()
+    import requests  # noqa: F401
+    STARTUP.span("import_requests", t0)
+    warm_up(STARTUP)
+    STARTUP.mark("warm")
+
+def _check_update():
+    from livetchat.client.updater import check_update
+    check_update(VERSION)
+
 def _browse(path_var):
     path = filedialog.askopenfilename(
         title="Choisir un fichier (image/vidéo/audio)",
@@ -83,29 +110,240 @@ def _send_via_http(root, username_var, display_time_var, display_text_var, path_
     save_username_to_config(uname)
     dtext = display_text_var.get() or ""
 
-    # upload HTTP (comme avant)
     status_var.set("Upload…")
+    data = {"display_time": str(dt), "display_text": dtext, "username": uname}
+    # réseau (et hash du fichier) hors du thread Tk : la fenêtre reste vivante et la progression
+    # s'affiche ; le statut revient au thread Tk par root.after
+    status = lambda text: root.after(0, status_var.set, text)
+    threading.Thread(target=_upload, args=(p, data, status), daemon=True).start()
+
+def _upload(p: Path, data: dict, status):
+    import requests
+    sha = _file_sha256(p)
+    try:
+        # le serveur l'a déjà (même contenu) ? -> il diffuse sans qu'on renvoie un octet
+        r = requests.post(f"{API_BASE}/upload/by-hash/", data={**data, "sha256": sha, "filename": p.name},
+                          timeout=15)
+        if r.ok:
+            info = r.json()
+            status(f"✅ Envoyé (déjà sur le serveur): {info.get('filename','?')} ({info.get('kind','?')})")
+            return
+        if r.status_code == 429:
+            status(f"❌ Upload refusé, réessaie dans {r.headers.get('Retry-After', '?')} s"); return
+    except Exception:
+        pass             # serveur ancien / injoignable : upload complet ci-dessous
+
+    if p.stat().st_size > RESUMABLE_MIN_BYTES:
+        try:
+            info = _send_resumable(p, sha, data, status)
+            status(f"✅ Envoyé: {info.get('filename','?')} ({info.get('kind','?')})")
+        except Exception as e:
+            status(f"❌ Upload interrompu ({e}) — renvoyer pour reprendre")
+        return
+
+    # upload HTTP complet
     try:
         with open(p, "rb") as f:
             files = {"file": (p.name, f)}
-            data  = {"display_time": str(dt), "display_text": dtext, "username": uname}
             r = requests.post(f"{API_BASE}/upload/", files=files, data=data, timeout=60)
         if r.ok:
             info = r.json()
-            status_var.set(f"✅ Envoyé: {info.get('filename','?')} ({info.get('kind','?')})")
+            status(f"✅ Envoyé: {info.get('filename','?')} ({info.get('kind','?')})")
         else:
-            status_var.set(f"❌ Upload échoué ({r.status_code})")
+            status(f"❌ Upload échoué ({r.status_code})")
     except Exception as e:
-        status_var.set(f"❌ Upload erreur: {e}")
+        status(f"❌ Upload erreur: {e}")
+
+# sha256 -> session d'upload reprenable en cours : "Envoyer" à nouveau reprend où on s'était arrêté
+_resumable_sessions = {}
+
+def _send_resumable(p: Path, sha: str, data: dict, status, rounds: int = 5) -> dict:
+    """Upload par morceaux (en parallèle) ; après chaque tour, le serveur dit ce qui manque encore."""
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
+    http = requests.Session()
+    size = p.stat().st_size
+    base = f"{API_BASE}/upload/sessions/"
+    sid, state = _resumable_sessions.get(sha), None
+    if sid:
+        r = http.get(f"{base}{sid}", timeout=15)
+        state = r.json() if r.ok else None
+    if state is None:
+        r = http.post(base, data={**data, "filename": p.name, "size": str(size), "sha256": sha}, timeout=15)
+        r.raise_for_status()
+        state = r.json()
+        sid = _resumable_sessions[sha] = state["id"]
+    chunk = int(state.get("chunk_size") or 1_000_000)
+
+    def send(rng):
+        start, end = rng
+        with open(p, "rb") as f:
+            f.seek(start)
+            body = f.read(end - start)
+        http.put(f"{base}{sid}", params={"offset": start}, data=body, timeout=60).raise_for_status()
+        return end - start
+
+    for _ in range(rounds):
+        todo, at = [], 0
+        for start, end in state["received"] + [[size, size]]:     # trous entre les plages reçues
+            todo += [(o, min(o + chunk, start)) for o in range(at, start, chunk)]
+            at = max(at, end)
+        if not todo:
+            break
+        done = size - sum(e - s for s, e in todo)
+        status(f"Upload… {done * 100 // size}%")
+        with ThreadPoolExecutor(RESUMABLE_PARALLEL) as pool:
+            for fut in [pool.submit(send, rng) for rng in todo]:
+                try:
+                    done += fut.result()
+                    status(f"Upload… {done * 100 // size}%")
+                except Exception:
+                    pass          # morceau perdu : redemandé au tour suivant
+        r = http.get(f"{base}{sid}", timeout=15)
+        r.raise_for_status()
+        state = r.json()
+
+    r = http.post(f"{base}{sid}/commit", timeout=120)
+    if r.status_code != 409:                # 409 INCOMPLETE : session gardée pour reprendre
+        _resumable_sessions.pop(sha, None)
+    r.raise_for_status()
+    return r.json()
+
+def _file_sha256(path: Path) -> str:
+    """Hash du fichier lu par blocs (pas de copie en mémoire), comme le serveur à la réception."""
+    h = content_hasher()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _pick_image_variant(notice, screen):
+    """Plus petite variante serveur qui couvre la taille d'affichage (90% de l'écran), sinon l'original."""
+    filename = notice.get("filename")
+    variants = notice.get("variants") or []
+    ow, oh = notice.get("width") or 0, notice.get("height") or 0
+    if not variants or not ow or not oh:
+        return filename
+    r = min(1.0, screen[0] * 0.9 / ow, screen[1] * 0.9 / oh)
+    need_w, need_h = int(ow * r), int(oh * r)
+    fits = [v for v in variants if v["w"] >= need_w - 1 and v["h"] >= need_h - 1]
+    return min(fits, key=lambda v: v["size"])["filename"] if fits else filename
+
+def _ws_listen(root, status_var, screen):
+    t0 = time.perf_counter()
+    import websocket
+    STARTUP.span("import_websocket", t0)
+    downloads = DownloadPool(DOWNLOAD_WORKERS)
+    # dernier événement reçu : renvoyé à la reconnexion pour que le serveur rejoue le manqué
+    last = {"epoch": None}
+    seen = SeenSeqs()      # seq déjà traités (peuvent arriver dans le désordre entre workers)
+    # petits médias poussés par le serveur avant leur notice (event_id -> (octets, cible en ms serveur))
+    rx = {"id": None, "buf": None, "target": None, "length": None}
+    inline = {}
+    # horloge serveur estimée (shared/timesync.py) : les médias poussés démarrent au même instant
+    # serveur chez tous les viewers ; l'écart mesuré au début réel de la lecture est rapporté
+    clock = ClockSync()
+    conn = {"ws": None, "frames": False}    # frames : le hello annonce des trames shared/frames.py
+
+    def send_json(obj):
+        ws = conn["ws"]
+        if ws is not None:
+            ws.send(json.dumps(obj))
+
+    threading.Thread(target=sync_loop, args=(clock, lambda: conn["ws"], send_json), daemon=True).start()
+
+    def blob_start(meta):
+        rx["id"], rx["buf"] = meta.get("event_id"), bytearray()
+        length = meta.get("content_length")
+        rx["length"] = length if isinstance(length, int) else None
+        try:
+            rx["target"] = float(meta["server_ts_ms"]) + float(meta.get("start_after_ms", 0))
+        except (KeyError, TypeError, ValueError):
+            rx["target"] = None
+
+    def on_frame(msg):
+        try:
+            f = frames.decode(msg)
+        except frames.FrameError:
+            return
+        if f.type == frames.START:
+            try:
+                blob_start({**f.meta(), "event_id": f.event_id})
+            except ValueError:
+                rx["id"], rx["buf"] = None, None
+        elif f.event_id != rx["id"] or rx["buf"] is None:
+            return
+        elif f.type == frames.CHUNK:
+            if f.offset == len(rx["buf"]):
+                rx["buf"].extend(f.payload)
+            else:                                # morceau perdu : on retombera sur /files/*
+                rx["id"], rx["buf"] = None, None
+        else:
+            blob_done(f.offset)                  # END : offset = taille totale
+
+    def blob_done(length=None):
+        # derniers morceaux jetés côté serveur (client lent) mais END passé : blob tronqué,
+        # on oublie et la notice retombera sur /files/*
+        expected = length if length is not None else rx["length"]
+        if expected is not None and len(rx["buf"]) != expected:
+            rx["id"], rx["buf"] = None, None
+            return
+        inline[rx["id"]] = (bytes(rx["buf"]), rx["target"])
+        while len(inline) > 16:                  # notices jamais arrivées : on oublie les plus vieux
+            inline.pop(next(iter(inline)))
+        rx["id"], rx["buf"] = None, None
 
-def _ws_listen(root, status_var):
     def on_message(ws, msg):
+        # binaire = trame ou morceau "bin" historique selon ce que le hello a annoncé, jamais
+        # deviné au contenu (un morceau de blob peut très bien commencer par b"LT")
+        if isinstance(msg, bytes) and conn["frames"]:
+            on_frame(msg)
+            return
+        if isinstance(msg, bytes):               # chunk binaire du blob en cours
+            if rx["buf"] is not None:
+                rx["buf"].extend(msg)
+            return
         try:
             obj = json.loads(msg)
         except Exception:
             return
-        if obj.get("type") != "media_notice":
-            return
+        mtype = obj.get("type")
+        if mtype in ("image_start", "audio_start", "video_start"):
+            blob_start(obj)
+        elif mtype in ("image_chunk_b64", "audio_chunk_b64", "video_chunk_b64"):
+            if rx["buf"] is not None and obj.get("event_id") == rx["id"]:
+                rx["buf"].extend(base64.b64decode(obj.get("b64", "")))
+        elif mtype in ("image_end", "audio_end", "video_end"):
+            if rx["buf"] is not None and obj.get("event_id") == rx["id"]:
+                blob_done()
+            rx["id"], rx["buf"] = None, None
+        elif mtype == "media_notice_batch":   # plusieurs uploads regroupés par le serveur
+            for notice in obj.get("notices", []):
+                on_notice(notice)
+        elif mtype == "media_notice":
+            on_notice(obj)
+        elif mtype == "time_sync":
+            try:
+                clock.sample(float(obj["t0"]), float(obj["t1"]), float(obj["t2"]))
+            except (KeyError, TypeError, ValueError):
+                pass
+        elif mtype == "ping":                    # heartbeat serveur : sans réponse on serait déconnecté
+            try: ws.send(json.dumps({"type": "pong", "t": obj.get("t")}))
+            except Exception: pass
+        elif mtype == "hello":
+            conn["frames"] = obj.get("frames") == frames.VERSION
+            if obj.get("epoch") != last["epoch"]:      # premier contact ou serveur redémarré
+                last["epoch"] = obj.get("epoch")
+                seen.reset(obj.get("seq"))
+        elif mtype == "replay_gap":
+            seen.reset(obj.get("seq"))
+            status_var.set("⚠ Reconnecté : des médias ont été manqués")
+
+    def on_notice(obj):
+        seq = obj.get("seq")
+        if isinstance(seq, int):
+            if not seen.accept(seq):
+                return                                 # déjà reçu
         kind = obj.get("kind")
         filename = obj.get("filename")
         dt = float(obj.get("display_time", 3))
@@ -114,43 +352,79 @@ def _ws_listen(root, status_var):
 
         status_var.set(f"📩 {kind} de {uname}: {filename}")
 
-        # Télécharger le média en HTTP puis afficher (image/vidéo avec légende intégrée)
+        # Cible commune en temps serveur : média poussé avec la notice (cible de son blob), sinon
+        # téléchargé par le pool (jamais dans ce thread) et lancé à max(fin du téléchargement, cible).
+        # Sans horloge synchronisée (ou cible), lancé dès qu'il est là.
+        pushed = inline.pop(obj.get("inline"), None)
+        if pushed is not None:
+            data, target = pushed
+            play_at(target, obj.get("inline"), kind, filename, data, dt, dtext, uname)
+            return
+        route = {"image": "images", "video": "videos", "audio": "audios"}.get(kind)
+        if route is None:
+            return
         try:
-            if kind == "image":
-                r = requests.get(f"{API_BASE}/files/images/{filename}", timeout=60)
-                if r.ok:
-                    root.after(0, show_image_with_caption, root, r.content, dt, dtext)
-            elif kind == "video":
-                r = requests.get(f"{API_BASE}/files/videos/{filename}", timeout=60)
-                if r.ok:
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
-                        tmp.write(r.content); temp_path = tmp.name
-                    root.after(0, play_video_overlay, root, temp_path, dt, dtext)
-            elif kind == "audio":
-                r = requests.get(f"{API_BASE}/files/audios/{filename}", timeout=60)
-                if r.ok:
-                    suffix = "." + filename.rsplit(".", 1)[-1].lower() if "." in filename else ".mp3"
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                        tmp.write(r.content); temp_path = tmp.name
-                    threading.Thread(target=play_audio_tempfile, args=(temp_path, dt), daemon=True).start()
-        except Exception as e:
-            status_var.set(f"❌ Download erreur: {e}")
+            target = float(obj["server_ts_ms"]) + float(obj.get("start_after_ms", 0))
+        except (KeyError, TypeError, ValueError):
+            target = None
+        fetch = _pick_image_variant(obj, screen) if kind == "image" else filename
+        # abandonné seulement s'il n'a pas pu commencer dans sa fenêtre d'affichage
+        downloads.submit(f"{API_BASE}/files/{route}/{fetch}", kind, deadline=time.monotonic() + dt,
+                         on_done=lambda content: play_at(target, seq, kind, filename, content, dt, dtext, uname),
+                         on_error=lambda e: status_var.set(f"❌ Download erreur: {e}"))
+
+    def play_at(target, event_id, kind, filename, data, dt, dtext, uname):
+        if target is None or not clock.synced:
+            show(kind, filename, data, dt, dtext, uname)
+            return
+        delay_ms = max(0, int(clock.to_local_ms(target) - now_ms()))
+        show(kind, filename, data, dt, dtext, uname, delay_ms, on_start=lambda: report(event_id, target))
+
+    def report(event_id, target):
+        # > 0 : lecture commencée après la cible (média reçu trop tard, démarrage lent) ; à la
+        # précision de l'horloge près (~rtt/2)
+        skew_ms = clock.server_now_ms() - target
+        try:
+            send_json({"type": "playback", "event_id": event_id, "skew_ms": round(skew_ms, 1),
+                       "offset_ms": round(clock.offset_ms, 1), "rtt_ms": round(clock.rtt_ms, 1)})
+        except Exception:
+            pass
+
+    def show(kind, filename, data, dt, dtext, uname, delay_ms=0, on_start=None):
+        # (image/vidéo avec légende intégrée) ; on_start() au début réel de l'affichage / de la lecture
+        if kind == "image":
+            root.after(delay_ms, lambda: show_image_with_caption(root, data, dt, dtext, on_start=on_start))
+        elif kind == "video":
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
+                tmp.write(data); temp_path = tmp.name
+            root.after(delay_ms, lambda: play_video_overlay(root, temp_path, dt, dtext, on_start=on_start))
+        elif kind == "audio":
+            suffix = "." + filename.rsplit(".", 1)[-1].lower() if "." in filename else ".mp3"
+            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+                tmp.write(data); temp_path = tmp.name
+            play = threading.Timer(delay_ms / 1000, play_audio_tempfile, args=(temp_path, dt, on_start))
+            play.daemon = True
+            play.start()
 
         # Pseudo en haut-gauche pour tout
-        root.after(150, show_overlay_username_top_left, root, f"{uname}", dt)
+        root.after(delay_ms + 150, show_overlay_username_top_left, root, f"{uname}", dt)
 
         # Bandeau bas uniquement pour l'audio (image/vidéo ont déjà la légende dans la même fenêtre)
         if kind == "audio" and dtext:
-            root.after(180, show_overlay_text_bottom, root, dtext, dt)
+            root.after(delay_ms + 180, show_overlay_text_bottom, root, dtext, dt)
 
-    def on_open(_):   status_var.set("WS connecté")
+    def on_open(ws):  conn["ws"] = ws; conn["frames"] = False; status_var.set("WS connecté"); STARTUP.mark("ws_connected")
     def on_error(_,e):status_var.set(f"WS erreur: {e}")
-    def on_close(*_): status_var.set("WS déconnecté — reconnexion…")
+    def on_close(*_): conn["ws"] = None; status_var.set("WS déconnecté — reconnexion…")
 
     while True:
         try:
-            ws = websocket.WebSocketApp(WS_URL, on_message=on_message, on_open=on_open, on_error=on_error, on_close=on_close)
+            # frames=<version> : petits médias en trames binaires (shared/frames.py) plutôt qu'en base64
+            url = WS_URL + ("&" if "?" in WS_URL else "?") + f"frames={frames.VERSION}"
+            if last["epoch"] is not None and seen.high is not None:
+                url += f"&resume_from={seen.high}&epoch={last['epoch']}"
+            ws = websocket.WebSocketApp(url, on_message=on_message, on_open=on_open, on_error=on_error, on_close=on_close)
             ws.run_forever()
         except Exception as e:
             status_var.set(f"WS down: {e}")
-        import time; time.sleep(2)
+        time.sleep(2)
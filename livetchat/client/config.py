@@ -6,6 +6,11 @@ import json, os
 API_BASE = os.environ.get("LTCHAT_API_BASE", "lien serveur + port")
 WS_URL   = os.environ.get("LTCHAT_WS_URL") or (API_BASE.replace("http", "ws", 1).rstrip("/") + "/ws")
 
+# au-delà : upload reprenable par morceaux (/upload/sessions/), plutôt qu'un seul POST multipart
+RESUMABLE_MIN_BYTES = int(os.environ.get("LTCHAT_RESUMABLE_MIN_BYTES", 4_000_000))
+RESUMABLE_PARALLEL = 3
+DOWNLOAD_WORKERS = 3              # téléchargements simultanés des médias annoncés
+
 CONFIG_PATH = Path.home() / ".tchat_config.json"
 
 def load_username_from_config() -> str:
@@ -0,0 +1,86 @@
+# livetchat/client/downloads.py
+# Téléchargements des médias annoncés (media_notice), hors du thread WS :
+#  - N threads, une seule requests.Session (connexions keep-alive réutilisées)
+#  - file à priorités : audio et images avant les vidéos, puis ordre d'arrivée
+#  - un média dont la fenêtre d'affichage est passée avant même le début de son téléchargement
+#    est abandonné ; un téléchargement commencé va toujours au bout (liaison lente : la vidéo
+#    s'affiche en retard, mais s'affiche)
+# Le thread WS ne fait plus que parser et mettre en file : pings et notices ne sont jamais bloqués.
+import itertools, queue, threading, time
+from dataclasses import dataclass, field
+from typing import Callable
+
+PRIORITY = {"audio": 0, "image": 1, "video": 2}
+READ_BYTES = 256 * 1024
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    url: str = field(compare=False)
+    deadline: float = field(compare=False)          # time.monotonic()
+    on_done: Callable[[bytes], None] = field(compare=False)
+    on_error: Callable[[Exception], None] | None = field(compare=False, default=None)
+
+
+class DownloadPool:
+
+    def __init__(self, workers: int = 3, timeout_s: float = 60):
+        self.workers = workers
+        self.timeout_s = timeout_s
+        self.stats = {"done": 0, "expired": 0, "failed": 0}
+        self._q: "queue.PriorityQueue[_Job]" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._session = None
+        self._lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+
+    def submit(self, url: str, kind: str, deadline: float, on_done, on_error=None):
+        """Télécharge `url` si le téléchargement peut commencer avant `deadline` (time.monotonic()),
+        puis appelle on_done(octets) depuis un worker."""
+        self._start()
+        self._q.put(_Job(PRIORITY.get(kind, len(PRIORITY)), next(self._seq), url, deadline, on_done, on_error))
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            import requests      # cf. app.py : rien de lourd avant le premier téléchargement
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"download-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _worker(self):
+        while True:
+            job = self._q.get()
+            try:
+                if time.monotonic() > job.deadline:
+                    self._count("expired")
+                    continue
+                data = self._fetch(job)
+                self._count("done")
+                job.on_done(data)
+            except Exception as e:
+                self._count("failed")
+                if job.on_error:
+                    job.on_error(e)
+            finally:
+                self._q.task_done()
+
+    def _count(self, outcome: str):
+        with self._lock:        # plusieurs workers : += n'est pas atomique
+            self.stats[outcome] += 1
+
+    def _fetch(self, job: _Job) -> bytes:
+        with self._session.get(job.url, stream=True, timeout=self.timeout_s) as r:
+            r.raise_for_status()
+            buf = bytearray()
+            for block in r.iter_content(READ_BYTES):
+                buf.extend(block)
+            return bytes(buf)
@@ -1,12 +1,65 @@
-import io, time, os, sys
+import io, time, os, sys, threading
 from tkinter import Toplevel, Label, Canvas, Frame, messagebox
-from PIL import Image, ImageTk, ImageSequence
 
-try:
-    import vlc
-    VLC_AVAILABLE = True
-except Exception:
-    VLC_AVAILABLE = False
+# PIL et surtout libvlc coûtent cher au démarrage : chargés au premier usage,
+# ou en avance par warm_up() depuis un thread de fond une fois la fenêtre affichée.
+# Un verrou par backend : une image qui arrive pendant le chargement de libvlc n'attend
+# que PIL ; une fois chargé, un backend se lit sans verrou.
+_backends = {}
+_backend_locks = {"pil": threading.Lock(), "vlc": threading.Lock()}
+
+
+def _load_pil():
+    from PIL import Image, ImageTk, ImageSequence
+    return Image, ImageTk, ImageSequence
+
+
+def _load_vlc():
+    try:
+        import vlc
+        return vlc
+    except Exception:
+        return None
+
+
+def _backend(name: str, load):
+    try:
+        return _backends[name]
+    except KeyError:
+        pass
+    with _backend_locks[name]:
+        if name not in _backends:
+            _backends[name] = load()
+        return _backends[name]
+
+
+def _pil():
+    """(Image, ImageTk, ImageSequence), importés une seule fois."""
+    return _backend("pil", _load_pil)
+
+
+def _vlc():
+    """Module vlc, ou None si python-vlc / libvlc absents."""
+    return _backend("vlc", _load_vlc)
+
+
+def warm_up(timer=None):
+    """Précharge PIL puis VLC ; `timer` (StartupTimer) reçoit la durée de chaque import."""
+    for name, load in (("import_pil", _pil), ("import_vlc", _vlc)):
+        t0 = time.perf_counter()
+        load()
+        if timer:
+            timer.span(name, t0)
+
+
+def _notify_once(on_start):
+    """on_start() au premier appel seulement : début réel de l'affichage / de la lecture."""
+    done = []
+    def fire(*_):
+        if on_start is not None and not done:
+            done.append(True)
+            on_start()
+    return fire
 
 
 def _center_geometry(root, w, h):
@@ -16,8 +69,9 @@ def _center_geometry(root, w, h):
     return f"{w}x{h}+{x}+{y}"
 
 
-def show_image_with_caption(root, img_bytes: bytes, seconds: float, caption: str | None):
-    """Image centrée + légende dessous (même fenêtre), texte non coupé."""
+def show_image_with_caption(root, img_bytes: bytes, seconds: float, caption: str | None, on_start=None):
+    """Image centrée + légende dessous (même fenêtre), texte non coupé ; on_start() quand la fenêtre s'affiche."""
+    Image, ImageTk, ImageSequence = _pil()
     try:
         image = Image.open(io.BytesIO(img_bytes))
     except Exception:
@@ -50,6 +104,7 @@ def show_image_with_caption(root, img_bytes: bytes, seconds: float, caption: str
         top = Toplevel(root)
         top.overrideredirect(True)
         top.geometry(_center_geometry(root, w, total_h))
+        top.bind("<Map>", _notify_once(on_start), add="+")
 
         # amener devant puis relâcher (Alt+Tab possible)
         top.attributes("-topmost", True); top.lift(); top.focus_force()
@@ -86,6 +141,7 @@ def show_image_with_caption(root, img_bytes: bytes, seconds: float, caption: str
     top = Toplevel(root)
     top.overrideredirect(True)
     top.geometry(_center_geometry(root, w, total_h))
+    top.bind("<Map>", _notify_once(on_start), add="+")
 
     top.attributes("-topmost", True); top.lift(); top.focus_force()
     top.after(1200, lambda: top.attributes("-topmost", False))
@@ -114,13 +170,15 @@ def show_image_with_caption(root, img_bytes: bytes, seconds: float, caption: str
     animate()
 
 
-def play_video_overlay(root, path: str, seconds: float, caption: str | None):
+def play_video_overlay(root, path: str, seconds: float, caption: str | None, on_start=None):
     """
     VLC intégré dans une fenêtre Tk (pop au premier plan, puis relâché).
     Pas d'events VLC (polling UI), cleanup idempotent,
     garde-fou basé sur la durée réelle + cap éventuel via `seconds`.
+    on_start() dès que VLC joue réellement.
     """
-    if not VLC_AVAILABLE:
+    vlc = _vlc()
+    if vlc is None:
         messagebox.showerror("VLC manquant", "Installe 'python-vlc' pour lire les vidéos.")
         return
 
@@ -221,6 +279,23 @@ def play_video_overlay(root, path: str, seconds: float, caption: str | None):
     # démarrer
     player.play()
 
+    started = _notify_once(on_start)
+
+    def wait_playing(tries=0):
+        if state["closed"]:
+            return
+        try:
+            playing = player.is_playing()
+        except Exception:
+            return
+        if playing:
+            started()
+        elif tries < 250:      # ~5s
+            root.after(20, wait_playing, tries + 1)
+
+    if on_start is not None:
+        root.after(0, wait_playing)
+
     # -------- Durée réelle & garde-fou --------
     # On attend que VLC connaisse la durée (ms > 0). On cale le timeout sur min(durée+1s, seconds si fourni)
     dur_box = {"ms": -1, "tries": 0, "armed": False}
@@ -269,12 +344,19 @@ def play_video_overlay(root, path: str, seconds: float, caption: str | None):
     root.after(350, tick)
 
 
-def play_audio_tempfile(path: str, seconds: float):
-    if not VLC_AVAILABLE:
+def play_audio_tempfile(path: str, seconds: float, on_start=None):
+    vlc = _vlc()
+    if vlc is None:
         messagebox.showerror("VLC manquant", "Installe 'python-vlc' pour lire l'audio.")
         return
     player = vlc.MediaPlayer(path)
     player.play()
+    if on_start is not None:
+        for _ in range(500):   # ~5s
+            if player.is_playing():
+                on_start()
+                break
+            time.sleep(0.01)
     time.sleep(max(0.1, seconds))
     try:
         player.stop()
@@ -0,0 +1,32 @@
+# livetchat/client/notices.py
+# Dédoublonnage des media_notice par numéro "seq".
+# Avec plusieurs workers, les seq viennent d'un compteur partagé mais chaque worker diffuse les
+# siens à son rythme : N+1 (d'un autre worker) peut arriver avant N. Un simple "seq <= dernier
+# reçu" jetterait N ; on garde donc l'ensemble des seq déjà vus sur une fenêtre bornée.
+
+
+class SeenSeqs:
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self.high: int | None = None     # plus grand seq vu (renvoyé comme resume_from à la reconnexion)
+        self._seen: set[int] = set()
+
+    def reset(self, seq: int | None):
+        """Nouvelle numérotation (autre epoch) ou trou signalé par le serveur : on repart de `seq`.
+        Les seq <= `seq` encore en vol restent acceptés (jamais vus par ce client)."""
+        self.high = seq
+        self._seen.clear()
+
+    def accept(self, seq: int) -> bool:
+        """True la première fois que `seq` est vu ; False pour un doublon, ou un seq trop vieux
+        pour la fenêtre (considéré comme déjà traité)."""
+        if seq in self._seen or (self.high is not None and seq <= self.high - self.window):
+            return False
+        self._seen.add(seq)
+        if self.high is None or seq > self.high:
+            self.high = seq
+            if len(self._seen) > 2 * self.window:
+                floor = seq - self.window
+                self._seen = {s for s in self._seen if s > floor}
+        return True
@@ -0,0 +1,57 @@
+# livetchat/client/timing.py
+# Chronométrage du démarrage du client, phase par phase, pour suivre version après version :
+#  - jalons (mark) : instant depuis le lancement — fenêtre affichée, WS connecté...
+#  - durées (span) : imports préchargés en fond (requests, PIL, VLC...)
+# Une fois tous les jalons attendus atteints : une ligne sur stdout et une entrée JSON
+# dans ~/.tchat_startup.jsonl (les STARTUP_HISTORY dernières).
+import json, threading, time
+from pathlib import Path
+
+STARTUP_LOG = Path.home() / ".tchat_startup.jsonl"
+STARTUP_HISTORY = 50
+
+
+class StartupTimer:
+
+    def __init__(self, version: str, expect=("window", "ws_connected", "warm")):
+        self.t0 = time.perf_counter()
+        self.version = version
+        self.expect = set(expect)
+        self.marks: dict[str, float] = {}
+        self.spans: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._reported = False
+
+    def mark(self, name: str):
+        """Jalon atteint maintenant (ms depuis le lancement) ; seul le premier compte."""
+        with self._lock:
+            self.marks.setdefault(name, round((time.perf_counter() - self.t0) * 1000, 1))
+        self._maybe_report()
+
+    def span(self, name: str, started: float):
+        """Durée d'une phase commencée à `started` (time.perf_counter())."""
+        with self._lock:
+            self.spans[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def flush(self):
+        """Rapport avec ce qui a été mesuré (ex. serveur injoignable : pas de ws_connected)."""
+        self._maybe_report(force=True)
+
+    def _maybe_report(self, force=False):
+        with self._lock:
+            if self._reported or not (force or self.expect <= self.marks.keys()):
+                return
+            self._reported = True
+        self.report()
+
+    def report(self):
+        parts = [f"{k}={v:.0f}ms" for k, v in sorted(self.marks.items(), key=lambda kv: kv[1])]
+        parts += [f"{k}={v:.0f}ms" for k, v in self.spans.items()]
+        print(f"[STARTUP] v{self.version} " + " ".join(parts))
+        entry = {"version": self.version, "ts": int(time.time()), "marks": self.marks, "spans": self.spans}
+        try:
+            lines = STARTUP_LOG.read_text(encoding="utf-8").splitlines() if STARTUP_LOG.exists() else []
+            lines = lines[-(STARTUP_HISTORY - 1):] + [json.dumps(entry)]
+            STARTUP_LOG.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        except Exception:
+            pass
@@ -1,8 +1,12 @@
 import json, threading, time
 import websocket
 from dataclasses import dataclass
+from typing import Callable
 import base64
 
+from livetchat.shared.timesync import ClockSync, sync_loop
+from livetchat.shared import frames
+
 @dataclass
 
 class PendingEvent:
@@ -16,18 +20,30 @@ class PendingEvent:
     start_after_ms: int
     server_ts_ms: int
     received_bytes: bytearray
+    # à appeler par on_image/on_video/on_audio au début réel de la lecture : rapporte l'écart à la cible
+    started: Callable[[], None] = lambda: None
 
 class LiveClient:
     def __init__(self, ws_url: str, on_image, on_video, on_audio, on_status):
         self.ws_url = ws_url; self.ws = None; self.thread = None; self.alive = False
         self.pending = None
         self.on_image = on_image; self.on_video = on_video; self.on_audio = on_audio; self.on_status = on_status
-        self._send_lock = threading.Lock(); self._pinger = None
+        self._send_lock = threading.Lock(); self._pinger = None; self._syncer = None
+        self.clock = ClockSync()     # horloge serveur estimée : lectures calées sur une cible commune
 
     def connect(self):
         if self.thread and self.thread.is_alive(): return
         self.alive = True; self.thread = threading.Thread(target=self._run, daemon=True); self.thread.start()
         self._pinger = threading.Thread(target=self._ping_loop, daemon=True); self._pinger.start()
+        self._syncer = threading.Thread(target=sync_loop, args=(self.clock, lambda: self.ws, self._send_json,
+                                                                lambda: self.alive), daemon=True)
+        self._syncer.start()
+
+    def _send_json(self, obj):
+        ws = self.ws
+        if ws is None: return
+        with self._send_lock:
+            ws.send(json.dumps(obj))
 
     def _ping_loop(self):
         while self.alive:
@@ -39,11 +55,18 @@ class LiveClient:
     def _run(self):
         while self.alive:
             try:
-                self.ws = websocket.WebSocket(); self.ws.connect(self.ws_url, timeout=5)
+                # frames=<version> : blobs en trames binaires (shared/frames.py) plutôt qu'en base64
+                url = self.ws_url + ("&" if "?" in self.ws_url else "?") + f"frames={frames.VERSION}"
+                self.ws = websocket.WebSocket(); self.ws.connect(url, timeout=5)
+                use_frames = False     # jusqu'au hello : binaire = morceaux "bin" historiques
                 self.on_status("Connecté au serveur.")
                 while self.alive:
                     msg = self.ws.recv()
-                    if isinstance(msg, bytes):
+                    # dispatch sur l'encodage annoncé par le hello, pas sur le contenu (un morceau
+                    # "bin" peut commencer par b"LT")
+                    if isinstance(msg, bytes) and use_frames:
+                        self._on_frame(msg)
+                    elif isinstance(msg, bytes):
                         if self.pending is not None:
                             self.pending.received_bytes.extend(msg)
                             if len(self.pending.received_bytes) >= self.pending.content_length:
@@ -55,21 +78,7 @@ class LiveClient:
                             continue
                         mtype = obj.get("type")
                         if mtype in ("image_start", "video_start", "audio_start"):
-                            kind = "image" if mtype == "image_start" else "video" if mtype == "video_start" else "audio"
-                            self.pending = PendingEvent(
-                                kind=kind,
-                                event_id=obj.get("event_id", ""),
-                                username=obj.get("username", ""),
-                                display_time=float(obj.get("display_time", 3)),
-                                display_text=obj.get("display_text", ""),
-                                content_type=obj.get("content_type", "image/jpeg"),
-                                content_length=int(obj.get("content_length", 0)),
-                                start_after_ms=int(obj.get("start_after_ms", 1000)),
-                                server_ts_ms=int(obj.get("server_ts_ms", 0)),
-                                received_bytes=bytearray(),
-                            )
-                            self.pending._encoding = obj.get("encoding", "bin")
-                            self.pending._meta_received_local_ms = int(time.time() * 1000)
+                            self._start_pending(obj)
                         elif mtype in ("image_chunk_b64", "video_chunk_b64", "audio_chunk_b64"):
                             if self.pending is not None:
                                 b64 = obj.get("b64", "")
@@ -87,6 +96,15 @@ class LiveClient:
                         elif mtype in ("image_ack", "video_ack", "audio_ack"):
                             b = obj.get("bytes", 0); ct = obj.get("content_type", "?")
                             self.on_status(f"✅ Envoyé ({ct}, {b} octets).")
+                        elif mtype == "hello":
+                            use_frames = obj.get("frames") == frames.VERSION
+                        elif mtype == "time_sync":
+                            try:
+                                self.clock.sample(float(obj["t0"]), float(obj["t1"]), float(obj["t2"]))
+                            except (KeyError, TypeError, ValueError):
+                                pass
+                        elif mtype == "ping":   # heartbeat applicatif du serveur
+                            self._send_json({"type": "pong", "t": obj.get("t")})
                         elif mtype == "error":
                             self.on_status(f"❌ Erreur: {obj.get('error','?')}")
                         else:
@@ -99,15 +117,62 @@ class LiveClient:
                 except Exception: pass
                 self.ws = None
                 
+    def _start_pending(self, obj: dict):
+        mtype = obj.get("type", "")
+        kind = "image" if mtype == "image_start" else "video" if mtype == "video_start" else "audio"
+        self.pending = PendingEvent(
+            kind=kind,
+            event_id=obj.get("event_id", ""),
+            username=obj.get("username", ""),
+            display_time=float(obj.get("display_time", 3)),
+            display_text=obj.get("display_text", ""),
+            content_type=obj.get("content_type", "image/jpeg"),
+            content_length=int(obj.get("content_length", 0)),
+            start_after_ms=int(obj.get("start_after_ms", 1000)),
+            server_ts_ms=int(obj.get("server_ts_ms", 0)),
+            received_bytes=bytearray(),
+        )
+        self.pending._encoding = obj.get("encoding", "bin")
+        self.pending._meta_received_local_ms = int(time.time() * 1000)
+
+    def _on_frame(self, msg: bytes):
+        try:
+            f = frames.decode(msg)
+        except frames.FrameError:
+            return
+        if f.type == frames.START:
+            self._start_pending(f.meta())
+            return
+        p = self.pending
+        if p is None or p.event_id != f.event_id:
+            return
+        if f.type == frames.CHUNK:
+            if f.offset != len(p.received_bytes):      # morceau manquant : blob inutilisable
+                self.pending = None
+                return
+            p.received_bytes.extend(f.payload)
+        elif f.type == frames.END:
+            if f.offset != len(p.received_bytes):     # derniers morceaux perdus : blob tronqué
+                self.pending = None
+                return
+            self._finalize_pending()
+
     def _finalize_pending(self):
         if not self.pending: return
         p = self.pending; self.pending = None
-        now_ms = int(time.time() * 1000)
-        target_ms = getattr(p, "_target_ms", None)
-        if target_ms is None: target_ms = p._meta_received_local_ms + p.start_after_ms
+        if p.content_length and len(p.received_bytes) != p.content_length:
+            return                                   # blob tronqué (trames jetées) : jamais affiché
+        now_ms = time.time() * 1000
+        synced = self.clock.synced and p.server_ts_ms > 0
+        if synced:
+            # même instant serveur pour tous les viewers, quel que soit leur temps de réception
+            target_ms = self.clock.to_local_ms(p.server_ts_ms + p.start_after_ms)
+        else:
+            target_ms = p._meta_received_local_ms + p.start_after_ms
         delay = max(0.0, (target_ms - now_ms) / 1000.0)
         data = bytes(p.received_bytes)
-        import threading
+        if synced:
+            p.started = lambda: self._report_start(p, p.server_ts_ms + p.start_after_ms)
         if p.kind == "image":
             threading.Thread(target=self.on_image, args=(p, data, delay), daemon=True).start()
         elif p.kind == "video":
@@ -115,6 +180,16 @@ class LiveClient:
         else:
             threading.Thread(target=self.on_audio, args=(p, data, delay), daemon=True).start()
 
+    def _report_start(self, p: PendingEvent, target_server_ms: float):
+        # mesuré au début réel de la lecture : > 0 = en retard sur la cible (média reçu trop tard,
+        # lecteur lent à démarrer) ; à la précision de l'horloge près (~rtt/2)
+        skew_ms = self.clock.server_now_ms() - target_server_ms
+        try:
+            self._send_json({"type": "playback", "event_id": p.event_id, "skew_ms": round(skew_ms, 1),
+                             "offset_ms": round(self.clock.offset_ms, 1), "rtt_ms": round(self.clock.rtt_ms, 1)})
+        except Exception:
+            pass
+
     def send_image(self, username, display_time, display_text, img_bytes, content_type):
         if not self.ws: raise RuntimeError("WebSocket non connecté.")
         meta = {"type":"image_meta","username":username,"display_time":float(display_time),"display_text":display_text,"content_type":content_type}
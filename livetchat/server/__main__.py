@@ -0,0 +1,7 @@
+# livetchat/server/__main__.py
+# python -m livetchat.server : les process "spawn" (pool des variantes, workers uvicorn) ne
+# ré-importent pas le __main__ d'un paquet, donc ne reconstruisent pas l'app, le store, etc.
+from livetchat.server.main import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# livetchat/server/backplane.py
+# Backplane de diffusion entre workers : chaque ConnectionManager diffuse à ses propres
+# clients puis publie la trame sur le backplane ; les autres workers la reçoivent et la
+# diffusent à leurs clients. L'ordre est conservé par émetteur (=> par événement).
+#  - InProcessBackplane : abonnés dans le même process (tests, mode 1 worker)
+#  - UnixSocketBackplane : N workers sur une même machine via sockets Unix datagramme
+import asyncio, errno, json, os, socket, time, uuid
+from collections import deque
+from typing import Callable
+
+from livetchat.server.logs import log
+
+# callback de livraison : (is_bytes, data, bulk, audience) ; audience : cf. ConnectionManager._fanout
+Deliver = Callable[[bool, "str | bytes", bool, "str | None"], None]
+
+
+class Backplane:
+    """Interface : start(deliver) / publish(...) / stop() / stats()."""
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex[:12]      # identifiant de ce worker
+        self._deliver: Deliver | None = None
+        self._lag: dict[str, dict] = {}          # origine -> {"last_ms", "avg_ms", "max_ms", "frames", "lost"}
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def publish(self, is_bytes: bool, data, bulk: bool, audience: str | None = None):
+        raise NotImplementedError
+
+    async def stop(self):
+        self._deliver = None
+
+    def _received(self, origin: str, seq: int, sent_at: float, is_bytes: bool, data, bulk: bool,
+                  audience: str | None = None):
+        lag_ms = max(0.0, (time.time() - sent_at) * 1000.0)
+        st = self._peer(origin)
+        if st["seq"] is not None and seq > st["seq"] + 1:
+            st["lost"] += seq - st["seq"] - 1
+        st["seq"] = seq
+        st["frames"] += 1
+        st["last_ms"] = lag_ms
+        st["avg_ms"] = lag_ms if st["frames"] == 1 else 0.9 * st["avg_ms"] + 0.1 * lag_ms
+        st["max_ms"] = max(st["max_ms"], lag_ms)
+        if self._deliver is not None:
+            self._deliver(is_bytes, data, bulk, audience)
+
+    def _peer(self, origin: str) -> dict:
+        # lost : trames perdues, vues à la réception (trous de seq) ou à l'envoi (cf. UnixSocketBackplane)
+        return self._lag.setdefault(origin, {"last_ms": 0.0, "avg_ms": 0.0, "max_ms": 0.0, "frames": 0, "lost": 0,
+                                             "seq": None})
+
+    def stats(self) -> dict:
+        return {"origin": self.origin, "kind": type(self).__name__,
+                "peers": {o: {k: (round(v, 2) if isinstance(v, float) else v) for k, v in st.items() if k != "seq"}
+                          for o, st in self._lag.items()}}
+
+
+class InProcessBackplane(Backplane):
+    """Tous les backplanes créés sur le même `hub` se voient (même process)."""
+    _default_hub: list["InProcessBackplane"] = []
+
+    def __init__(self, hub: list | None = None):
+        super().__init__()
+        self.hub = InProcessBackplane._default_hub if hub is None else hub
+        self._seq = 0
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        self.hub.append(self)
+
+    async def publish(self, is_bytes: bool, data, bulk: bool, audience: str | None = None):
+        self._seq += 1
+        now = time.time()
+        for peer in list(self.hub):
+            if peer is not self:
+                peer._received(self.origin, self._seq, now, is_bytes, data, bulk, audience)
+
+    async def stop(self):
+        if self in self.hub:
+            self.hub.remove(self)
+        await super().stop()
+
+
+class UnixSocketBackplane(Backplane):
+    """
+    Un socket AF_UNIX/SOCK_DGRAM par worker dans `directory` (<origin>.sock).
+    publish() envoie la trame à chaque socket pair ; les datagrammes Unix sont fiables
+    et ordonnés entre deux sockets. Si un pair est plein (EAGAIN) ses trames attendent
+    dans son propre backlog, ré-essayé peu après, sans jamais doubler celles déjà en
+    attente ; les autres pairs continuent d'être servis.
+    Trame = entête JSON + "\\n" + payload (texte UTF-8 ou octets bruts).
+    """
+    PEERS_REFRESH_S = 1.0
+    RETRY_S = 0.005
+    MAX_BACKLOG = 10_000      # par pair ; au-delà on jette pour lui (il le verra via les numéros de séquence)
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        self.path = os.path.join(directory, f"{self.origin}.sock")
+        self._sock: socket.socket | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._peers: list[str] = []
+        self._peers_at = 0.0
+        self._prune_needed = True
+        self._backlogs: dict[str, deque[bytes]] = {}     # pair -> trames en attente
+        self._retry: asyncio.TimerHandle | None = None
+        self._seq = 0
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        os.makedirs(self.directory, exist_ok=True)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(self.path)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        sock.setblocking(False)
+        self._sock = sock
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(sock.fileno(), self._on_readable)
+        log.info(f"[BACKPLANE] unix {self.path}")
+
+    def _peer_paths(self) -> list[str]:
+        now = time.monotonic()
+        if now - self._peers_at > self.PEERS_REFRESH_S:
+            self._peers = [os.path.join(self.directory, n) for n in os.listdir(self.directory)
+                           if n.endswith(".sock") and n != os.path.basename(self.path)]
+            self._peers_at = now
+            if self._prune_needed:
+                self._prune_needed = False
+                self._peers = [p for p in self._peers if self._alive(p)]
+        return self._peers
+
+    @staticmethod
+    def _alive(path: str) -> bool:
+        """Socket d'un worker vivant ? Sinon (worker tué) on supprime le fichier."""
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            probe.connect(path)
+            return True
+        except (ConnectionRefusedError, FileNotFoundError):
+            try: os.remove(path)
+            except OSError: pass
+            return False
+        finally:
+            probe.close()
+
+    async def publish(self, is_bytes: bool, data, bulk: bool, audience: str | None = None):
+        if self._sock is None:
+            return
+        self._seq += 1
+        head = json.dumps({"o": self.origin, "s": self._seq, "t": time.time(), "b": is_bytes, "k": bulk,
+                           "a": audience}).encode()
+        frame = head + b"\n" + (bytes(data) if is_bytes else data.encode("utf-8"))
+        for peer in self._peer_paths():
+            backlog = self._backlogs.setdefault(peer, deque())
+            if len(backlog) < self.MAX_BACKLOG:
+                backlog.append(frame)
+        self._drain()
+
+    def _drain(self):
+        if self._retry is not None:
+            self._retry.cancel(); self._retry = None
+        for peer, backlog in list(self._backlogs.items()):
+            if self._sock is None:
+                return
+            while backlog:
+                try:
+                    self._sock.sendto(backlog[0], peer)
+                except BlockingIOError:
+                    # pair saturé : on réessaie bientôt (l'ordre est conservé), les autres passent
+                    if self._retry is None:
+                        self._retry = self._loop.call_later(self.RETRY_S, self._drain)
+                    break
+                except (ConnectionRefusedError, FileNotFoundError):
+                    self._prune_needed = True; self._peers_at = 0.0   # worker mort
+                    backlog.clear()
+                    break
+                except OSError as e:
+                    if e.errno == errno.EMSGSIZE:     # trame plus grande qu'un datagramme : perdue pour ce pair
+                        self._peer(os.path.basename(peer).removesuffix(".sock"))["lost"] += 1
+                    log.warning(f"[BACKPLANE] send failed: {e}")
+                backlog.popleft()
+            if not backlog:
+                del self._backlogs[peer]
+
+    def _on_readable(self):
+        while self._sock is not None:
+            try:
+                frame = self._sock.recv(1 << 20)
+            except (BlockingIOError, InterruptedError):
+                return
+            head, _, payload = frame.partition(b"\n")
+            try:
+                h = json.loads(head)
+            except Exception:
+                continue
+            data = payload if h["b"] else payload.decode("utf-8")
+            self._received(h["o"], h["s"], h["t"], h["b"], data, h["k"], h.get("a"))
+
+    async def stop(self):
+        if self._retry is not None:
+            self._retry.cancel(); self._retry = None
+        if self._sock is not None:
+            self._loop.remove_reader(self._sock.fileno())
+            self._sock.close(); self._sock = None
+        try: os.remove(self.path)
+        except OSError: pass
+        await super().stop()
+
+
+def make_backplane(kind: str, directory: str) -> Backplane:
+    if kind == "unix":
+        return UnixSocketBackplane(directory)
+    return InProcessBackplane()
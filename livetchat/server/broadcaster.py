@@ -1,59 +1,125 @@
-import uuid, base64
-from livetchat.server.ws_manager import ConnectionManager
+import os, uuid, json, base64
+from starlette.concurrency import run_in_threadpool
+from livetchat.server.ws_manager import ConnectionManager, AUDIENCE_FRAMES, AUDIENCE_LEGACY
+from livetchat.server.logs import log
 from livetchat.shared.utils import now_ms
 from livetchat.shared.protocol import CHUNK_SIZE
+from livetchat.shared import frames
 
-# Mode binaire (ancien) – on le garde si tu veux y revenir un jour
-async def broadcast_blob_bin(manager: ConnectionManager, kind: str, *, username: str, display_time: float, display_text: str,
-                             content: bytes, content_type: str, start_after_ms: int, exclude: set | None = None,
-                             event_id: str | None = None):
-    if not event_id:
-        event_id = str(uuid.uuid4())
-    meta = {
+# `content` peut être des octets (découpés en memoryview, sans copie) ou un chemin de
+# fichier (lu chunk par chunk dans le threadpool). Le morceau suivant n'est lu qu'une fois le
+# client (non dégradé) le plus chargé redescendu sous INFLIGHT_CHUNKS morceaux en file
+# (manager.wait_drained) : mémoire par diffusion = O(INFLIGHT_CHUNKS x chunk) sur ce worker.
+# Les workers distants (backplane) restent bornés par leur max_queue_bytes par client.
+INFLIGHT_CHUNKS = 4
+
+def _content_length(content) -> int:
+    return os.path.getsize(content) if isinstance(content, str) else len(content)
+
+async def _iter_chunks(content, size: int):
+    """Générateur async de chunks : memoryview sur un buffer, ou lectures successives d'un fichier."""
+    if isinstance(content, str):
+        f = await run_in_threadpool(open, content, "rb")
+        try:
+            while True:
+                chunk = await run_in_threadpool(f.read, size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            await run_in_threadpool(f.close)
+    else:
+        view = memoryview(content)
+        for i in range(0, len(view), size):
+            yield view[i:i+size]
+
+def _meta(kind, event_id, username, display_time, display_text, content_type, length, start_after_ms, encoding):
+    return {
         "type": f"{kind}_start",
         "event_id": event_id,
         "username": username,
         "display_time": float(display_time),
         "display_text": display_text or "",
         "content_type": content_type,
-        "content_length": len(content),
+        "content_length": length,
         "start_after_ms": int(start_after_ms),
         "server_ts_ms": now_ms(),
-        "encoding": "bin",  # <- important pour que le client sache
+        "encoding": encoding,
     }
-    await manager.broadcast_json(meta, exclude=exclude)
-    total = len(content)
-    for i in range(0, total, CHUNK_SIZE):
-        await manager.broadcast_bytes(content[i:i+CHUNK_SIZE], exclude=exclude)
-    await manager.broadcast_json({"type": f"{kind}_end", "event_id": event_id}, exclude=exclude)
-    print(f"[BROADCAST] {kind}/bin {len(content)}B from '{username}' -> {manager.receivers_count(exclude)} client(s)")
+
+# Mode binaire (ancien) – on le garde si tu veux y revenir un jour
+async def broadcast_blob_bin(manager: ConnectionManager, kind: str, *, username: str, display_time: float, display_text: str,
+                             content: bytes | memoryview | str, content_type: str, start_after_ms: int,
+                             exclude: set | None = None, event_id: str | None = None):
+    if not event_id:
+        event_id = str(uuid.uuid4())
+    length = _content_length(content)
+    meta = _meta(kind, event_id, username, display_time, display_text, content_type, length, start_after_ms,
+                 "bin")  # <- important pour que le client sache
+    # bulk=True : un client lent en mode "degrade" perd le blob mais garde les notices
+    await manager.broadcast_json(meta, exclude=exclude, bulk=True)
+    async for chunk in _iter_chunks(content, CHUNK_SIZE):
+        await manager.broadcast_bytes(chunk, exclude=exclude)   # même objet partagé par tous les clients
+        await manager.wait_drained(INFLIGHT_CHUNKS * CHUNK_SIZE)
+    await manager.broadcast_json({"type": f"{kind}_end", "event_id": event_id}, exclude=exclude, bulk=True)
+    log.info(f"[BROADCAST] {kind}/bin {length}B from '{username}' -> {manager.receivers_count(exclude)} client(s)")
 
 # Mode texte/base64 (NOUVEAU) – compatible partout
 TEXT_B64_CHUNK = 60_000  # longueur max de la chaîne base64 par chunk (~45 KB bruts)
+RAW_B64_CHUNK = TEXT_B64_CHUNK // 4 * 3   # multiple de 3 -> chaque chunk se décode seul
 
 async def broadcast_blob_textb64(manager: ConnectionManager, kind: str, *, username: str, display_time: float, display_text: str,
-                                 content: bytes, content_type: str, start_after_ms: int, exclude: set | None = None,
-                                 event_id: str | None = None):
+                                 content: bytes | memoryview | str, content_type: str, start_after_ms: int,
+                                 exclude: set | None = None, event_id: str | None = None):
     if not event_id:
         event_id = str(uuid.uuid4())
-    b64 = base64.b64encode(content).decode("ascii")
-    meta = {
-        "type": f"{kind}_start",
-        "event_id": event_id,
-        "username": username,
-        "display_time": float(display_time),
-        "display_text": display_text or "",
-        "content_type": content_type,
-        "content_length": len(content),
-        "start_after_ms": int(start_after_ms),
-        "server_ts_ms": now_ms(),
-        "encoding": "b64",   # <- le client saura qu’il doit lire des chunks texte
-    }
-    await manager.broadcast_json(meta, exclude=exclude)
+    length = _content_length(content)
+    meta = _meta(kind, event_id, username, display_time, display_text, content_type, length, start_after_ms,
+                 "b64")   # <- le client saura qu’il doit lire des chunks texte
+    await manager.broadcast_json(meta, exclude=exclude, bulk=True)
+
+    # base64 incrémental : un chunk brut -> une trame JSON, encodée une fois pour tous les clients.
+    # (le base64 n'a rien à échapper : seul le préfixe passe par json.dumps)
+    prefix = json.dumps({"type": f"{kind}_chunk_b64", "event_id": event_id, "b64": ""})[:-2]
+    async for chunk in _iter_chunks(content, RAW_B64_CHUNK):
+        frame = prefix + base64.b64encode(chunk).decode("ascii") + '"}'
+        await manager.broadcast_text(frame, exclude=exclude, bulk=True)
+        await manager.wait_drained(INFLIGHT_CHUNKS * TEXT_B64_CHUNK)
+
+    await manager.broadcast_json({"type": f"{kind}_end", "event_id": event_id}, exclude=exclude, bulk=True)
+    log.info(f"[BROADCAST] {kind}/b64 {length}B from '{username}' -> {manager.receivers_count(exclude)} client(s)")
+
+# Mode trames binaires (shared/frames.py) : entête fixe + octets bruts, chaque morceau porte
+# son event_id et sa position. Les clients qui ne l'ont pas négocié reçoivent le même blob en
+# texte/base64, encodé une fois pour eux tous ; l'ordre est conservé pour chaque public.
+FRAME_CHUNK = CHUNK_SIZE     # + entête : tient dans un datagramme du backplane unix (~200 Ko max)
+
+async def broadcast_blob_frames(manager: ConnectionManager, kind: str, *, username: str, display_time: float,
+                                display_text: str, content: bytes | memoryview | str, content_type: str,
+                                start_after_ms: int, exclude: set | None = None, event_id: str | None = None):
+    event_id = uuid.UUID(event_id).hex if event_id else uuid.uuid4().hex
+    eid = frames.event_bytes(event_id)
+    length = _content_length(content)
+    meta = _meta(kind, event_id, username, display_time, display_text, content_type, length, start_after_ms, "b64")
+    await manager.broadcast_bytes(frames.encode_start(event_id, {**meta, "encoding": "frames"}, length),
+                                  exclude=exclude, bulk=True, audience=AUDIENCE_FRAMES)
+    await manager.broadcast_json(meta, exclude=exclude, bulk=True, audience=AUDIENCE_LEGACY)
 
-    for i in range(0, len(b64), TEXT_B64_CHUNK):
-        chunk = b64[i:i+TEXT_B64_CHUNK]
-        await manager.broadcast_json({"type": f"{kind}_chunk_b64", "event_id": event_id, "b64": chunk}, exclude=exclude)
+    prefix = json.dumps({"type": f"{kind}_chunk_b64", "event_id": event_id, "b64": ""})[:-2]
+    seq = offset = 0
+    async for chunk in _iter_chunks(content, FRAME_CHUNK):
+        await manager.broadcast_bytes(frames.encode(frames.CHUNK, eid, seq, offset, chunk),
+                                      exclude=exclude, bulk=True, audience=AUDIENCE_FRAMES)
+        view = memoryview(chunk)
+        for i in range(0, len(view), RAW_B64_CHUNK):
+            frame = prefix + base64.b64encode(view[i:i + RAW_B64_CHUNK]).decode("ascii") + '"}'
+            await manager.broadcast_text(frame, exclude=exclude, bulk=True, audience=AUDIENCE_LEGACY)
+        seq += 1
+        offset += len(chunk)
+        await manager.wait_drained(INFLIGHT_CHUNKS * FRAME_CHUNK)
 
-    await manager.broadcast_json({"type": f"{kind}_end", "event_id": event_id}, exclude=exclude)
-    print(f"[BROADCAST] {kind}/b64 {len(content)}B from '{username}' -> {manager.receivers_count(exclude)} client(s)")
+    await manager.broadcast_bytes(frames.encode(frames.END, eid, seq, length), exclude=exclude, bulk=True,
+                                  audience=AUDIENCE_FRAMES)
+    await manager.broadcast_json({"type": f"{kind}_end", "event_id": event_id}, exclude=exclude, bulk=True,
+                                 audience=AUDIENCE_LEGACY)
+    log.info(f"[BROADCAST] {kind}/frames {length}B from '{username}' -> {manager.receivers_count(exclude)} client(s)")
@@ -0,0 +1,107 @@
+# livetchat/server/fileserve.py
+# Service des médias /files/* : les noms contiennent le hash du contenu, donc
+# ETag fort = hash, cache "immutable" et 304 sur If-None-Match.
+# Range / 206 / If-Range / Content-Length sont gérés par FileResponse, qui passe en
+# zero-copy ("http.response.pathsend") quand le serveur ASGI le propose.
+# Un contenu déjà en mémoire (hotcache.py) est servi directement, Range simple compris.
+import mimetypes
+
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+from livetchat.server.metrics import FILES_BYTES, FILES_REQUESTS
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+FILE_CHUNK = 256 * 1024   # lecture par blocs quand pathsend n'est pas dispo (uvicorn)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+class _CountedFileResponse(FileResponse):
+    """FileResponse qui comptabilise les octets réellement envoyés (Range compris) par route."""
+    route = ""
+
+    async def __call__(self, scope, receive, send):
+        sent, status, length = 0, 0, 0
+
+        async def counting_send(message):
+            nonlocal sent, status, length
+            t = message["type"]
+            if t == "http.response.start":
+                status = message["status"]
+                length = int(dict(message.get("headers", ())).get(b"content-length", 0) or 0)
+            elif t == "http.response.body":
+                sent += len(message.get("body", b""))
+            elif t == "http.response.pathsend":
+                sent += length     # envoyé par le serveur ASGI, en entier
+            await send(message)
+
+        try:
+            await super().__call__(scope, receive, counting_send)
+        finally:
+            FILES_BYTES.inc(self.route, n=sent)
+            FILES_REQUESTS.inc(self.route, str(status or 500))
+
+
+def _single_range(header: str, size: int) -> tuple[int, int] | None:
+    """'bytes=a-b' / 'bytes=a-' / 'bytes=-n' -> (début, fin incluse) ; ValueError si plusieurs plages."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        raise ValueError(header)
+    a, _, b = spec.strip().partition("-")
+    if not a:
+        n = int(b)
+        return (max(0, size - n), size - 1) if n > 0 and size else None
+    start, end = int(a), (int(b) if b else size - 1)
+    if start > end or start >= size:
+        return None
+    return start, min(end, size - 1)
+
+
+def _memory_response(request: Request, data: bytes, path: str, headers: dict, media_type: str | None,
+                     route: str) -> Response | None:
+    """Réponse depuis la mémoire ; None si la requête demande plusieurs plages (-> FileResponse)."""
+    media_type = media_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+    headers = {**headers, "Accept-Ranges": "bytes"}
+    status, body = 200, data
+    rng = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if rng and (if_range is None or if_range.strip() == headers["ETag"]):
+        try:
+            span = _single_range(rng, len(data))
+        except ValueError:
+            return None
+        if span is None:
+            FILES_REQUESTS.inc(route, "416")
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{len(data)}"})
+        status, body = 206, data[span[0]:span[1] + 1]
+        headers["Content-Range"] = f"bytes {span[0]}-{span[1]}/{len(data)}"
+    FILES_BYTES.inc(route, n=len(body))
+    FILES_REQUESTS.inc(route, str(status))
+    return Response(body, status_code=status, headers=headers, media_type=media_type)
+
+
+def serve_media(request: Request, path: str, content_hash: str, media_type: str | None = None,
+                route: str = "files", load=None) -> Response:
+    """`load()` -> contenu en mémoire (cache chaud) ou None ; appelé seulement si le corps est envoyé."""
+    etag = f'"{content_hash}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        FILES_REQUESTS.inc(route, "304")
+        return Response(status_code=304, headers=headers)
+    data = load() if load is not None else None
+    if data is not None:
+        resp = _memory_response(request, data, path, headers, media_type, route)
+        if resp is not None:
+            return resp
+    resp = _CountedFileResponse(path, media_type=media_type, headers=headers)
+    resp.chunk_size = FILE_CHUNK
+    resp.route = route
+    return resp
@@ -0,0 +1,90 @@
+# livetchat/server/hotcache.py
+# Cache mémoire des médias "chauds" pour la ruée qui suit une media_notice : tous les
+# clients demandent le même /files/... au même moment.
+#  - LRU borné en octets (HOT_CACHE_BYTES), fichiers > HOT_CACHE_MAX_ITEM jamais mis en cache
+#  - rempli directement par /upload/ (contenu déjà en mémoire) et par les variantes
+#  - sur un miss, une seule lecture disque par fichier ("single-flight") : les requêtes
+#    concurrentes attendent le résultat de la première
+# Les routes /files/* tournent dans le threadpool : verrou threading, pas asyncio.
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from livetchat.server.metrics import REGISTRY
+
+HOT_REQUESTS = REGISTRY.counter("livetchat_hotcache_requests_total", "Lectures du cache chaud (hit / miss / coalesced)",
+                                ("result",))
+HOT_EVICTIONS = REGISTRY.counter("livetchat_hotcache_evictions_total", "Entrées sorties du cache chaud faute de place")
+
+
+class HotCache:
+
+    def __init__(self, budget_bytes: int = 256_000_000, max_item_bytes: int = 8_000_000):
+        self.budget = budget_bytes
+        self.max_item = min(max_item_bytes, budget_bytes)
+        self.bytes = 0
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._inflight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def cacheable(self, size: int) -> bool:
+        return 0 < size <= self.max_item
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                HOT_REQUESTS.inc("hit")
+            return data
+
+    def put(self, key: str, data: bytes):
+        if not self.cacheable(len(data)):
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self._items[key] = data
+            self.bytes += len(data)
+            while self.bytes > self.budget:
+                _, dropped = self._items.popitem(last=False)
+                self.bytes -= len(dropped)
+                HOT_EVICTIONS.inc()
+
+    def discard(self, key: str):
+        with self._lock:
+            data = self._items.pop(key, None)
+            if data is not None:
+                self.bytes -= len(data)
+
+    def fetch(self, key: str, size: int) -> bytes | None:
+        """Contenu de `key` (chemin) depuis le cache, sinon lu une seule fois ; None si non cacheable."""
+        if not self.cacheable(size):
+            return None
+        data = self.get(key)
+        if data is not None:
+            return data
+        with self._lock:
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+            HOT_REQUESTS.inc("miss" if leader else "coalesced")
+        if not leader:
+            return fut.result()
+        try:
+            with open(key, "rb") as f:
+                data = f.read()
+            self.put(key, data)
+            fut.set_result(data)
+            return data
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
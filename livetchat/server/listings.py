@@ -0,0 +1,79 @@
+# livetchat/server/listings.py
+# Listes paginées des médias (/files/<kind>/?cursor=...&limit=...), du plus récent au plus ancien.
+# L'ordre trié est gardé en cache par type et reconstruit seulement quand la version du store
+# change (upload / suppression / variantes / nouveau nom) ; une page = bisect + `limit` éléments.
+# ETag = position dans le journal du store de la dernière modification du type (même valeur dans
+# tous les workers) : un tableau de bord qui re-demande sans changement reçoit un 304, quel que
+# soit le worker qui répond.
+# Le dernier accès (atime) n'est pas listé : touch() ne change pas la version, il rendrait le 304 faux.
+import time
+from bisect import bisect_right
+
+from livetchat.server.store import MediaStore, MediaEntry
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+REFRESH_S = 1.0      # relecture du journal (ajouts des autres workers) au plus une fois par seconde
+
+
+class BadCursor(ValueError):
+    pass
+
+
+def _key(e: MediaEntry) -> tuple:
+    return (-e.created, e.hash)
+
+
+def encode_cursor(e: MediaEntry) -> str:
+    return f"{e.created!r}_{e.hash}"
+
+
+def decode_cursor(cursor: str) -> tuple:
+    created, _, h = cursor.partition("_")
+    try:
+        return (-float(created), h)
+    except ValueError:
+        raise BadCursor(cursor)
+
+
+def describe(e: MediaEntry) -> dict:
+    item = {"filename": e.filename, "kind": e.kind, "size": e.size, "disk_size": e.disk_size,
+            "created": e.created, "names": e.names}
+    if e.width:
+        item["width"], item["height"] = e.width, e.height
+    return item
+
+
+class MediaListing:
+
+    def __init__(self, store: MediaStore):
+        self.store = store
+        self._cache: dict[str, tuple[int, list[tuple], list[MediaEntry]]] = {}   # kind -> (version, clés, entrées)
+        self._refreshed_at = 0.0
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._refreshed_at >= REFRESH_S:
+            self._refreshed_at = now
+            self.store.refresh()
+
+    def etag(self, kind: str) -> str:
+        self._refresh()
+        return f'"{self.store.journal_mark(kind)}"'
+
+    def _sorted(self, kind: str) -> tuple[list[tuple], list[MediaEntry]]:
+        version = self.store.versions.get(kind, 0)
+        cached = self._cache.get(kind)
+        if cached is None or cached[0] != version:
+            entries = sorted(self.store.snapshot(kind), key=_key)
+            cached = self._cache[kind] = (version, [_key(e) for e in entries], entries)
+        return cached[1], cached[2]
+
+    def page(self, kind: str, cursor: str | None = None, limit: int = DEFAULT_LIMIT) -> dict:
+        keys, entries = self._sorted(kind)
+        start = bisect_right(keys, decode_cursor(cursor)) if cursor else 0
+        limit = max(1, min(limit, MAX_LIMIT))
+        items = entries[start:start + limit]
+        more = start + limit < len(entries)
+        return {"items": [describe(e) for e in items], "total": len(entries),
+                "next_cursor": encode_cursor(items[-1]) if items and more else None}
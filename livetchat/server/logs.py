@@ -0,0 +1,41 @@
+# livetchat/server/logs.py
+# Journalisation non bloquante : les appels log.info(...) ne font que déposer l'enregistrement
+# dans une queue en mémoire ; un thread (QueueListener) se charge de l'écriture sur stdout.
+# L'event loop ne paie donc plus l'écriture synchrone sur le terminal / le pipe du superviseur.
+import logging, queue, sys
+from logging.handlers import QueueHandler, QueueListener
+
+log = logging.getLogger("livetchat")
+_listener: QueueListener | None = None
+
+
+class _FastQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # le formatage (f-strings déjà faites côté appelant) est laissé au thread d'écriture
+        return record
+
+
+def start_logging(level: int = logging.INFO):
+    """Idempotent : branche le handler sur une queue et démarre le thread d'écriture."""
+    global _listener
+    if _listener is not None:
+        return
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    out = logging.StreamHandler(sys.stdout)
+    out.setFormatter(logging.Formatter("%(message)s"))    # même rendu que les anciens print()
+    _listener = QueueListener(q, out, respect_handler_level=False)
+    _listener.start()
+    log.handlers[:] = [_FastQueueHandler(q)]
+    log.setLevel(level)
+    log.propagate = False
+
+
+def stop_logging():
+    """Vide la queue (les derniers messages sont écrits) puis arrête le thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+start_logging()
@@ -1,23 +1,57 @@
 # livetchat/server/main.py
+# Lancement : python -m livetchat.server (cf. __main__.py)
 import os
-import hashlib
 import json
-from fastapi import (
-    FastAPI, WebSocket, WebSocketDisconnect,
-    UploadFile, File, Form, Request
-)
+import time
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
 
 from livetchat.server.ws_manager import ConnectionManager
+from livetchat.server.backplane import make_backplane
 from livetchat.server import settings
+from livetchat.server.uploads import receive_upload, UploadRejected, MAX_FIELD_BYTES
+from livetchat.server.resumable import UploadSessions
+from livetchat.server.store import MediaStore
+from livetchat.server.fileserve import serve_media, etag_matches
+from livetchat.server.listings import MediaListing, BadCursor, DEFAULT_LIMIT
+from livetchat.server.notices import NoticeBatcher
+from livetchat.server.replay import SeqAllocator, ReplayBuffer
+from livetchat.server.variants import VariantBuilder
+from livetchat.server.retention import Retention
+from livetchat.server.hotcache import HotCache
+from livetchat.server.ratelimit import RateLimiter, InflightGate, RATE_DECISIONS, retry_after
+from livetchat.server.broadcaster import broadcast_blob_textb64, broadcast_blob_bin, broadcast_blob_frames
+from livetchat.shared.protocol import EXT_MIME, START_AFTER_IMAGE_MS, START_AFTER_VIDEO_MS, START_AFTER_AUDIO_MS
+from livetchat.shared.utils import now_ms
+from livetchat.shared.frames import VERSION as FRAME_VERSION
 from livetchat.server.routes_manifest import router as manifest_router  # /manifest.json
+from livetchat.server.logs import log, stop_logging
+from livetchat.server.tasks import background
+from livetchat.server import metrics
 
 # ------------------------------------------------------------
 # App & CORS
 # ------------------------------------------------------------
-app = FastAPI(title="LiveTchat — HTTP upload + WS notif")
+@asynccontextmanager
+async def lifespan(_app):
+    await manager.start()
+    manager.start_heartbeat(WS_HEARTBEAT_S, WS_HEARTBEAT_TIMEOUT_S)
+    background(variants.warmup(), "variants.warmup")
+    retention.start()
+    yield
+    await retention.stop()
+    variants.shutdown()
+    await manager.stop()
+    stop_logging()
+
+app = FastAPI(title="LiveTchat — HTTP upload + WS notif", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
@@ -27,7 +61,7 @@ app.add_middleware(
 try:
     app.mount("/downloads", StaticFiles(directory=settings.DOWNLOAD_DIR), name="downloads")
 except Exception as e:
-    print("[WARN] downloads mount skipped:", e)
+    log.warning(f"[WARN] downloads mount skipped: {e}")
 
 # Route manifest (version, url, sha256)
 app.include_router(manifest_router)
@@ -38,138 +72,543 @@ app.include_router(manifest_router)
 IMAGE_DIR = getattr(settings, "IMAGE_DIR", "/home/user/final_livetchat/images")
 VIDEO_DIR = getattr(settings, "VIDEO_DIR", "/home/user/final_livetchat/videos")
 AUDIO_DIR = getattr(settings, "AUDIO_DIR", "/home/user/final_livetchat/audios")
-for d in (IMAGE_DIR, VIDEO_DIR, AUDIO_DIR):
-    os.makedirs(d, exist_ok=True)
+UPLOAD_TMP_DIR = getattr(settings, "UPLOAD_TMP_DIR", "/home/user/final_livetchat/tmp")
+MEDIA_INDEX = getattr(settings, "MEDIA_INDEX", "/home/user/final_livetchat/index.jsonl")
+os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
 
 # ------------------------------------------------------------
-# WS manager & utilitaires
+# WS manager & store (dédup persistante par hash de contenu)
 # ------------------------------------------------------------
-manager = ConnectionManager()
-stored_hashes: set[str] = set()   # dédup simple en mémoire (hash contenu)
+WS_HEARTBEAT_S = getattr(settings, "WS_HEARTBEAT_S", 15.0)
+WS_HEARTBEAT_TIMEOUT_S = getattr(settings, "WS_HEARTBEAT_TIMEOUT_S", 45.0)
+BACKPLANE = getattr(settings, "BACKPLANE", "inprocess")
+BACKPLANE_DIR = getattr(settings, "BACKPLANE_DIR", "/tmp/livetchat-backplane")
+manager = ConnectionManager(
+    max_queue_bytes=getattr(settings, "WS_MAX_QUEUE_BYTES", 32_000_000),
+    max_lag_s=getattr(settings, "WS_MAX_LAG_S", 10.0),
+    slow_policy=getattr(settings, "WS_SLOW_POLICY", "degrade"),
+    # "unix" pour plusieurs workers sur la même machine (cf. settings.WORKERS)
+    backplane=make_backplane(BACKPLANE, BACKPLANE_DIR),
+)
+# numéros de séquence partagés entre workers (fichier) seulement si le backplane les relie
+notices = NoticeBatcher(
+    manager, window_ms=getattr(settings, "NOTICE_BATCH_MS", 5),
+    seq=SeqAllocator(os.path.join(BACKPLANE_DIR, "seq") if BACKPLANE == "unix" else None),
+    replay=ReplayBuffer(getattr(settings, "REPLAY_EVENTS", 1000), getattr(settings, "REPLAY_MAX_AGE_S", 300.0)),
+)
+store = MediaStore({"image": IMAGE_DIR, "video": VIDEO_DIR, "audio": AUDIO_DIR}, MEDIA_INDEX)
+store.load()
+listing = MediaListing(store)
+# cache mémoire des médias récents / demandés (ruée de téléchargements après chaque notice)
+hot = HotCache(getattr(settings, "HOT_CACHE_BYTES", 256_000_000), getattr(settings, "HOT_CACHE_MAX_ITEM", 8_000_000))
+store.on_delete.append(lambda paths: [hot.discard(p) for p in paths])
+variants = VariantBuilder(store, getattr(settings, "VARIANT_BOXES", [(1280, 720), (1920, 1080)]),
+                          workers=getattr(settings, "VARIANT_WORKERS", 2))
+VARIANT_WAIT_S = getattr(settings, "VARIANT_WAIT_MS", 50) / 1000.0
+retention = Retention(store, getattr(settings, "MEDIA_QUOTA_BYTES", {}),
+                      max_age_s=getattr(settings, "MEDIA_MAX_AGE_S", 0),
+                      interval_s=getattr(settings, "GC_INTERVAL_S", 60),
+                      batch=getattr(settings, "GC_BATCH", 50),
+                      grace_s=getattr(settings, "GC_GRACE_S", 300))
+
+def _with_variants(notice: dict, entry) -> dict:
+    if entry.variants:
+        notice["width"], notice["height"] = entry.width, entry.height
+        notice["variants"] = entry.variants
+    return notice
 
-def md5(data: bytes) -> str:
-    h = hashlib.md5()
-    h.update(data)
-    return h.hexdigest()
+# Petits médias poussés directement sur le WS avec la notice (pas d'aller-retour HTTP par client)
+INLINE_MAX_BYTES = getattr(settings, "INLINE_MAX_BYTES", 64_000)
+INLINE_KINDS = getattr(settings, "INLINE_KINDS", ("image", "audio"))
+INLINE_ENCODING = getattr(settings, "INLINE_ENCODING", "frames")
+_push_blob = {"bin": broadcast_blob_bin, "b64": broadcast_blob_textb64, "frames": broadcast_blob_frames}[INLINE_ENCODING]
+INLINE_START_AFTER_MS = getattr(settings, "INLINE_START_AFTER_MS", 300)
+# Médias téléchargés : même cible commune en temps serveur, plus loin (le temps du téléchargement)
+PULL_START_AFTER_MS = getattr(settings, "PULL_START_AFTER_MS", {
+    "image": START_AFTER_IMAGE_MS, "video": START_AFTER_VIDEO_MS, "audio": START_AFTER_AUDIO_MS})
+_push_lock = asyncio.Lock()   # un blob à la fois : clients historiques à un seul blob en cours, mode "bin" sans event_id
 
-def classify(filename: str) -> str:
-    ext = os.path.splitext(filename)[1].lower()
-    if ext in (".jpg", ".jpeg", ".png", ".gif"):
-        return "image"
-    if ext in (".mp4",):
-        return "video"
-    if ext in (".mp3", ".wav", ".ogg", ".m4a"):
-        return "audio"
-    return "unknown"
+async def _push_inline(notice: dict, entry, content):
+    """Diffuse le contenu (trames <kind>_start / chunks / _end) AVANT la notice, qui y renvoie via
+    "inline" = event_id ; un client qui n'a pas le blob (dégradé, replay) retombe sur /files/*."""
+    event_id = uuid.uuid4().hex
+    async with _push_lock:
+        await _push_blob(manager, entry.kind, username=notice["username"], display_time=notice["display_time"],
+                         display_text=notice["display_text"], content=content,
+                         content_type=EXT_MIME.get(entry.ext, "application/octet-stream"),
+                         start_after_ms=INLINE_START_AFTER_MS, event_id=event_id)
+    notice["inline"] = event_id
 
-def folder_for(kind: str) -> str:
-    return IMAGE_DIR if kind == "image" else VIDEO_DIR if kind == "video" else AUDIO_DIR
+def _warm_variants(entry):
+    folder = os.path.dirname(store.path_for(entry.kind, entry.hash, entry.ext))
+    for v in entry.variants or ():
+        try:
+            hot.fetch(os.path.join(folder, v["filename"]), v["size"])
+        except OSError:
+            pass
+
+async def _publish_after_variants(notice: dict, entry):
+    # l'upload a déjà répondu ; les variantes figurent dans la notice seulement si elles sont
+    # prêtes en VARIANT_WAIT_S (petite image), sinon elle part sans (les clients prendront l'original)
+    build = variants.schedule(entry)
+    try:
+        await asyncio.wait_for(asyncio.shield(build), VARIANT_WAIT_S)
+    except asyncio.TimeoutError:
+        pass
+    await notices.publish(_with_variants(notice, entry))
+    await build
+    await run_in_threadpool(_warm_variants, entry)   # pour les prochains clients / ré-envois
 
 # ------------------------------------------------------------
 # HTTP: Upload
 # ------------------------------------------------------------
+# Admission : seaux à jetons par IP et par pseudo + plafond global d'uploads simultanés
+limiter = RateLimiter(getattr(settings, "RATE_UPLOADS_PER_S", 0.5), getattr(settings, "RATE_UPLOADS_BURST", 5),
+                      getattr(settings, "RATE_BYTES_PER_S", 2_000_000), getattr(settings, "RATE_BYTES_BURST", 50_000_000),
+                      idle_s=getattr(settings, "RATE_IDLE_S", 600))
+upload_gate = InflightGate(getattr(settings, "MAX_INFLIGHT_UPLOADS", 32))
+
+def _admit(scope: str, key: str, nbytes: int, requests: int = 1):
+    wait = limiter.acquire(f"{scope}:{key}", nbytes, requests)
+    RATE_DECISIONS.inc(scope, "limited" if wait else "allowed")
+    if wait:
+        raise UploadRejected("RATE_LIMITED", 429, reason=f"{scope}_rate({key})", headers=retry_after(wait))
+
+def _admit_user(fields: dict, nbytes: int, requests: int = 1):
+    # "guest" = tous les anonymes : pas de seau commun, la limite par IP suffit
+    username = fields.get("username") or "guest"
+    if username != "guest":
+        _admit("user", username, nbytes, requests)
+
+def _charge(ip: str, fields: dict, nbytes: int):
+    # taille non annoncée (chunked) : octets facturés après coup
+    limiter.charge(f"ip:{ip}", nbytes)
+    if (fields.get("username") or "guest") != "guest":
+        limiter.charge(f"user:{fields['username']}", nbytes)
+
+def _refund(ip: str, fields: dict):
+    limiter.refund(f"ip:{ip}")
+    username = fields.get("username") or "guest"
+    if username != "guest":
+        limiter.refund(f"user:{username}")
+
+SMALL_FORM_FIELDS = 16
+SMALL_FORM_BYTES = SMALL_FORM_FIELDS * MAX_FIELD_BYTES
+
+async def _small_form(request: Request) -> dict:
+    """Champs texte d'un petit formulaire (by-hash, création de session) : aucun fichier accepté,
+    corps borné à SMALL_FORM_BYTES (Content-Length exigé, octets reçus recomptés) ; rien n'est écrit
+    sur disque. Les limites de request.form() ne couvrent que le multipart, pas l'urlencoded."""
+    declared = request.headers.get("content-length", "")
+    if not declared.isdigit() or int(declared) > SMALL_FORM_BYTES:
+        raise UploadRejected("TOO_LARGE", 413, reason=f"form_length={declared or '?'}")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > SMALL_FORM_BYTES:          # Content-Length sous-évalué
+            raise UploadRejected("TOO_LARGE", 413, reason="form_overflow")
+
+    async def replay():
+        return {"type": "http.request", "body": bytes(body), "more_body": False}
+    try:
+        form = await Request(request.scope, replay).form(max_files=0, max_fields=SMALL_FORM_FIELDS,
+                                                         max_part_size=MAX_FIELD_BYTES)
+    except HTTPException as e:
+        raise UploadRejected("BAD_FORM", 422, reason=f"form({e.detail})") from None
+    return {k: v for k, v in form.items() if isinstance(v, str)}
+
 @app.post("/upload/")
-async def upload_media(
-    request: Request,
-    file: UploadFile = File(...),
-    display_time: float = Form(...),
-    display_text: str = Form(""),
-    username: str = Form("guest"),
-):
-    data = await file.read()
-    size = len(data)
+async def upload_media(request: Request):
+    # corps lu en streaming (cf. uploads.py) : fichier temporaire + hash incrémental,
+    # limites MAX_*_BYTES appliquées pendant la réception
     ip = request.client.host if request.client else "?"
-    kind = classify(file.filename)
-
-    if kind == "unknown":
-        print(f"[UPLOAD] REJECT {ip} user='{username}' name='{file.filename}' reason=unsupported")
-        return JSONResponse({"error": "UNSUPPORTED_FORMAT"}, status_code=400)
-
-    # enregistrer (avec déduplication simple par MD5)
-    h = md5(data)
-    folder = folder_for(kind)
-    filename = f"{h}_{file.filename}"
-    path = os.path.join(folder, filename)
-    is_new = False
-
-    if h not in stored_hashes or not os.path.exists(path):
-        with open(path, "wb") as f:
-            f.write(data)
-        stored_hashes.add(h)
-        is_new = True
-
-    print(
-        f"[UPLOAD] {ip} user='{username}' kind={kind} name='{file.filename}' "
-        f"saved='{filename}' size={size}B md5={h} new={is_new}"
+    t0 = time.perf_counter()
+    if not upload_gate.enter():
+        RATE_DECISIONS.inc("global", "limited")
+        return _rejected(ip, t0, UploadRejected("BUSY", 429, reason="inflight_cap", headers=retry_after(1)))
+    try:
+        return await _upload(request, ip, t0)
+    finally:
+        upload_gate.leave()
+
+def _rejected(ip: str, t0: float, e: UploadRejected) -> JSONResponse:
+    log.info(f"[UPLOAD] REJECT {ip} reason={e.reason}")
+    metrics.UPLOADS.inc(e.error)
+    metrics.UPLOAD_SECONDS.observe(time.perf_counter() - t0, "rejected")
+    return JSONResponse({"error": e.error}, status_code=e.status_code, headers=e.headers)
+
+async def _upload(request: Request, ip: str, t0: float):
+    declared = request.headers.get("content-length", "")
+    declared = int(declared) if declared.isdigit() else 0
+    admitted = {}
+
+    def admit_user(fields: dict):
+        admitted["username"] = fields.get("username") or "guest"
+        _admit_user(fields, declared)
+
+    try:
+        _admit("ip", ip, declared)       # avant de lire le moindre octet du corps
+        up = await receive_upload(request, UPLOAD_TMP_DIR, keep_bytes=hot.max_item, admit=admit_user)
+        if (up.fields.get("username") or "guest") != admitted.get("username", "guest"):
+            # pseudo arrivé après la partie fichier : son seau n'a pas encore été débité
+            try:
+                _admit_user(up.fields, declared)
+            except UploadRejected:
+                await run_in_threadpool(os.remove, up.tmp_path)
+                raise
+    except UploadRejected as e:
+        return _rejected(ip, t0, e)
+    if not declared:
+        _charge(ip, up.fields, up.size)
+
+    try:
+        float(up.fields.get("display_time", ""))
+    except ValueError:
+        await run_in_threadpool(os.remove, up.tmp_path)
+        log.info(f"[UPLOAD] REJECT {ip} name='{up.filename}' reason=bad_display_time")
+        metrics.UPLOADS.inc("BAD_FORM")
+        metrics.UPLOAD_SECONDS.observe(time.perf_counter() - t0, "rejected")
+        return JSONResponse({"error": "BAD_FORM"}, status_code=422)
+    username = up.fields.get("username", "guest")
+    size, h = up.size, up.digest
+
+    # enregistrer dans le store (dédup par hash) : rename atomique du temporaire
+    ext = os.path.splitext(up.filename)[1].lower()
+    entry, is_new = await store.put(up.tmp_path, h, kind=up.kind, ext=ext, size=size, name=up.filename)
+    kind, filename = entry.kind, entry.filename
+    if up.data is not None:
+        hot.put(store.path_for(kind, entry.hash, entry.ext), up.data)
+
+    log.info(
+        f"[UPLOAD] {ip} user='{username}' kind={kind} name='{up.filename}' "
+        f"saved='{filename}' size={size}B sha256={h[:16]} new={is_new}"
     )
 
-    # notifier tous les clients via WS
+    await _announce(entry, is_new, up.fields, up.data)
+    metrics.UPLOADS.inc("ok")
+    metrics.UPLOAD_BYTES.observe(size, kind)
+    metrics.UPLOAD_SECONDS.observe(time.perf_counter() - t0, "ok")
+    return {"filename": filename, "kind": kind, "is_new": is_new}
+
+async def _announce(entry, is_new: bool, fields: dict, data: bytes | None):
+    # notifier tous les clients via WS (regroupé avec les autres uploads de la même rafale) ;
+    # pour une image nouvelle, la notice attend (brièvement) ses variantes en tâche de fond
+    kind = entry.kind
     notice = {
         "type": "media_notice",
         "kind": kind,
-        "filename": filename,
-        "display_time": float(display_time),
-        "display_text": display_text or "",
-        "username": username or "guest",
+        "filename": entry.filename,
+        "display_time": float(fields["display_time"]),
+        "display_text": fields.get("display_text") or "",
+        "username": fields.get("username") or "guest",
         "is_new": is_new,
+        # lecture à max(fin du téléchargement, server_ts_ms + start_after_ms) chez les clients synchronisés
+        "server_ts_ms": now_ms(),
+        "start_after_ms": PULL_START_AFTER_MS.get(kind, 0),
     }
-    await manager.broadcast_json(notice)
-    print(f"[NOTICE] {kind} '{filename}' -> {manager.receivers_count()} client(s)")
+    if kind in INLINE_KINDS and 0 < entry.size <= INLINE_MAX_BYTES:
+        await _push_inline(notice, entry, data if data is not None else store.path_for(kind, entry.hash, entry.ext))
+        await notices.publish(notice)
+        metrics.NOTICES.inc("inline")
+        if variants.needed(entry):
+            variants.schedule(entry)     # pour les prochains ré-envois / clients en pull
+    elif variants.needed(entry):
+        background(_publish_after_variants(notice, entry), f"notice:{entry.filename}")
+        metrics.NOTICES.inc("pull")
+    else:
+        await notices.publish(_with_variants(notice, entry))
+        metrics.NOTICES.inc("pull")
 
-    return {"filename": filename, "kind": kind, "is_new": is_new}
+@app.post("/upload/by-hash/")
+async def upload_by_hash(request: Request):
+    """Ré-envoi d'un média que le serveur a déjà : le client envoie seulement le SHA-256 du contenu
+    (+ les champs habituels) ; 404 UNKNOWN_HASH -> il fait un /upload/ complet."""
+    ip = request.client.host if request.client else "?"
+    t0 = time.perf_counter()
+    try:
+        _admit("ip", ip, 0)               # avant de lire le formulaire ; le contenu ne coûte rien, la diffusion si
+        fields = await _small_form(request)
+    except UploadRejected as e:
+        return _rejected(ip, t0, e)
+    h = fields.get("sha256", "").lower()
+    try:
+        float(fields.get("display_time", ""))
+        if len(h) != 64 or not all(c in "0123456789abcdef" for c in h):
+            raise ValueError
+    except ValueError:
+        return JSONResponse({"error": "BAD_FORM"}, status_code=422)
+    try:
+        _admit_user(fields, 0)
+    except UploadRejected as e:
+        return _rejected(ip, t0, e)
+
+    name = fields.get("filename") or "?"
+    entry = await run_in_threadpool(store.claim, h, name)
+    if entry is None:
+        # rien n'est diffusé et le client enchaîne sur /upload/, qui sera facturé : jeton rendu
+        _refund(ip, fields)
+        metrics.UPLOADS.inc("UNKNOWN_HASH")
+        return JSONResponse({"error": "UNKNOWN_HASH"}, status_code=404)
+    log.info(f"[UPLOAD] {ip} user='{fields.get('username', 'guest')}' kind={entry.kind} name='{name}' "
+             f"saved='{entry.filename}' sha256={h[:16]} by_hash")
+    await _announce(entry, False, fields, hot.get(store.path_for(entry.kind, entry.hash, entry.ext)))
+    metrics.UPLOADS.inc("by_hash")
+    metrics.UPLOAD_SECONDS.observe(time.perf_counter() - t0, "ok")
+    return {"filename": entry.filename, "kind": entry.kind, "is_new": False}
+
+# ------------------------------------------------------------
+# HTTP: Upload reprenable par morceaux (resumable.py) — gros fichiers, liaisons instables
+# ------------------------------------------------------------
+sessions = UploadSessions(UPLOAD_TMP_DIR, chunk_bytes=getattr(settings, "RESUMABLE_CHUNK_BYTES", 1_000_000),
+                          ttl_s=getattr(settings, "RESUMABLE_TTL_S", 3600))
+
+@app.post("/upload/sessions/")
+async def create_upload_session(request: Request):
+    ip = request.client.host if request.client else "?"
+    t0 = time.perf_counter()
+    try:
+        _admit("ip", ip, 0)               # avant de lire le formulaire
+        fields = await _small_form(request)
+    except UploadRejected as e:
+        return _rejected(ip, t0, e)
+    try:
+        size = int(fields.pop("size", ""))
+        float(fields.get("display_time", ""))
+    except ValueError:
+        return JSONResponse({"error": "BAD_FORM"}, status_code=422)
+    try:
+        # la création ne coûte qu'une requête : les octets sont facturés à chaque PUT de morceau
+        _admit_user(fields, 0)
+        meta = await run_in_threadpool(sessions.create, fields.pop("filename", ""), size,
+                                       fields.pop("sha256", "").lower(), fields)
+    except UploadRejected as e:
+        return _rejected(ip, t0, e)
+    log.info(f"[UPLOAD] {ip} session={meta['id']} name='{meta['filename']}' size={size}B")
+    return {"id": meta["id"], "size": size, "chunk_size": sessions.chunk_bytes, "received": []}
+
+@app.get("/upload/sessions/{sid}")
+def upload_session_status(sid: str):
+    try:
+        meta = sessions.meta(sid)
+    except UploadRejected as e:
+        return JSONResponse({"error": e.error}, status_code=e.status_code)
+    return {"id": sid, "size": meta["size"], "chunk_size": sessions.chunk_bytes, "received": sessions.received(sid)}
+
+@app.put("/upload/sessions/{sid}")
+async def upload_session_chunk(sid: str, request: Request, offset: int = 0):
+    # un morceau = un upload : même plafond d'uploads simultanés, octets facturés comme /upload/
+    ip = request.client.host if request.client else "?"
+    if not upload_gate.enter():
+        RATE_DECISIONS.inc("global", "limited")
+        return _chunk_rejected(sid, UploadRejected("BUSY", 429, reason="inflight_cap", headers=retry_after(1)))
+    try:
+        return await _upload_chunk(sid, request, offset, ip)
+    finally:
+        upload_gate.leave()
+
+def _chunk_rejected(sid: str, e: UploadRejected) -> JSONResponse:
+    log.info(f"[UPLOAD] REJECT session={sid} reason={e.reason}")
+    return JSONResponse({"error": e.error}, status_code=e.status_code, headers=e.headers)
+
+async def _upload_chunk(sid: str, request: Request, offset: int, ip: str):
+    declared = request.headers.get("content-length", "")
+    declared = int(declared) if declared.isdigit() else 0
+    received = 0
+
+    async def counted():
+        nonlocal received
+        async for chunk in request.stream():
+            received += len(chunk)
+            yield chunk
+    try:
+        meta = await run_in_threadpool(sessions.meta, sid)
+        _admit("ip", ip, declared, requests=0)     # avant de lire le corps
+        _admit_user(meta["fields"], declared, requests=0)
+        try:
+            ranges = await sessions.write(sid, offset, counted())
+        finally:
+            if not declared:
+                _charge(ip, meta["fields"], received)
+    except UploadRejected as e:
+        return _chunk_rejected(sid, e)
+    return {"id": sid, "received": ranges}
+
+@app.delete("/upload/sessions/{sid}")
+def abort_upload_session(sid: str):
+    try:
+        sessions.abort(sid)
+    except UploadRejected as e:
+        return JSONResponse({"error": e.error}, status_code=e.status_code)
+    return {"id": sid, "aborted": True}
+
+@app.post("/upload/sessions/{sid}/commit")
+async def commit_upload_session(sid: str, request: Request):
+    ip = request.client.host if request.client else "?"
+    t0 = time.perf_counter()
+    try:
+        meta, path = await sessions.commit(sid)
+    except UploadRejected as e:
+        if e.error not in ("INCOMPLETE", "IN_PROGRESS"):
+            return _rejected(ip, t0, e)
+        return JSONResponse({"error": e.error, "received": await run_in_threadpool(sessions.received, sid)},
+                            status_code=e.status_code)
+    ext = os.path.splitext(meta["filename"])[1].lower()
+    entry, is_new = await store.put(path, meta["sha256"], kind=meta["kind"], ext=ext, size=meta["size"],
+                                    name=meta["filename"])
+    log.info(
+        f"[UPLOAD] {ip} user='{meta['fields'].get('username', 'guest')}' kind={entry.kind} name='{meta['filename']}' "
+        f"saved='{entry.filename}' size={meta['size']}B sha256={entry.hash[:16]} new={is_new} session={sid}"
+    )
+    await _announce(entry, is_new, meta["fields"], None)
+    metrics.UPLOADS.inc("ok")
+    metrics.UPLOAD_BYTES.observe(meta["size"], entry.kind)
+    metrics.UPLOAD_SECONDS.observe(time.perf_counter() - t0, "ok")
+    return {"filename": entry.filename, "kind": entry.kind, "is_new": is_new}
 
 # ------------------------------------------------------------
-# HTTP: Récupération des fichiers (avec logs)
+# HTTP: Récupération des fichiers (avec logs) — ETag/304, Range/206, cache immutable
 # ------------------------------------------------------------
+def _lookup(kind: str, filename: str, request: Request):
+    """-> (entrée, chemin, chargeur du contenu via le cache chaud) ; None si introuvable."""
+    ip = request.client.host if request.client else "?"
+    found = store.resolve(kind, filename)
+    size = 0
+    if found is not None:
+        try:
+            size = os.stat(found[1]).st_size
+        except FileNotFoundError:
+            found = None
+    if found is None:
+        log.info(f"[GET-404] {kind} {filename} from {ip}")
+        metrics.FILES_REQUESTS.inc(f"{kind}s", "404")
+        return None
+    entry, path = found
+    store.touch(entry.hash)
+    log.info(f"[GET] {kind} {filename} to {ip}")
+    return entry, path, lambda: _hot_fetch(path, size)
+
+def _hot_fetch(path: str, size: int):
+    try:
+        return hot.fetch(path, size)
+    except OSError:
+        return None     # supprimé entre-temps : FileResponse répondra
+
 @app.get("/files/images/{filename}")
 def get_image(filename: str, request: Request):
-    path = os.path.join(IMAGE_DIR, filename)
-    ip = request.client.host if request.client else "?"
-    if not os.path.isfile(path):
-        print(f"[GET-404] image {filename} from {ip}")
+    found = _lookup("image", filename, request)
+    if found is None:
         return JSONResponse({"error": "not_found"}, status_code=404)
-    print(f"[GET] image {filename} to {ip}")
-    return FileResponse(path)
+    entry, path, load = found
+    return serve_media(request, path, os.path.splitext(os.path.basename(path))[0], route="images", load=load)   # hash ou hash.<w>x<h>
 
 @app.get("/files/videos/{filename}")
 def get_video(filename: str, request: Request):
-    path = os.path.join(VIDEO_DIR, filename)
-    ip = request.client.host if request.client else "?"
-    if not os.path.isfile(path):
-        print(f"[GET-404] video {filename} from {ip}")
+    found = _lookup("video", filename, request)
+    if found is None:
         return JSONResponse({"error": "not_found"}, status_code=404)
-    print(f"[GET] video {filename} to {ip}")
-    return StreamingResponse(open(path, "rb"), media_type="video/mp4")
+    entry, path, load = found
+    return serve_media(request, path, entry.hash, "video/mp4", route="videos", load=load)
 
 @app.get("/files/audios/{filename}")
 def get_audio(filename: str, request: Request):
-    path = os.path.join(AUDIO_DIR, filename)
-    ip = request.client.host if request.client else "?"
-    if not os.path.isfile(path):
-        print(f"[GET-404] audio {filename} from {ip}")
+    found = _lookup("audio", filename, request)
+    if found is None:
         return JSONResponse({"error": "not_found"}, status_code=404)
-    print(f"[GET] audio {filename} to {ip}")
-    return StreamingResponse(open(path, "rb"), media_type="application/octet-stream")
+    entry, path, load = found
+    return serve_media(request, path, entry.hash, "application/octet-stream", route="audios", load=load)
+
+# Listes paginées (plus récent d'abord) depuis l'index, cache invalidé par les écritures du store
+def _list(kind: str, request: Request, cursor: str | None, limit: int):
+    etag = listing.etag(kind)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    try:
+        page = listing.page(kind, cursor, limit)
+    except BadCursor:
+        return JSONResponse({"error": "bad_cursor"}, status_code=400)
+    return JSONResponse(page, headers={"ETag": etag, "Cache-Control": "no-cache"})
 
-# (Optionnel) petites listes pour debug
 @app.get("/files/images/")
-def list_images(): return os.listdir(IMAGE_DIR)
+def list_images(request: Request, cursor: str | None = None, limit: int = DEFAULT_LIMIT):
+    return _list("image", request, cursor, limit)
 @app.get("/files/videos/")
-def list_videos(): return os.listdir(VIDEO_DIR)
+def list_videos(request: Request, cursor: str | None = None, limit: int = DEFAULT_LIMIT):
+    return _list("video", request, cursor, limit)
 @app.get("/files/audios/")
-def list_audios(): return os.listdir(AUDIO_DIR)
+def list_audios(request: Request, cursor: str | None = None, limit: int = DEFAULT_LIMIT):
+    return _list("audio", request, cursor, limit)
+
+# Retard de livraison par worker émetteur (backplane)
+@app.get("/debug/backplane")
+def backplane_stats(): return manager.backplane.stats()
+
+# Connexions WS de ce worker (dernier signe de vie, file, RTT du heartbeat)
+@app.get("/debug/ws")
+def ws_connections(): return manager.connections()
+
+# ------------------------------------------------------------
+# Métriques Prometheus (valeurs de ce worker)
+# ------------------------------------------------------------
+metrics.REGISTRY.gauge("livetchat_ws_connections", "Connexions WS ouvertes", lambda: len(manager.active))
+metrics.REGISTRY.gauge("livetchat_ws_queue_bytes", "Octets en file vers les clients (total / pire client)",
+                       lambda: {(k,): v for k, v in manager.queue_stats().items() if k in ("total", "max")}, ("agg",))
+metrics.REGISTRY.gauge("livetchat_ws_max_lag_seconds", "Âge de la plus vieille trame en file",
+                       lambda: manager.queue_stats()["max_lag"])
+metrics.REGISTRY.gauge("livetchat_ws_degraded_connections", "Clients en mode dégradé",
+                       lambda: manager.queue_stats()["degraded"])
+metrics.REGISTRY.gauge("livetchat_store_media", "Médias indexés par type",
+                       lambda: {(k,): n for k, n in store.counts().items()}, ("kind",))
+metrics.REGISTRY.gauge("livetchat_uploads_inflight", "Uploads en cours", lambda: upload_gate.active)
+metrics.REGISTRY.gauge("livetchat_ratelimit_keys", "Clés suivies par le limiteur (IP + pseudos actifs)", lambda: len(limiter))
+metrics.REGISTRY.gauge("livetchat_hotcache_bytes", "Octets en cache chaud", lambda: hot.bytes)
+metrics.REGISTRY.gauge("livetchat_hotcache_items", "Entrées en cache chaud", lambda: len(hot))
+metrics.REGISTRY.gauge("livetchat_store_bytes", "Octets stockés par type (variantes comprises)",
+                       lambda: {(k,): v for k, v in store.usage.items()}, ("kind",))
+
+@app.get("/metrics")
+def get_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 # ------------------------------------------------------------
 # WebSocket: /ws (keep-open; notifications envoyées depuis /upload/)
 # ------------------------------------------------------------
 @app.websocket("/ws")
 async def websocket_endpoint(ws: WebSocket):
-    await manager.connect(ws)
+    # reconnexion : /ws?resume_from=<dernier seq reçu>&epoch=<epoch du hello>
     try:
-        # on ne s'échange pas de messages applicatifs ; on bloque sur lecture
+        resume_from = int(ws.query_params["resume_from"])
+    except (KeyError, ValueError):
+        resume_from = None
+    epoch = ws.query_params.get("epoch")
+    # /ws?frames=<version> : le client décode les trames binaires de shared/frames.py ; le hello
+    # lui dit s'il en recevra vraiment (sinon ses messages binaires sont des morceaux "bin" historiques)
+    negotiated = ws.query_params.get("frames") == str(FRAME_VERSION)
+    sends_frames = FRAME_VERSION if negotiated and INLINE_ENCODING == "frames" else None
+    await manager.connect(ws, initial=lambda: notices.hello(resume_from, epoch, frames_version=sends_frames),
+                          frames=negotiated)
+    try:
+        # messages applicatifs attendus : pongs du heartbeat, time_sync, rapports de lecture ;
+        # tout message compte comme signe de vie
         while True:
-            # ping/pong bas niveau garde la connexion; ici on attend juste un texte
-            await ws.receive_text()
+            msg = await ws.receive_text()
+            t1 = time.time() * 1000
+            pong_t = None
+            obj = None
+            if len(msg) < 512:
+                try:
+                    obj = json.loads(msg)
+                except ValueError:
+                    pass
+            if isinstance(obj, dict):
+                mtype = obj.get("type")
+                if mtype == "pong":
+                    try: pong_t = int(obj.get("t", 0))
+                    except (TypeError, ValueError): pass
+                elif mtype == "time_sync":
+                    manager.time_sync(ws, obj, t1)
+                elif mtype == "playback":
+                    manager.playback_report(ws, obj)
+            manager.seen(ws, pong_t)
     except WebSocketDisconnect:
         await manager.disconnect(ws)
     except Exception:
@@ -180,13 +619,18 @@ async def websocket_endpoint(ws: WebSocket):
 # ------------------------------------------------------------
 def main():
     import uvicorn
+    workers = getattr(settings, "WORKERS", 1)
+    if workers > 1 and BACKPLANE != "unix":
+        log.warning("[WARN] WORKERS > 1 sans BACKPLANE='unix' : les notices ne traverseront pas les workers")
     uvicorn.run(
         "livetchat.server.main:app",
         host=settings.HOST,
         port=settings.PORT,
         reload=False,
         access_log=False,
+        workers=workers,
+        # pings WebSocket protocolaires : couvrent aussi les clients sans heartbeat applicatif ;
+        # 0 = désactivé (uvicorn attend None)
+        ws_ping_interval=WS_HEARTBEAT_S if WS_HEARTBEAT_S > 0 else None,
+        ws_ping_timeout=WS_HEARTBEAT_TIMEOUT_S if WS_HEARTBEAT_S > 0 and WS_HEARTBEAT_TIMEOUT_S > 0 else None,
     )
-
-if __name__ == "__main__":
-    main()
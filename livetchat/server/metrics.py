@@ -0,0 +1,150 @@
+# livetchat/server/metrics.py
+# Métriques en mémoire exposées sur /metrics (format texte Prometheus 0.0.4).
+# Compteurs / jauges / histogrammes minimalistes : une mise à jour = quelques opérations
+# en mémoire sous un verrou court, sans I/O (appelés depuis l'event loop ET le threadpool :
+# store, uploads, fileserve).
+# Chaque worker expose ses propres valeurs (scraper chaque worker, ou WORKERS=1).
+import threading
+from bisect import bisect_left
+from typing import Callable
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000, 50_000_000, 100_000_000, 200_000_000)
+
+
+def _esc(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_esc(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: tuple = ()):
+        self.name, self.doc, self.labelnames = name, doc, tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, doc, labels=()):
+        super().__init__(name, doc, labels)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labels, n: float = 1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + n
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = list(self.values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in values]
+
+
+class Gauge(_Metric):
+    """Jauge lue au moment du scrape : `fn()` renvoie {valeurs de labels: valeur} ou un nombre."""
+    kind = "gauge"
+
+    def __init__(self, name, doc, fn: Callable, labels=()):
+        super().__init__(name, doc, labels)
+        self.fn = fn
+
+    def render(self) -> list[str]:
+        v = self.fn()
+        items = v.items() if isinstance(v, dict) else [((), v)]
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_num(x)}" for k, x in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, buckets=LATENCY_BUCKETS, labels=()):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+        self.series: dict[tuple, list] = {}     # labels -> [compte par bucket (+Inf inclus), somme]
+
+    def observe(self, value: float, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self.series.get(labels)
+            if s is None:
+                s = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            s[0][i] += 1
+            s[1] += value
+
+    def render(self) -> list[str]:
+        out = self.header()
+        with self._lock:
+            series = [(k, list(counts), total) for k, (counts, total) in self.series.items()]
+        for k, counts, total in series:
+            acc = 0
+            for le, c in zip(self.buckets + ("+Inf",), counts):
+                acc += c
+                le = 'le="' + (le if le == "+Inf" else _num(le)) + '"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, k, le)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, k)} {_num(total)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, k)} {acc}")
+        return out
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics: list[_Metric] = []
+
+    def register(self, m):
+        self.metrics.append(m)
+        return m
+
+    def counter(self, name, doc, labels=()) -> Counter:
+        return self.register(Counter(name, doc, labels))
+
+    def gauge(self, name, doc, fn, labels=()) -> Gauge:
+        return self.register(Gauge(name, doc, fn, labels))
+
+    def histogram(self, name, doc, buckets=LATENCY_BUCKETS, labels=()) -> Histogram:
+        return self.register(Histogram(name, doc, buckets, labels))
+
+    def render(self) -> str:
+        lines = []
+        for m in self.metrics:
+            try:
+                lines += m.render()
+            except Exception as e:      # une jauge cassée ne doit pas masquer les autres
+                lines.append(f"# {m.name} unavailable: {e}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ---------------- métriques communes (les jauges sont branchées dans main.py) ----------------
+UPLOAD_BYTES = REGISTRY.histogram("livetchat_upload_bytes", "Taille des uploads acceptés", SIZE_BUCKETS, ("kind",))
+UPLOAD_SECONDS = REGISTRY.histogram("livetchat_upload_seconds", "Durée de traitement de /upload/", labels=("outcome",))
+UPLOADS = REGISTRY.counter("livetchat_uploads_total", "Uploads par résultat (ok ou raison du refus)", ("outcome",))
+NOTICES = REGISTRY.counter("livetchat_notices_total", "Notices par mode de livraison (inline = média poussé sur le WS)",
+                           ("delivery",))
+FANOUT_SECONDS = REGISTRY.histogram("livetchat_broadcast_fanout_seconds",
+                                    "Mise en file d'une trame pour tous les clients du worker", labels=("source",))
+WS_SEND_LAG = REGISTRY.histogram("livetchat_ws_send_lag_seconds", "Attente d'une trame dans la file d'un client avant envoi")
+WS_QUEUE_AT_SEND = REGISTRY.histogram("livetchat_ws_queue_depth_bytes", "Profondeur de file d'un client à chaque envoi",
+                                      SIZE_BUCKETS)
+WS_REAPED = REGISTRY.counter("livetchat_ws_reaped_total", "Connexions WS fermées faute de pong")
+WS_DROPPED = REGISTRY.counter("livetchat_ws_dropped_frames_total", "Trames jetées pour clients lents", ("reason",))
+PLAYBACK_SKEW = REGISTRY.histogram("livetchat_playback_skew_seconds",
+                                   "Écart |début de lecture - cible serveur| rapporté par les clients synchronisés")
+FILES_BYTES = REGISTRY.counter("livetchat_files_bytes_total", "Octets servis par route /files/*", ("route",))
+FILES_REQUESTS = REGISTRY.counter("livetchat_files_requests_total", "Requêtes /files/* par statut", ("route", "status"))
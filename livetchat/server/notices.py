@@ -0,0 +1,85 @@
+# livetchat/server/notices.py
+# Regroupe les media_notice émises pendant une courte fenêtre (quelques ms) en une seule
+# trame "media_notice_batch" par client : 1 encodage JSON + 1 envoi par rafale au lieu de N.
+# Chaque notice reçoit un numéro "seq" et reste en mémoire (replay.py) pour les reconnexions.
+import asyncio, json
+from livetchat.server.ws_manager import ConnectionManager
+from livetchat.server.replay import SeqAllocator, ReplayBuffer
+from livetchat.server.logs import log
+from livetchat.server.tasks import background
+
+
+class NoticeBatcher:
+
+    def __init__(self, manager: ConnectionManager, window_ms: float = 5, max_batch: int = 64,
+                 seq: SeqAllocator | None = None, replay: ReplayBuffer | None = None):
+        self.manager = manager
+        self.window_s = max(0.0, window_ms) / 1000.0
+        self.max_batch = max_batch
+        self.seq = seq or SeqAllocator()
+        self.replay = replay or ReplayBuffer()
+        self._pending: list[dict] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._flushing = asyncio.Lock()    # lots envoyés dans l'ordre de leurs seq
+        manager.remote_listeners.append(self._on_remote)
+
+    async def publish(self, notice: dict):
+        """Met la notice en attente ; envoi au plus tard après `window_ms`."""
+        self._pending.append(notice)
+        if len(self._pending) >= self.max_batch or self.window_s == 0:
+            await self.flush()
+        elif self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.window_s, self._flush_later)
+
+    def _flush_later(self):
+        background(self.flush(), "notices.flush")
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel(); self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        async with self._flushing:
+            first = await self.seq.reserve(len(batch))
+            # numérotation visible (seq.current) + mémorisation + mise en file : sans await entre les
+            # trois, un client qui se connecte voit chaque notice soit dans son replay, soit en direct
+            # (jamais 0 ou 2 fois)
+            for i, notice in enumerate(batch):
+                notice["seq"] = first + i
+                self.replay.add(notice["seq"], notice)
+            await self.manager.broadcast_json(self._frame(batch))
+        log.info(f"[NOTICE] {len(batch)} notice(s) -> {self.manager.receivers_count()} client(s)")
+
+    @staticmethod
+    def _frame(notices: list[dict]) -> dict:
+        # notice seule : format historique, compris par tous les clients
+        return notices[0] if len(notices) == 1 else {"type": "media_notice_batch", "notices": notices}
+
+    def _on_remote(self, payload: str):
+        """Notices diffusées par un autre worker : on les garde aussi pour le replay."""
+        try:
+            obj = json.loads(payload)
+        except ValueError:
+            return
+        for notice in obj.get("notices", ()) if obj.get("type") == "media_notice_batch" else (obj,):
+            if notice.get("type") == "media_notice" and isinstance(notice.get("seq"), int):
+                self.seq.seen(notice["seq"])
+                self.replay.add(notice["seq"], notice)
+
+    def hello(self, resume_from: int | None = None, epoch: str | None = None,
+              frames_version: int | None = None) -> list[str]:
+        """Trames initiales d'un client : état courant (dont la version des trames binaires qu'il
+        recevra, None = mode historique), puis ce qu'il a manqué (ou un signal de trou)."""
+        current = self.seq.current
+        frames = [{"type": "hello", "epoch": self.seq.epoch, "seq": current, "frames": frames_version}]
+        if resume_from is not None:
+            missed = self.replay.since(resume_from, current) if epoch == self.seq.epoch else None
+            if missed is None:
+                frames.append({"type": "replay_gap", "resume_from": resume_from, "seq": current})
+            else:
+                for i in range(0, len(missed), self.max_batch):
+                    frames.append(self._frame(missed[i:i + self.max_batch]))
+                log.info(f"[NOTICE] replay {len(missed)} notice(s) from seq {resume_from}")
+        return [json.dumps(f) for f in frames]
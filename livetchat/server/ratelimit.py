@@ -0,0 +1,109 @@
+# livetchat/server/ratelimit.py
+# Contrôle d'admission de /upload/ :
+#  - seaux à jetons par clé ("ip:<hôte>", "user:<pseudo>") : requêtes/s et octets/s, avec rafale
+#  - plafond global d'uploads simultanés
+# Un refus est immédiat (429 + Retry-After) : le corps n'est pas lu, rien n'est écrit ni diffusé.
+# Mémoire O(clés actives) : une clé inactive depuis `idle_s` (seaux pleins) est oubliée.
+import math, time
+
+from livetchat.server.metrics import REGISTRY
+
+RATE_DECISIONS = REGISTRY.counter("livetchat_ratelimit_decisions_total", "Décisions d'admission sur /upload/",
+                                  ("scope", "decision"))
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "at")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.at = burst, now
+
+    def wait(self, n: float, now: float) -> float:
+        """Secondes à attendre avant de pouvoir prendre n jetons (0 = tout de suite)."""
+        self.tokens = min(self.burst, self.tokens + (now - self.at) * self.rate)
+        self.at = now
+        n = min(n, self.burst)          # une demande > rafale passe quand le seau est plein
+        return 0.0 if self.tokens >= n else (n - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """requêtes/s + octets/s par clé ; rate <= 0 désactive la limite correspondante."""
+    SWEEP_S = 30.0
+
+    def __init__(self, req_rate: float, req_burst: float, byte_rate: float, byte_burst: float, idle_s: float = 600):
+        self.req = (req_rate, req_burst)
+        self.bytes = (byte_rate, byte_burst)
+        self.enabled = req_rate > 0 or byte_rate > 0
+        # oublier une clé ne doit rien lui offrir : ses seaux doivent déjà s'être remplis
+        self.idle_s = max([idle_s] + [burst / r for r, burst in (self.req, self.bytes) if r > 0])
+        self._keys: dict[str, tuple[TokenBucket | None, TokenBucket | None]] = {}
+        self._swept = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _buckets(self, key: str, now: float):
+        b = self._keys.get(key)
+        if b is None:
+            b = self._keys[key] = tuple(TokenBucket(r, burst, now) if r > 0 else None
+                                        for r, burst in (self.req, self.bytes))
+        return b
+
+    def acquire(self, key: str, nbytes: int = 0, requests: int = 1) -> float:
+        """Prend `requests` requête(s) + nbytes si les deux seaux le permettent ; sinon rien, et renvoie l'attente."""
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        self._sweep(now)
+        req, byt = self._buckets(key, now)
+        wait = max(req.wait(requests, now) if req and requests else 0.0, byt.wait(nbytes, now) if byt and nbytes else 0.0)
+        if wait == 0.0:
+            if req: req.tokens -= requests
+            if byt: byt.tokens -= min(nbytes, byt.burst)
+        return wait
+
+    def refund(self, key: str):
+        """Rend la requête prise par acquire() : demande finalement sans effet (ex. by-hash inconnu)."""
+        if not self.enabled or key not in self._keys:
+            return
+        req = self._keys[key][0]
+        if req:
+            req.tokens = min(req.burst, req.tokens + 1)
+
+    def charge(self, key: str, nbytes: int):
+        """Octets constatés après coup (taille non annoncée) : le seau peut passer en négatif."""
+        if not self.enabled:
+            return
+        byt = self._buckets(key, time.monotonic())[1]
+        if byt:
+            byt.tokens -= nbytes
+
+    def _sweep(self, now: float):
+        if now - self._swept < self.SWEEP_S:
+            return
+        self._swept = now
+        idle = [k for k, b in self._keys.items() if all(x is None or now - x.at > self.idle_s for x in b)]
+        for key in idle:
+            del self._keys[key]
+
+
+class InflightGate:
+    """Nombre max d'uploads en cours (tous clients confondus) ; 0 = illimité."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+
+    def enter(self) -> bool:
+        if self.limit and self.active >= self.limit:
+            return False
+        self.active += 1
+        return True
+
+    def leave(self):
+        self.active -= 1
+
+
+def retry_after(wait: float) -> dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(wait)))}
@@ -0,0 +1,92 @@
+# livetchat/server/replay.py
+# Numérotation des événements diffusés (media_notice) + mémoire tampon circulaire des
+# derniers événements, pour qu'un client qui se reconnecte (?resume_from=N&epoch=E)
+# reçoive seulement ce qu'il a manqué au lieu de tout perdre.
+#  - seq strictement croissant ; "epoch" change quand la numérotation repart de zéro
+#  - avec plusieurs workers, le compteur est partagé via un petit fichier verrouillé
+#    (même seq pour un même événement sur tous les workers) ; verrou et fichier hors event loop
+import os, time, uuid, fcntl
+from collections import deque
+
+from starlette.concurrency import run_in_threadpool
+
+
+class SeqAllocator:
+    """Compteur en mémoire (1 worker) ou dans un fichier partagé "<epoch> <seq>" (N workers)."""
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._seq = 0
+        self.epoch = uuid.uuid4().hex[:12]
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.epoch, self._seq = self._update(0)
+
+    def _update(self, n: int) -> tuple[str, int]:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            raw = os.pread(fd, 64, 0).split()
+            epoch, seq = (raw[0].decode(), int(raw[1])) if len(raw) == 2 else (self.epoch, 0)
+            if n:
+                seq += n
+                data = f"{epoch} {seq}".encode()
+                os.pwrite(fd, data.ljust(40), 0)
+            elif not raw:
+                os.pwrite(fd, f"{epoch} 0".encode().ljust(40), 0)
+            return epoch, seq
+        finally:
+            os.close(fd)    # libère aussi le verrou
+
+    def take(self, n: int) -> int:
+        """Réserve n numéros consécutifs ; renvoie le premier. Bloquant si le compteur est partagé."""
+        if self.path:
+            _, last = self._update(n)
+        else:
+            self._seq += n
+            last = self._seq
+        self._seq = max(self._seq, last)
+        return last - n + 1
+
+    async def reserve(self, n: int) -> int:
+        """take() pour l'event loop : le flock et le fichier partagé passent par le threadpool.
+        `current` n'avance qu'au retour, sur l'event loop."""
+        if not self.path:
+            return self.take(n)
+        _, last = await run_in_threadpool(self._update, n)
+        self._seq = max(self._seq, last)
+        return last - n + 1
+
+    @property
+    def current(self) -> int:
+        return self._seq
+
+    def seen(self, seq: int):
+        """Numéro attribué par un autre worker (reçu via le backplane)."""
+        self._seq = max(self._seq, seq)
+
+
+class ReplayBuffer:
+    """Derniers événements (seq, reçu à, dict), bornés en nombre et en âge."""
+
+    def __init__(self, capacity: int = 1000, max_age_s: float = 300.0):
+        self.events: deque[tuple[int, float, dict]] = deque(maxlen=capacity)
+        self.max_age_s = max_age_s
+
+    def add(self, seq: int, event: dict):
+        self.events.append((seq, time.monotonic(), event))
+
+    def _trim(self):
+        limit = time.monotonic() - self.max_age_s
+        while self.events and self.events[0][1] < limit:
+            self.events.popleft()
+
+    def since(self, seq: int, current: int) -> list[dict] | None:
+        """Événements de numéro > seq, dans l'ordre ; None si une partie n'est plus en mémoire."""
+        self._trim()
+        if seq >= current:
+            return []
+        missed = sorted((e for e in self.events if e[0] > seq), key=lambda e: e[0])
+        if not missed or missed[0][0] != seq + 1:
+            return None
+        return [e[2] for e in missed]
@@ -0,0 +1,230 @@
+# livetchat/server/resumable.py
+# Uploads reprenables (gros médias sur liaison instable), par morceaux :
+#   POST   /upload/sessions/               crée la session : nom, taille, sha256 + champs de la notice
+#   PUT    /upload/sessions/{id}?offset=N  corps brut écrit à partir de N (pwrite en streaming)
+#   GET    /upload/sessions/{id}           plages déjà reçues
+#   POST   /upload/sessions/{id}/commit    complet + sha256 vérifié -> store + notice
+#   DELETE /upload/sessions/{id}
+# Les morceaux peuvent arriver dans le désordre, en parallèle, sur n'importe quel worker.
+# État sur disque dans <tmp>/sessions : <id>.json (métadonnées), <id>.part (fichier à sa taille
+# finale, rempli par pwrite), <id>.ranges (journal "début fin" ajouté en O_APPEND après chaque
+# morceau, même interrompu) : rien n'est gardé en mémoire et une session survit à un redémarrage.
+# Un PUT garde un flock partagé sur le .part pendant tout son flux, le commit le prend exclusif :
+# jamais d'octet écrit dans un fichier déjà haché / rangé dans le store.
+import fcntl, json, os, re, time, uuid
+
+from starlette.concurrency import run_in_threadpool
+
+from livetchat.server.uploads import UploadRejected, MAX_BYTES, SNIFF_BYTES, classify, sniff_matches
+from livetchat.shared.protocol import EXT_MIME
+from livetchat.shared.utils import content_hasher
+
+_ID = re.compile(r"^[0-9a-f]{32}$")
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+def merge_ranges(pairs) -> list[list[int]]:
+    out: list[list[int]] = []
+    for start, end in sorted(pairs):
+        if out and start <= out[-1][1]:
+            out[-1][1] = max(out[-1][1], end)
+        else:
+            out.append([start, end])
+    return out
+
+
+class UploadSessions:
+    SWEEP_S = 60.0
+
+    def __init__(self, tmp_dir: str, chunk_bytes: int = 1_000_000, ttl_s: float = 3600):
+        self.dir = os.path.join(tmp_dir, "sessions")
+        os.makedirs(self.dir, exist_ok=True)
+        self.chunk_bytes = chunk_bytes
+        self.ttl_s = ttl_s
+        self._swept = 0.0
+
+    def _path(self, sid: str, suffix: str) -> str:
+        return os.path.join(self.dir, f"{sid}{suffix}")
+
+    def meta(self, sid: str) -> dict:
+        if not _ID.match(sid):
+            raise UploadRejected("UNKNOWN_SESSION", 404, reason="bad_session_id")
+        try:
+            with open(self._path(sid, ".json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadRejected("UNKNOWN_SESSION", 404, reason=f"session={sid}") from None
+
+    # ---------------- création ----------------
+    def create(self, filename: str, size: int, sha256: str, fields: dict) -> dict:
+        self.sweep()
+        filename = os.path.basename(filename)
+        kind = classify(filename)
+        if kind == "unknown":
+            raise UploadRejected("UNSUPPORTED_FORMAT", 400, reason="unsupported")
+        if size <= 0:
+            raise UploadRejected("CONTENT_MISMATCH", 415, reason="empty_file")
+        if size > MAX_BYTES[kind]:
+            raise UploadRejected("TOO_LARGE", 413, reason=f"too_large>{MAX_BYTES[kind]}B")
+        if not _SHA256.match(sha256):
+            raise UploadRejected("BAD_FORM", 422, reason="bad_sha256")
+        sid = uuid.uuid4().hex
+        with open(self._path(sid, ".part"), "wb") as f:
+            f.truncate(size)                    # creux : seuls les octets reçus occupent le disque
+        open(self._path(sid, ".ranges"), "w").close()
+        meta = {"id": sid, "filename": filename, "kind": kind, "size": size, "sha256": sha256,
+                "fields": fields, "created": time.time()}
+        tmp = self._path(sid, ".json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._path(sid, ".json"))
+        return meta
+
+    # ---------------- morceaux ----------------
+    def received(self, sid: str) -> list[list[int]]:
+        try:
+            with open(self._path(sid, ".ranges")) as f:
+                pairs = [tuple(map(int, line.split())) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+        return merge_ranges(pairs)
+
+    async def write(self, sid: str, offset: int, stream) -> list[list[int]]:
+        """Écrit le flux à partir de `offset` ; ce qui a été écrit est journalisé même si le client coupe.
+        Toutes les opérations fichier passent par le threadpool."""
+        meta = await run_in_threadpool(self.meta, sid)
+        size = meta["size"]
+        if not 0 <= offset < size:
+            raise UploadRejected("BAD_RANGE", 416, reason=f"offset={offset}/{size}")
+        fd = await run_in_threadpool(self._open_part, sid)
+        pos = offset
+        head = bytearray() if offset == 0 else None   # début du fichier : contenu reconnu avant écriture
+        try:
+            async for chunk in stream:
+                if head is not None:
+                    head.extend(chunk)
+                    if len(head) < min(SNIFF_BYTES, size):
+                        continue
+                    if not self._sniff(meta, bytes(head)):
+                        raise UploadRejected("CONTENT_MISMATCH", 415, reason=f"sniff_failed({meta['kind']})")
+                    chunk, head = bytes(head), None
+                if not chunk:
+                    continue
+                if pos + len(chunk) > size:
+                    raise UploadRejected("TOO_LARGE", 413, reason=f"chunk_past_end({size}B)")
+                await run_in_threadpool(os.pwrite, fd, chunk, pos)
+                pos += len(chunk)
+            if head:                           # corps plus court que SNIFF_BYTES (vérifié au commit)
+                if pos + len(head) > size:
+                    raise UploadRejected("TOO_LARGE", 413, reason=f"chunk_past_end({size}B)")
+                await run_in_threadpool(os.pwrite, fd, bytes(head), pos)
+                pos += len(head)
+        finally:
+            await run_in_threadpool(self._release, sid, fd, offset, pos)
+        return await run_in_threadpool(self.received, sid)
+
+    def _open_part(self, sid: str) -> int:
+        """fd du .part sous flock partagé (tenu jusqu'à _release)."""
+        try:
+            fd = os.open(self._path(sid, ".part"), os.O_WRONLY)
+        except FileNotFoundError:
+            raise UploadRejected("UNKNOWN_SESSION", 404, reason=f"session={sid}") from None
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        # commit passé entre meta() et le verrou : le .part est peut-être déjà dans le store
+        if not os.path.exists(self._path(sid, ".json")):
+            os.close(fd)
+            raise UploadRejected("UNKNOWN_SESSION", 404, reason=f"session={sid}")
+        return fd
+
+    def _release(self, sid: str, fd: int, start: int, end: int):
+        try:
+            if end > start:
+                self._record(sid, start, end)    # avant de rendre le verrou (commit bloqué jusque-là)
+        finally:
+            os.close(fd)
+
+    def _record(self, sid: str, start: int, end: int):
+        # une ligne courte en O_APPEND : atomique, même avec plusieurs workers
+        try:
+            fd = os.open(self._path(sid, ".ranges"), os.O_WRONLY | os.O_APPEND)
+        except FileNotFoundError:
+            return                    # session annulée ou expirée pendant le morceau
+        try:
+            os.write(fd, f"{start} {end}\n".encode())
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _sniff(meta: dict, prefix: bytes) -> bool:
+        mime = EXT_MIME[os.path.splitext(meta["filename"])[1].lower()]
+        return sniff_matches(meta["kind"], prefix, mime)
+
+    # ---------------- fin ----------------
+    def _commit_sync(self, sid: str) -> tuple[dict, str]:
+        meta = self.meta(sid)
+        part = self._path(sid, ".part")
+        try:
+            f = open(part, "rb")
+        except FileNotFoundError:
+            raise UploadRejected("UNKNOWN_SESSION", 404, reason=f"session={sid}") from None
+        with f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadRejected("IN_PROGRESS", 409, reason="chunk_in_progress") from None
+            missing = meta["size"] - sum(e - s for s, e in self.received(sid))
+            if missing:
+                raise UploadRejected("INCOMPLETE", 409, reason=f"missing={missing}B")
+            # un seul commit par session (requêtes concurrentes, autres workers) ; un PUT qui
+            # attend le verrou verra la session fermée
+            claimed = self._path(sid, ".commit")
+            try:
+                os.rename(self._path(sid, ".json"), claimed)
+            except FileNotFoundError:
+                raise UploadRejected("UNKNOWN_SESSION", 404, reason=f"session={sid}") from None
+            h = content_hasher()
+            head = f.read(SNIFF_BYTES)
+            h.update(head)
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        os.remove(claimed)
+        os.remove(self._path(sid, ".ranges"))
+        if h.hexdigest() != meta["sha256"]:
+            os.remove(part)
+            raise UploadRejected("HASH_MISMATCH", 422, reason=f"sha256={h.hexdigest()[:16]}")
+        if not self._sniff(meta, head):
+            os.remove(part)
+            raise UploadRejected("CONTENT_MISMATCH", 415, reason=f"sniff_failed({meta['kind']})")
+        return meta, part
+
+    async def commit(self, sid: str) -> tuple[dict, str]:
+        """(métadonnées, chemin du fichier complet et vérifié) ; le fichier est à ranger par l'appelant."""
+        return await run_in_threadpool(self._commit_sync, sid)
+
+    def abort(self, sid: str):
+        self.meta(sid)
+        self._remove(sid)
+
+    def _remove(self, sid: str):
+        for suffix in (".json", ".part", ".ranges", ".commit"):
+            try:
+                os.remove(self._path(sid, suffix))
+            except FileNotFoundError:
+                pass
+
+    def sweep(self):
+        """Supprime les sessions sans activité depuis ttl_s (au plus une fois par SWEEP_S)."""
+        now = time.time()
+        if now - self._swept < self.SWEEP_S:
+            return
+        self._swept = now
+        for name in os.listdir(self.dir):
+            sid, _, suffix = name.partition(".")
+            if suffix != "json":
+                continue
+            try:
+                last = max(os.path.getmtime(self._path(sid, s)) for s in (".json", ".ranges"))
+            except FileNotFoundError:
+                continue
+            if now - last > self.ttl_s:
+                self._remove(sid)
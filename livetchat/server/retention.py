@@ -0,0 +1,111 @@
+# livetchat/server/retention.py
+# Rétention des médias : tâche de fond qui applique par type (image / video / audio)
+#  - un âge max depuis le dernier accès (atime, mis à jour par /files/* et les ré-uploads)
+#  - un quota d'octets (originaux + variantes), en évinçant les moins récemment utilisés
+# Passes incrémentales : sélection hors event loop, suppressions par petits lots espacés,
+# nombre max par passe. Un hash évincé disparaît de l'index -> le prochain upload est "nouveau".
+# Avec plusieurs workers, un seul fait la passe (verrou fichier non bloquant).
+import os, time, fcntl, asyncio
+
+from starlette.concurrency import run_in_threadpool
+
+from livetchat.server.store import MediaStore, MediaEntry
+from livetchat.server.logs import log
+from livetchat.server.metrics import REGISTRY
+
+GC_EVICTED = REGISTRY.counter("livetchat_gc_evicted_total", "Médias supprimés par la rétention", ("kind", "reason"))
+GC_FREED = REGISTRY.counter("livetchat_gc_freed_bytes_total", "Octets libérés par la rétention", ("kind",))
+
+
+def select_victims(entries: list[MediaEntry], usage: int, quota: int, max_age_s: float,
+                   grace_s: float, limit: int, now: float) -> list[tuple[MediaEntry, str]]:
+    """Expirés d'abord, puis LRU jusqu'à repasser sous le quota. Pur (exécuté dans le threadpool)."""
+    old = sorted((e for e in entries if now - max(e.atime, e.created) >= grace_s), key=lambda e: e.atime)
+    out, excess = [], usage - quota if quota else 0
+    for e in old:
+        if len(out) >= limit:
+            break
+        if max_age_s and now - e.atime > max_age_s:
+            out.append((e, "age"))
+        elif excess > 0:
+            out.append((e, "quota"))
+        else:
+            break          # triés par atime : les suivants sont plus récents et non expirés
+        excess -= e.disk_size
+    return out
+
+
+class Retention:
+
+    def __init__(self, store: MediaStore, quotas: dict[str, int], max_age_s: float = 0,
+                 interval_s: float = 60, batch: int = 50, pause_s: float = 0.05,
+                 max_per_pass: int = 1000, grace_s: float = 300):
+        self.store = store
+        self.quotas = quotas
+        self.max_age_s = max_age_s
+        self.interval_s = interval_s
+        self.batch = batch
+        self.pause_s = pause_s
+        self.max_per_pass = max_per_pass
+        self.grace_s = grace_s       # jamais un média tout juste uploadé / demandé
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None and (self.max_age_s or any(self.quotas.values())):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                await self.run_pass()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"[GC] pass failed: {e}")
+
+    async def run_pass(self) -> int:
+        """Une passe ; renvoie le nombre de médias supprimés (0 si un autre worker s'en charge)."""
+        fd = os.open(self.store.index_path + ".gc", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            await run_in_threadpool(self.store.refresh)     # atime / ajouts des autres workers
+            total = 0
+            for kind in self.store.roots:
+                total += await self._collect(kind, self.max_per_pass - total)
+            return total
+        finally:
+            os.close(fd)
+
+    async def _collect(self, kind: str, limit: int) -> int:
+        quota = self.quotas.get(kind, 0)
+        usage = self.store.usage.get(kind, 0)
+        if limit <= 0 or (not self.max_age_s and (not quota or usage <= quota)):
+            return 0
+        now = time.time()
+        snapshot = await run_in_threadpool(self.store.snapshot, kind)
+        victims = await run_in_threadpool(select_victims, snapshot, usage, quota, self.max_age_s,
+                                          self.grace_s, limit, now)
+        n = freed = 0
+        for e, reason in victims:
+            cur = self.store.entries.get(e.hash)
+            if cur is not e or now - e.atime < self.grace_s:
+                continue                  # supprimé ailleurs ou servi depuis la sélection
+            size = await self.store.delete(e.hash)
+            GC_EVICTED.inc(kind, reason)
+            GC_FREED.inc(kind, n=size)
+            n += 1; freed += size
+            if n % self.batch == 0:
+                await asyncio.sleep(self.pause_s)     # laisse respirer disque et event loop
+        if n:
+            log.info(f"[GC] {kind}: evicted {n} ({freed // 1024} KB) usage={self.store.usage.get(kind, 0)}B"
+                     + (f" quota={quota}B" if quota else ""))
+        return n
@@ -1,8 +1,11 @@
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 from livetchat.server import settings
+from livetchat.server.fileserve import etag_matches
+from livetchat.server.logs import log
 from livetchat.shared.version import VERSION
-import hashlib, os
+import asyncio, hashlib, os, time
 
 router = APIRouter()
 
@@ -17,11 +20,41 @@ def sha256_file(path):
             h.update(chunk)
     return h.hexdigest()
 
+# Cache du hash de l'exe, clé = (mtime, taille, inode) : on ne re-hache (dans un thread)
+# que si le fichier a changé, et une seule fois même si toute la flotte demande en même temps.
+_exe_cache = {"key": None, "sha256": None, "computed_at": 0.0}
+_exe_lock = asyncio.Lock()
+
+def _stat_key(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+async def exe_sha256() -> tuple[str, float]:
+    key = await run_in_threadpool(_stat_key, EXE_PATH)
+    if _exe_cache["key"] != key:
+        async with _exe_lock:
+            if _exe_cache["key"] != key:
+                sha = await run_in_threadpool(sha256_file, EXE_PATH)
+                # exe remplacé pendant le hachage -> on ne met pas en cache un hash douteux
+                after = await run_in_threadpool(_stat_key, EXE_PATH)
+                _exe_cache.update(key=key if after == key else None, sha256=sha, computed_at=time.time())
+                log.info(f"[MANIFEST] sha256 recomputed: {sha[:16]}… ({key[1]}B)")
+    return _exe_cache["sha256"], _exe_cache["computed_at"]
+
 @router.get("/manifest.json")
-async def manifest():
+async def manifest(request: Request):
+    try:
+        sha, computed_at = await exe_sha256()
+    except FileNotFoundError:
+        return JSONResponse({"error": "exe_missing"}, status_code=503)
+    etag = f'"{VERSION}-{sha[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
     return JSONResponse({
         "version": VERSION,
         "url": EXE_URL,
-        "sha256": sha256_file(EXE_PATH),   # recalcul à chaque requête (évite l’oubli)
+        "sha256": sha,
+        "hash_age_s": round(time.time() - computed_at, 1),   # âge du hash en cache
         "notes": "Live-only; images/videos/audio; overlays."
-    })
+    }, headers=headers)
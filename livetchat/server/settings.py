@@ -6,4 +6,58 @@ from livetchat.shared.version import VERSION
 
 IMAGE_DIR = "/home/user/final_livetchat/images"
 VIDEO_DIR = "/home/user/final_livetchat/videos"
-AUDIO_DIR = "/home/user/final_livetchat/audios"
\ No newline at end of file
+AUDIO_DIR = "/home/user/final_livetchat/audios"
+UPLOAD_TMP_DIR = "/home/user/final_livetchat/tmp"   # même disque que les médias (rename atomique)
+MEDIA_INDEX = "/home/user/final_livetchat/index.jsonl"   # index du store (journal JSONL)
+
+# WebSocket : file sortante par client (octets) et retard max avant politique "client lent"
+WS_MAX_QUEUE_BYTES = 32_000_000   # > un blob vidéo max encodé en base64
+WS_MAX_LAG_S = 10.0
+WS_SLOW_POLICY = "degrade"        # "drop" | "disconnect" | "degrade"
+WS_HEARTBEAT_S = 15.0             # ping applicatif {"type":"ping"} ; 0 = désactivé
+WS_HEARTBEAT_TIMEOUT_S = 45.0     # sans pong depuis ce délai -> connexion retirée
+NOTICE_BATCH_MS = 5               # fenêtre de regroupement des media_notice (0 = pas de batch)
+REPLAY_EVENTS = 1000              # notices gardées pour les clients qui se reconnectent (?resume_from=)
+REPLAY_MAX_AGE_S = 300.0
+
+# Multi-workers : le backplane relaie les diffusions WS entre workers
+WORKERS = 1
+BACKPLANE = "inprocess"           # "inprocess" (1 worker) | "unix" (N workers, même machine)
+BACKPLANE_DIR = "/tmp/livetchat-backplane"
+
+# Variantes d'images prêtes à afficher (ProcessPool) ; la notice les attend au plus VARIANT_WAIT_MS
+# (court : au-delà elle part sans, la latence de la notice prime)
+VARIANT_BOXES = [(854, 480), (1280, 720), (1920, 1080)]
+VARIANT_WORKERS = 2
+VARIANT_WAIT_MS = 50
+
+# Rétention (retention.py) : quota d'octets par type (0 = illimité) et âge max depuis le dernier accès
+MEDIA_QUOTA_BYTES = {"image": 2_000_000_000, "video": 20_000_000_000, "audio": 2_000_000_000}
+MEDIA_MAX_AGE_S = 7 * 24 * 3600   # 0 = pas d'expiration
+GC_INTERVAL_S = 60
+GC_BATCH = 50                     # suppressions entre deux pauses
+GC_GRACE_S = 300                  # jamais un média uploadé / servi il y a moins de 5 min
+
+# Cache mémoire des médias chauds (hotcache.py) : budget total et taille max d'un fichier caché
+HOT_CACHE_BYTES = 256_000_000
+HOT_CACHE_MAX_ITEM = 8_000_000
+
+# Médias <= INLINE_MAX_BYTES poussés sur le WS avec la notice (au-delà : téléchargement HTTP)
+INLINE_MAX_BYTES = 64_000
+INLINE_KINDS = ("image", "audio")
+INLINE_ENCODING = "frames"        # "frames" (shared/frames.py, repli base64 pour les anciens clients) | "b64" | "bin"
+INLINE_START_AFTER_MS = 300       # cible de lecture commune = horodatage serveur + ce délai (clients synchronisés)
+# Médias téléchargés (/files/*) : cible = horodatage de la notice + ce délai, par type
+PULL_START_AFTER_MS = {"image": 1200, "video": 3000, "audio": 1500}
+
+# Limitation de /upload/ (ratelimit.py), par IP et par pseudo ; 0 = désactivé
+RATE_UPLOADS_PER_S = 0.5          # 1 upload / 2 s en régime établi...
+RATE_UPLOADS_BURST = 5            # ...avec une rafale de 5
+RATE_BYTES_PER_S = 2_000_000
+RATE_BYTES_BURST = 50_000_000
+RATE_IDLE_S = 600                 # clé oubliée après 10 min d'inactivité
+MAX_INFLIGHT_UPLOADS = 32         # uploads simultanés, tous clients confondus
+
+# Uploads reprenables par morceaux (resumable.py) : taille de morceau conseillée, sessions abandonnées
+RESUMABLE_CHUNK_BYTES = 1_000_000
+RESUMABLE_TTL_S = 3600
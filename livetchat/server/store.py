@@ -0,0 +1,314 @@
+# livetchat/server/store.py
+# Stockage des médias adressé par contenu.
+#  - fichiers rangés par préfixe de hash : <root>/ab/cd/<hash><ext>  (aucun dossier ne grossit trop)
+#  - index sur disque = journal JSONL append-only (put / name / variants / touch / del),
+#    rechargé au démarrage en O(index) sans scanner les dossiers
+#  - lookups O(1) en mémoire ; les autres workers voient les ajouts en relisant la fin du journal
+import os, json, time, fcntl, threading
+from dataclasses import dataclass, field, asdict
+
+from starlette.concurrency import run_in_threadpool
+
+from livetchat.server.logs import log
+
+MAX_NAMES = 8            # noms d'origine conservés par hash
+TOUCH_PERSIST_S = 60     # last-access persisté au plus une fois par minute et par hash
+
+
+@dataclass
+class MediaEntry:
+    hash: str
+    kind: str
+    ext: str
+    size: int
+    created: float
+    atime: float
+    names: list[str] = field(default_factory=list)
+    width: int = 0
+    height: int = 0
+    variants: list[dict] | None = None   # None = pas (encore) calculées ; cf. variants.py
+
+    @property
+    def filename(self) -> str:
+        return f"{self.hash}{self.ext}"
+
+    @property
+    def disk_size(self) -> int:
+        return self.size + sum(v.get("size", 0) for v in self.variants or ())
+
+
+class MediaStore:
+
+    def __init__(self, roots: dict[str, str], index_path: str):
+        self.roots = roots
+        self.index_path = index_path
+        self.entries: dict[str, MediaEntry] = {}
+        self.usage: dict[str, int] = {k: 0 for k in roots}     # octets par type (originaux + variantes)
+        self.versions: dict[str, int] = {k: 0 for k in roots}  # +1 à chaque ajout / suppression / modif (listings.py)
+        # fin (en octets) de la dernière ligne du journal qui a modifié chaque type : identique
+        # dans tous les workers qui ont lu le journal jusque-là (ETag des listings)
+        self.marks: dict[str, int] = {}
+        self.on_delete: list = []                               # appelés avec les chemins supprimés (cache chaud)
+        self._lock = threading.Lock()
+        self._offset = 0          # position lue dans le journal
+        self._ino = None          # inode du journal (change après compaction)
+        self._persisted_atime: dict[str, float] = {}
+        for d in roots.values():
+            os.makedirs(d, exist_ok=True)
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+
+    # ---------------- journal ----------------
+    def load(self):
+        """Recharge l'index complet puis compacte le journal s'il contient trop d'historique."""
+        with self._lock:
+            self._reset()
+            lines = self._read_tail()
+            if lines > 2 * len(self.entries) + 1000:
+                self._compact()
+        log.info(f"[STORE] index loaded: {len(self.entries)} media ({self.index_path})")
+
+    def _read_tail(self) -> int:
+        """Applique les lignes ajoutées depuis _offset (par nous ou un autre worker)."""
+        try:
+            st = os.stat(self.index_path)
+        except FileNotFoundError:
+            return 0
+        if self._ino is not None and st.st_ino != self._ino:
+            self._reset()    # compacté ailleurs -> relecture complète
+        self._ino = st.st_ino
+        if st.st_size <= self._offset:
+            return 0
+        n = 0
+        with open(self.index_path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1        # ignore une ligne en cours d'écriture
+        pos = self._offset
+        for line in data[:end].splitlines(keepends=True):
+            pos += len(line)
+            try:
+                self._apply(json.loads(line), pos)
+                n += 1
+            except Exception:
+                continue
+        self._offset += end
+        return n
+
+    def _reset(self):
+        self.entries.clear(); self._offset = 0; self.marks.clear()
+        self.usage = {k: 0 for k in self.roots}
+        self.versions = {k: v + 1 for k, v in self.versions.items()}
+
+    def _account(self, e: MediaEntry, sign: int):
+        self.usage[e.kind] = self.usage.get(e.kind, 0) + sign * e.disk_size
+        self.versions[e.kind] = self.versions.get(e.kind, 0) + 1
+
+    def _apply(self, rec: dict, end: int | None = None):
+        """`end` : position de fin de la ligne dans le journal (pour `marks`)."""
+        before = dict(self.versions)
+        self._apply_op(rec)
+        if end is not None:
+            for kind, v in self.versions.items():
+                if before.get(kind) != v:
+                    self.marks[kind] = end
+
+    def _apply_op(self, rec: dict):
+        op, h = rec.get("op"), rec.get("hash")
+        if op == "put":
+            e = MediaEntry(**{k: rec[k] for k in ("hash", "kind", "ext", "size", "created", "atime", "names")},
+                           width=rec.get("width", 0), height=rec.get("height", 0), variants=rec.get("variants"))
+            if h in self.entries:
+                self._account(self.entries[h], -1)
+            self.entries[h] = e
+            self._account(e, +1)
+            self._persisted_atime[h] = e.atime
+        elif op == "name" and h in self.entries:
+            names = self.entries[h].names
+            if rec["name"] not in names:
+                names.append(rec["name"]); del names[:-MAX_NAMES]
+                self.versions[self.entries[h].kind] += 1
+        elif op == "variants" and h in self.entries:
+            e = self.entries[h]
+            self._account(e, -1)
+            e.width, e.height, e.variants = rec["width"], rec["height"], rec["variants"]
+            self._account(e, +1)
+        elif op == "touch" and h in self.entries:
+            self.entries[h].atime = max(self.entries[h].atime, rec["atime"])
+            self._persisted_atime[h] = self.entries[h].atime
+        elif op == "del":
+            e = self.entries.pop(h, None)
+            if e is not None:
+                self._account(e, -1)
+            self._persisted_atime.pop(h, None)
+
+    def _append(self, rec: dict) -> int:
+        """Ajoute la ligne au journal ; renvoie sa position de fin."""
+        line = (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.index_path, "ab") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write(line)    # O_APPEND + une seule écriture -> pas d'entrelacement entre workers
+                f.flush()
+                return f.tell()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _commit(self, rec: dict):
+        """Journalise puis applique (sous self._lock)."""
+        self._apply(rec, self._append(rec))
+
+    def _compact(self):
+        tmp = self.index_path + ".tmp"
+        with open(self.index_path, "ab") as lockf:
+            fcntl.flock(lockf, fcntl.LOCK_EX)
+            try:
+                self._read_tail()      # ne rien perdre de ce qui a été ajouté entre-temps
+                marks, pos = {}, 0
+                with open(tmp, "wb") as f:
+                    for e in self.entries.values():
+                        line = (json.dumps({"op": "put", **asdict(e)}, ensure_ascii=False) + "\n").encode("utf-8")
+                        f.write(line)
+                        pos += len(line)
+                        marks[e.kind] = pos      # ce que liront les autres workers dans le nouveau fichier
+                    f.flush(); os.fsync(f.fileno())
+                os.replace(tmp, self.index_path)
+            finally:
+                fcntl.flock(lockf, fcntl.LOCK_UN)
+        st = os.stat(self.index_path)
+        self._ino, self._offset, self.marks = st.st_ino, st.st_size, marks
+
+    # ---------------- accès ----------------
+    def path_for(self, kind: str, h: str, ext: str) -> str:
+        return os.path.join(self.roots[kind], h[:2], h[2:4], f"{h}{ext}")
+
+    def get(self, h: str) -> MediaEntry | None:
+        e = self.entries.get(h)
+        if e is None:
+            with self._lock:
+                self._read_tail()
+                e = self.entries.get(h)
+        return e
+
+    def resolve(self, kind: str, filename: str) -> tuple[MediaEntry, str] | None:
+        """filename publié (<hash><ext> ou variante <hash>.<w>x<h>.<fmt>) -> (entrée, chemin) ; None si inconnu."""
+        name = os.path.basename(filename)
+        h, _, rest = name.partition(".")
+        e = self.get(h)
+        if e is None or e.kind != kind:
+            return None
+        path = self.path_for(e.kind, e.hash, e.ext)
+        if f".{rest.lower()}" == e.ext:
+            return e, path
+        for v in e.variants or ():
+            if v["filename"] == name:
+                return e, os.path.join(os.path.dirname(path), name)
+        return None
+
+    def touch(self, h: str):
+        e = self.entries.get(h)
+        if e is None:
+            return
+        now = time.time()
+        e.atime = now
+        if now - self._persisted_atime.get(h, 0) >= TOUCH_PERSIST_S:
+            self._persisted_atime[h] = now
+            self._append({"op": "touch", "hash": h, "atime": now})
+
+    def set_variants(self, h: str, width: int, height: int, variants: list[dict]) -> bool:
+        """False si l'entrée a disparu entre-temps (rétention, suppression) : rien n'est journalisé."""
+        with self._lock:
+            if h not in self.entries:
+                return False
+            rec = {"op": "variants", "hash": h, "width": width, "height": height, "variants": variants}
+            self._commit(rec)
+            return True
+
+    def snapshot(self, kind: str) -> list[MediaEntry]:
+        """Entrées d'un type, copiées sous le verrou (put/delete les modifient depuis le threadpool)."""
+        with self._lock:
+            return [e for e in self.entries.values() if e.kind == kind]
+
+    def journal_mark(self, kind: str) -> str:
+        """Dernière modification d'un type, repérée dans le journal (inode + position) : même valeur
+        dans tous les workers, change à chaque ajout / suppression / modif, pas sur un simple accès."""
+        return f"{self._ino or 0:x}-{self.marks.get(kind, 0)}"
+
+    def counts(self) -> dict[str, int]:
+        out = {k: 0 for k in self.roots}
+        for e in list(self.entries.values()):
+            out[e.kind] = out.get(e.kind, 0) + 1
+        return out
+
+    # ---------------- écriture ----------------
+    def _claim_locked(self, h: str, name: str) -> MediaEntry | None:
+        e = self.entries.get(h)
+        if e is None or not os.path.exists(self.path_for(e.kind, h, e.ext)):
+            return None
+        if name not in e.names:
+            rec = {"op": "name", "hash": h, "name": name}
+            self._commit(rec)
+        self.touch(h)    # ré-uploadé = récemment utilisé (cf. retention.py)
+        return e
+
+    def claim(self, h: str, name: str) -> MediaEntry | None:
+        """Ré-envoi sans le contenu (upload par hash) : entrée existante sous un nom de plus, ou None."""
+        with self._lock:
+            self._read_tail()
+            return self._claim_locked(h, name)
+
+    def _put_sync(self, tmp_path: str, h: str, kind: str, ext: str, size: int, name: str) -> tuple[MediaEntry, bool]:
+        with self._lock:
+            self._read_tail()
+            e = self._claim_locked(h, name)
+            if e is not None:
+                os.remove(tmp_path)
+                return e, False
+            path = self.path_for(kind, h, ext)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                os.replace(tmp_path, path)
+            except FileNotFoundError:   # dossier vidé par la rétention d'un autre worker entre-temps
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            now = time.time()
+            rec = {"op": "put", **asdict(MediaEntry(hash=h, kind=kind, ext=ext, size=size, created=now, atime=now, names=[name]))}
+            self._commit(rec)
+            return self.entries[h], True
+
+    def _delete_sync(self, h: str) -> int:
+        """Supprime original + variantes et journalise "del" ; renvoie les octets libérés."""
+        with self._lock:
+            self._read_tail()
+            e = self.entries.get(h)
+            if e is None:
+                return 0
+            path = self.path_for(e.kind, h, e.ext)
+            folder = os.path.dirname(path)
+            paths = [path] + [os.path.join(folder, v["filename"]) for v in e.variants or ()]
+            freed = 0
+            for p in paths:
+                try:
+                    freed += os.path.getsize(p)
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+            for cb in self.on_delete:
+                cb(paths)
+            rec = {"op": "del", "hash": h}
+            self._commit(rec)
+            for d in (folder, os.path.dirname(folder)):    # préfixes ab/cd devenus vides
+                try: os.rmdir(d)
+                except OSError: break
+        return freed
+
+    async def delete(self, h: str) -> int:
+        return await run_in_threadpool(self._delete_sync, h)
+
+    def refresh(self):
+        """Relit la fin du journal (ajouts / touch des autres workers)."""
+        with self._lock:
+            self._read_tail()
+
+    async def put(self, tmp_path: str, h: str, *, kind: str, ext: str, size: int, name: str) -> tuple[MediaEntry, bool]:
+        """Range le fichier temporaire sous son hash ; renvoie (entrée, is_new)."""
+        return await run_in_threadpool(self._put_sync, tmp_path, h, kind, ext, size, name)
@@ -0,0 +1,21 @@
+# livetchat/server/tasks.py
+# Tâches lancées sans être attendues (timers, fermetures, notices différées) : l'event loop ne
+# garde qu'une référence faible vers une tâche, on la garde donc jusqu'à sa fin, échec journalisé.
+import asyncio
+
+from livetchat.server.logs import log
+
+_tasks: set[asyncio.Task] = set()
+
+
+def background(coro, name: str) -> asyncio.Task:
+    task = asyncio.get_running_loop().create_task(coro, name=name)
+    _tasks.add(task)
+    task.add_done_callback(_done)
+    return task
+
+
+def _done(task: asyncio.Task):
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        log.warning(f"[TASK] {task.get_name()} failed: {task.exception()!r}")
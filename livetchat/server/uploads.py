@@ -0,0 +1,265 @@
+# livetchat/server/uploads.py
+# Réception d'un upload multipart en streaming : le corps est parsé au fil de l'eau,
+# la partie "file" est écrite dans un fichier temporaire (hors event loop) et hachée
+# en même temps. Les limites de taille sont appliquées pendant le flux, et le contenu
+# est reconnu (validators.py) dès les premiers octets : un faux fichier coûte quelques Ko.
+import os, uuid
+from dataclasses import dataclass, field
+
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+from livetchat.server.validators import _sniff_is_image, _sniff_is_mp4, _sniff_is_audio
+from livetchat.shared.protocol import (
+    MAX_IMAGE_BYTES, MAX_VIDEO_BYTES, MAX_AUDIO_BYTES,
+    ALLOWED_IMAGE_MIME, ALLOWED_VIDEO_MIME, ALLOWED_AUDIO_MIME, EXT_MIME,
+)
+from livetchat.shared.utils import content_hasher
+
+MAX_BYTES = {"image": MAX_IMAGE_BYTES, "video": MAX_VIDEO_BYTES, "audio": MAX_AUDIO_BYTES}
+ALLOWED_MIME = {"image": ALLOWED_IMAGE_MIME, "video": ALLOWED_VIDEO_MIME, "audio": ALLOWED_AUDIO_MIME}
+MAX_FIELD_BYTES = 4096   # champs texte (pseudo, légende, durée)
+MAX_FORM_OVERHEAD = 64 * 1024   # boundaries + champs texte autour du fichier
+SNIFF_BYTES = 16         # assez pour toutes les signatures de validators.py
+
+
+class UploadRejected(Exception):
+    """Upload refusé ; `error` est renvoyé tel quel au client."""
+    def __init__(self, error: str, status_code: int = 400, reason: str = "", headers: dict | None = None):
+        super().__init__(error)
+        self.error = error
+        self.status_code = status_code
+        self.reason = reason or error.lower()
+        self.headers = headers
+
+
+@dataclass
+class StreamedUpload:
+    filename: str
+    kind: str
+    tmp_path: str
+    size: int
+    digest: str
+    fields: dict[str, str] = field(default_factory=dict)
+    data: bytes | None = None     # contenu gardé en mémoire si <= keep_bytes (cache chaud)
+
+
+def classify(filename: str) -> str:
+    mime = EXT_MIME.get(os.path.splitext(filename)[1].lower())
+    for kind, allowed in ALLOWED_MIME.items():
+        if mime in allowed:
+            return kind
+    return "unknown"
+
+
+def sniff_matches(kind: str, prefix: bytes, mime: str) -> bool:
+    if kind == "image":
+        return _sniff_is_image(prefix)
+    if kind == "video":
+        return _sniff_is_mp4(prefix)
+    return _sniff_is_audio(prefix, mime)
+
+
+class _SpoolWriter:
+    """Fichier temporaire + hash incrémental ; chaque écriture passe par le threadpool."""
+
+    def __init__(self, tmp_dir: str, keep_bytes: int = 0):
+        self.path = os.path.join(tmp_dir, f"{uuid.uuid4().hex}.part")
+        self.size = 0
+        self._h = content_hasher()
+        self._f = None
+        self.keep_bytes = keep_bytes
+        self.kept: list[bytes] | None = [] if keep_bytes > 0 else None
+
+    async def open(self):
+        self._f = await run_in_threadpool(open, self.path, "wb")
+
+    def _write_sync(self, data: bytes):
+        self._f.write(data)
+        self._h.update(data)
+
+    async def write(self, data: bytes):
+        if not data:
+            return
+        await run_in_threadpool(self._write_sync, data)
+        self.size += len(data)
+        if self.kept is not None:
+            if self.size <= self.keep_bytes:
+                self.kept.append(data)
+            else:
+                self.kept = None     # trop gros pour le cache : on ne garde rien
+
+    async def close(self) -> str:
+        if self._f is not None:
+            await run_in_threadpool(self._f.close)
+            self._f = None
+        return self._h.hexdigest()
+
+    def discard(self):
+        try:
+            if self._f is not None:
+                self._f.close()
+        except Exception:
+            pass
+        self._f = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def receive_upload(request: Request, tmp_dir: str, keep_bytes: int = 0, admit=None) -> StreamedUpload:
+    """
+    Lit `request.stream()` sans jamais bufferiser le fichier complet (sauf s'il fait
+    au plus `keep_bytes`, auquel cas son contenu est aussi renvoyé dans `.data`).
+    Rien n'est gardé en mémoire si le Content-Length annoncé dépasse déjà keep_bytes
+    (ou est absent) : un gros upload ne retient jamais ses premiers Mo.
+    `admit(fields)` est appelé au début de la partie fichier avec les champs déjà reçus
+    (pseudo...) et peut lever UploadRejected avant que le fichier ne soit lu ; les champs
+    arrivés après le fichier sont à revérifier par l'appelant.
+    Lève UploadRejected dès que le format est refusé ou la taille dépassée.
+    """
+    ctype, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if ctype != b"multipart/form-data" or not boundary:
+        raise UploadRejected("BAD_FORM", 422, reason="not_multipart")
+    # refus avant de lire le moindre octet du corps
+    declared = request.headers.get("content-length")
+    declared = int(declared) if declared and declared.isdigit() else None
+    if declared is not None and declared > max(MAX_BYTES.values()) + MAX_FORM_OVERHEAD:
+        raise UploadRejected("TOO_LARGE", 413, reason=f"content_length={declared}")
+    if declared is None or declared > keep_bytes + MAX_FORM_OVERHEAD:
+        keep_bytes = 0
+
+    # Les callbacks du parser ne font qu'empiler des événements ; on les traite
+    # après chaque write() (même principe que starlette.formparsers).
+    events: list[tuple[str, bytes]] = []
+    cur = {"field": b"", "value": b""}
+    headers: dict[bytes, bytes] = {}
+
+    def on_part_begin():
+        headers.clear()
+    def on_header_field(data, start, end):
+        cur["field"] += data[start:end]
+    def on_header_value(data, start, end):
+        cur["value"] += data[start:end]
+    def on_header_end():
+        headers[cur["field"].lower()] = cur["value"]
+        cur["field"] = b""; cur["value"] = b""
+    def on_headers_finished():
+        events.append(("headers", headers.get(b"content-disposition", b"")))
+        events.append(("ctype", headers.get(b"content-type", b"")))
+    def on_part_data(data, start, end):
+        events.append(("data", data[start:end]))
+    def on_part_end():
+        events.append(("end", b""))
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    fields: dict[str, str] = {}
+    writer: _SpoolWriter | None = None
+    filename, kind = "", "unknown"
+    part = None            # "file" | nom du champ texte | None (partie ignorée)
+    field_buf = bytearray()
+    limit = 0
+    mime = ""
+    file_seen, file_size = False, 0
+    sniff = bytearray()      # premiers octets du fichier, retenus jusqu'à validation
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            pending, pending_size = [], 0   # octets du fichier de ce chunk -> 1 seul aller-retour threadpool
+            for ev, data in events:
+                if ev == "headers":
+                    _, disp = parse_options_header(data)
+                    name = disp.get(b"name", b"").decode("utf-8", "replace")
+                    has_filename = b"filename" in disp
+                    if name == "file" and not has_filename:
+                        raise UploadRejected("BAD_FORM", 422, reason="file_without_filename")
+                    if name != "file":
+                        # champ texte ; une partie fichier sous un autre nom est ignorée
+                        part = name if name and not has_filename else None
+                        field_buf.clear()
+                    else:
+                        if file_seen:
+                            raise UploadRejected("BAD_FORM", 422, reason="multiple_files")
+                        file_seen = True
+                        filename = os.path.basename(disp[b"filename"].decode("utf-8", "replace"))
+                        kind = classify(filename)
+                        if kind == "unknown":
+                            raise UploadRejected("UNSUPPORTED_FORMAT", 400, reason="unsupported")
+                        mime = EXT_MIME[os.path.splitext(filename)[1].lower()]
+                        limit = MAX_BYTES[kind]
+                        part = "file"
+                        if admit is not None:
+                            admit(fields)
+                elif ev == "ctype":
+                    # type MIME déclaré par le client (optionnel) : doit être autorisé pour ce kind
+                    declared_mime = data.decode("latin-1").split(";")[0].strip().lower()
+                    if part == "file" and declared_mime and declared_mime != "application/octet-stream" \
+                            and declared_mime not in ALLOWED_MIME[kind]:
+                        raise UploadRejected("UNSUPPORTED_FORMAT", 400, reason=f"mime={declared_mime}")
+                elif ev == "data":
+                    if part == "file":
+                        file_size += len(data)
+                        if file_size > limit:
+                            raise UploadRejected("TOO_LARGE", 413, reason=f"too_large>{limit}B")
+                        if sniff is not None:
+                            sniff.extend(data)
+                            if len(sniff) < SNIFF_BYTES:
+                                continue
+                            if not sniff_matches(kind, bytes(sniff), mime):
+                                raise UploadRejected("CONTENT_MISMATCH", 415, reason=f"sniff_failed({kind})")
+                            data, sniff = bytes(sniff), None
+                        pending.append(data); pending_size += len(data)
+                    elif part is not None:
+                        field_buf.extend(data)
+                        if len(field_buf) > MAX_FIELD_BYTES:
+                            raise UploadRejected("BAD_FORM", 422, reason="field_too_large")
+                elif ev == "end":
+                    if part == "file" and sniff is not None:
+                        # fichier plus court que SNIFF_BYTES
+                        if not sniff_matches(kind, bytes(sniff), mime):
+                            raise UploadRejected("CONTENT_MISMATCH", 415, reason=f"sniff_failed({kind})")
+                        pending.append(bytes(sniff)); pending_size += len(sniff)
+                        sniff = None
+                    elif part not in (None, "file"):
+                        fields[part] = field_buf.decode("utf-8", "replace")
+                    part = None
+            events.clear()
+            if pending:
+                if writer is None:
+                    # fichier temporaire créé seulement une fois le contenu reconnu
+                    writer = _SpoolWriter(tmp_dir, keep_bytes)
+                    await writer.open()
+                await writer.write(b"".join(pending))
+        parser.finalize()
+
+        if not file_seen:
+            raise UploadRejected("BAD_FORM", 422, reason="missing_file")
+        if writer is None:   # fichier vide
+            raise UploadRejected("CONTENT_MISMATCH", 415, reason="empty_file")
+        digest = await writer.close()
+    except FormParserError as e:     # boundary, entêtes de partie... malformés
+        if writer is not None:
+            writer.discard()
+        raise UploadRejected("BAD_FORM", 422, reason=f"malformed({e})") from None
+    except BaseException:
+        if writer is not None:
+            writer.discard()
+        raise
+
+    return StreamedUpload(filename=filename, kind=kind, tmp_path=writer.path,
+                          size=writer.size, digest=digest, fields=fields,
+                          data=b"".join(writer.kept) if writer.kept is not None else None)
@@ -0,0 +1,156 @@
+# livetchat/server/variants.py
+# Variantes "prêtes à afficher" des images, calculées une fois côté serveur dans un
+# ProcessPoolExecutor (hors event loop, hors GIL) au lieu de N fois chez les clients :
+#  - images fixes réduites aux tailles d'écran courantes, recompressées en WebP (JPEG/PNG sinon)
+#  - GIF animés : frames réduites, durées conservées
+# Une variante plus lourde que l'original est jetée. Nommage : <hash>.<w>x<h>.<fmt>
+import os, asyncio, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from starlette.concurrency import run_in_threadpool
+
+from livetchat.server.logs import log
+
+try:
+    from PIL import Image, ImageSequence, features
+    PIL_AVAILABLE = True
+except Exception:
+    PIL_AVAILABLE = False
+
+
+def _noop():
+    return None
+
+
+def _fit(w: int, h: int, box: tuple[int, int]) -> tuple[int, int]:
+    r = min(box[0] / w, box[1] / h)
+    return max(1, round(w * r)), max(1, round(h * r))
+
+
+def render_variants(src: str, out_dir: str, h: str, boxes: list[tuple[int, int]], webp: bool) -> dict:
+    """Exécuté dans un process du pool : écrit les variantes et renvoie leur description."""
+    out = []
+    src_size = os.path.getsize(src)
+    with Image.open(src) as im:
+        ow, oh = im.size
+        animated = getattr(im, "is_animated", False)
+        todo = []
+        for box in sorted(boxes, reverse=True):   # du plus grand au plus petit
+            if ow <= box[0] and oh <= box[1]:
+                continue                          # jamais d'agrandissement
+            size = _fit(ow, oh, box)
+            if size not in todo:
+                todo.append(size)
+        if not todo:
+            return {"width": ow, "height": oh, "variants": out}
+
+        if animated:
+            frames = [(fr.convert("RGBA"), fr.info.get("duration", 100)) for fr in ImageSequence.Iterator(im)]
+        else:
+            im.draft("RGB", todo[0])              # JPEG : décodage directement à échelle réduite
+            alpha = im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info)
+            prev = im.convert("RGBA" if alpha else "RGB")
+
+        for w, hh in todo:
+            if animated:
+                fmt = "gif"
+                frames = [(f.resize((w, hh), Image.LANCZOS), d) for f, d in frames]
+                save = lambda f: frames[0][0].save(f, format="GIF", save_all=True,
+                                                   append_images=[x for x, _ in frames[1:]],
+                                                   duration=[d for _, d in frames],
+                                                   loop=im.info.get("loop", 0), disposal=2)
+            else:
+                prev = prev.resize((w, hh), Image.LANCZOS)   # chaque taille part de la précédente
+                small = prev
+                if webp:
+                    fmt = "webp"; save = lambda f: small.save(f, format="WEBP", quality=80, method=3)
+                elif alpha:
+                    fmt = "png"; save = lambda f: small.save(f, format="PNG", optimize=True)
+                else:
+                    fmt = "jpg"; save = lambda f: small.save(f, format="JPEG", quality=82, optimize=True)
+            name = f"{h}.{w}x{hh}.{fmt}"
+            path = os.path.join(out_dir, name)
+            tmp = path + ".part"
+            with open(tmp, "wb") as f:
+                save(f)
+            size = os.path.getsize(tmp)
+            if size >= src_size:
+                os.remove(tmp)                    # pas plus léger que l'original : inutile
+                continue
+            os.replace(tmp, path)
+            out.append({"filename": name, "w": w, "h": hh, "size": size})
+    return {"width": ow, "height": oh, "variants": out}
+
+
+class VariantBuilder:
+    """Planifie le calcul des variantes (une seule fois par hash, même si uploads simultanés)."""
+
+    def __init__(self, store, boxes: list[tuple[int, int]], workers: int = 2):
+        self.store = store
+        self.boxes = [tuple(b) for b in boxes]
+        self.workers = workers
+        self.enabled = PIL_AVAILABLE and bool(self.boxes)
+        self._webp = PIL_AVAILABLE and features.check("webp")
+        self._pool: ProcessPoolExecutor | None = None
+        self._inflight: dict[str, asyncio.Task] = {}
+        if not PIL_AVAILABLE:
+            log.info("[VARIANTS] Pillow absent -> variantes désactivées")
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # "spawn" : pas de fork d'un process serveur multi-threadé
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def warmup(self):
+        """Démarre les process du pool (spawn + import PIL) avant le premier upload."""
+        if not self.enabled:
+            return
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        await asyncio.gather(*(loop.run_in_executor(pool, _noop) for _ in range(self.workers)))
+
+    def needed(self, entry) -> bool:
+        return self.enabled and entry.kind == "image" and entry.variants is None
+
+    def schedule(self, entry) -> asyncio.Task:
+        task = self._inflight.get(entry.hash)
+        if task is None:
+            task = asyncio.create_task(self._build(entry))
+            self._inflight[entry.hash] = task
+            task.add_done_callback(lambda _: self._inflight.pop(entry.hash, None))
+        return task
+
+    async def _build(self, entry):
+        src = self.store.path_for(entry.kind, entry.hash, entry.ext)
+        loop = asyncio.get_running_loop()
+        try:
+            info = await loop.run_in_executor(self._get_pool(), render_variants, src, os.path.dirname(src),
+                                              entry.hash, self.boxes, self._webp)
+        except Exception as e:
+            log.warning(f"[VARIANTS] {entry.filename} failed: {e}")
+            info = {"width": 0, "height": 0, "variants": []}
+        if not await run_in_threadpool(self._attach, entry, info, os.path.dirname(src)):
+            log.info(f"[VARIANTS] {entry.filename} deleted while rendering -> variants removed")
+            return
+        log.info(f"[VARIANTS] {entry.filename} {info['width']}x{info['height']} -> "
+              + (", ".join(v["filename"].split(".", 1)[1] for v in info["variants"]) or "none"))
+
+    def _attach(self, entry, info: dict, folder: str) -> bool:
+        if self.store.set_variants(entry.hash, info["width"], info["height"], info["variants"]):
+            return True
+        # original supprimé pendant le calcul : aucune entrée ne pointera vers ces fichiers
+        for v in info["variants"]:
+            try:
+                os.remove(os.path.join(folder, v["filename"]))
+            except FileNotFoundError:
+                pass
+        for d in (folder, os.path.dirname(folder)):     # préfixes ab/cd devenus vides
+            try: os.rmdir(d)
+            except OSError: break
+        return False
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
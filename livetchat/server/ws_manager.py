@@ -1,51 +1,283 @@
-import asyncio, json
+import asyncio, json, time
+from collections import deque
 from fastapi import WebSocket
+from livetchat.server.backplane import Backplane, InProcessBackplane
+from livetchat.server.logs import log
+from livetchat.server.tasks import background
+from livetchat.server.metrics import FANOUT_SECONDS, WS_SEND_LAG, WS_QUEUE_AT_SEND, WS_DROPPED, WS_REAPED, PLAYBACK_SKEW
+from livetchat.shared.timesync import SYNC_MIN_INTERVAL_S
+
+# Politiques appliquées à un client trop lent (file pleine ou retard trop grand)
+POLICY_DROP = "drop"              # on jette la trame qui déborde
+POLICY_DISCONNECT = "disconnect"  # on ferme la connexion
+POLICY_DEGRADE = "degrade"        # on jette les trames "bulk" (chunks de blob), les notices passent
+
+# Destinataires d'une trame : None = tous ; blobs encodés deux fois (shared/frames.py + repli JSON/base64)
+AUDIENCE_FRAMES = "frames"        # clients qui ont négocié les trames binaires (/ws?frames=1)
+AUDIENCE_LEGACY = "legacy"        # les autres
+
+
+class _Conn:
+    """Une connexion = une file sortante bornée en octets + une tâche d'écriture dédiée."""
+    __slots__ = ("ws", "peer", "queue", "queued_bytes", "wakeup", "task", "dropped", "degraded",
+                 "connected_at", "last_seen", "heartbeat", "rtt_ms", "clock_offset_ms", "skew_ms", "frames",
+                 "last_sync")
+
+    def __init__(self, ws: WebSocket):
+        self.ws = ws
+        self.peer = f"{getattr(ws.client, 'host', '?')}:{getattr(ws.client, 'port', '?')}"
+        self.queue = deque()          # (is_bytes, data, size, bulk, enqueued_at)
+        self.queued_bytes = 0
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.dropped = 0
+        self.degraded = False
+        self.connected_at = self.last_seen = time.monotonic()
+        self.heartbeat = False        # a déjà répondu à un ping applicatif
+        self.rtt_ms = None
+        self.clock_offset_ms = None   # rapportés par les clients qui se synchronisent (time_sync)
+        self.skew_ms = None
+        self.frames = False           # trames binaires versionnées négociées
+        self.last_sync = 0.0          # dernier time_sync accepté (monotonic)
+
+    def lag(self, now: float) -> float:
+        return now - self.queue[0][4] if self.queue else 0.0
+
 
 class ConnectionManager:
 
-    def __init__(self):
-        self.active = set()
+    def __init__(self, max_queue_bytes: int = 32_000_000, max_lag_s: float = 10.0,
+                 slow_policy: str = POLICY_DEGRADE, backplane: Backplane | None = None):
+        self.active: dict[WebSocket, _Conn] = {}
+        self.backplane = backplane or InProcessBackplane()
         self._lock = asyncio.Lock()
+        self.max_queue_bytes = max_queue_bytes
+        self.max_lag_s = max_lag_s
+        self.slow_policy = slow_policy
+        self.remote_listeners: list = []   # appelés avec les trames texte non-bulk venues du backplane
+        self._reaper: asyncio.Task | None = None
+        self._progress = asyncio.Event()    # une trame vient de partir (cf. wait_drained)
+
+    async def start(self):
+        # trames publiées par les autres workers -> nos clients
+        await self.backplane.start(self._on_backplane)
+
+    def _on_backplane(self, is_bytes: bool, data, bulk: bool, audience: str | None = None):
+        if not is_bytes and not bulk:
+            for listener in self.remote_listeners:
+                listener(data)
+        self._fanout(is_bytes, data, None, bulk, "backplane", audience)
+
+    async def stop(self):
+        if self._reaper is not None:
+            self._reaper.cancel(); self._reaper = None
+        await self.backplane.stop()
+
+    # ---------------- heartbeat ----------------
+    def start_heartbeat(self, interval_s: float, timeout_s: float):
+        """Ping applicatif toutes les `interval_s` ; un client qui a déjà répondu (heartbeat=True)
+        et reste muet plus de `timeout_s` est retiré. Les anciens clients, qui ne répondent pas,
+        restent couverts par les pings WebSocket du serveur ASGI (ws_ping_interval)."""
+        if interval_s > 0 and self._reaper is None:
+            self._reaper = asyncio.create_task(self._heartbeat(interval_s, timeout_s))
+
+    async def _heartbeat(self, interval_s: float, timeout_s: float):
+        while True:
+            await asyncio.sleep(interval_s)
+            now = time.monotonic()
+            ping = json.dumps({"type": "ping", "t": int(time.time() * 1000)})
+            for ws, c in list(self.active.items()):
+                if c.heartbeat and now - c.last_seen > timeout_s:
+                    log.info(f"[WS] no pong from {c.peer} for {now - c.last_seen:.0f}s -> reaped")
+                    WS_REAPED.inc()
+                    if self.active.pop(ws, None) is not None:
+                        self._release(c)
+                        background(self._close(ws, 1001), f"ws.close:{c.peer}")
+                else:
+                    self._enqueue(c, False, ping, False, now)
+
+    def seen(self, ws: WebSocket, pong_t: int | None = None):
+        """Message reçu du client (pong_t = horodatage du ping auquel il répond)."""
+        c = self.active.get(ws)
+        if c is None:
+            return
+        c.last_seen = time.monotonic()
+        if pong_t is not None:
+            c.heartbeat = True
+            c.rtt_ms = max(0, int(time.time() * 1000) - pong_t)
+
+    # ---------------- synchronisation d'horloge (cf. shared/timesync.py) ----------------
+    def time_sync(self, ws: WebSocket, obj: dict, t1: float):
+        """Répond à un time_sync reçu en t1 (ms) ; la réponse passe devant la file pour que
+        t2 reste proche de l'envoi réel, mais sous les limites de la file (un client qui ne lit
+        pas reste traité en client lent). Au plus un time_sync par SYNC_MIN_INTERVAL_S.
+        Le client peut joindre son estimation courante."""
+        c = self.active.get(ws)
+        now = time.monotonic()
+        if c is None or now - c.last_sync < SYNC_MIN_INTERVAL_S:
+            return
+        c.last_sync = now
+        if isinstance(obj.get("offset_ms"), (int, float)):
+            c.clock_offset_ms = round(obj["offset_ms"], 1)
+        reply = json.dumps({"type": "time_sync", "t0": obj.get("t0"), "t1": t1, "t2": time.time() * 1000})
+        self._enqueue(c, False, reply, False, now, front=True)
 
-    async def connect(self, ws: WebSocket):
+    def playback_report(self, ws: WebSocket, obj: dict):
+        """Écart entre le début de lecture d'un média et sa cible en temps serveur, vu par le client."""
+        c = self.active.get(ws)
+        skew = obj.get("skew_ms")
+        if c is None or not isinstance(skew, (int, float)):
+            return
+        c.skew_ms = round(skew, 1)
+        PLAYBACK_SKEW.observe(abs(skew) / 1000)
+
+    def connections(self) -> list[dict]:
+        now = time.monotonic()
+        return [{"peer": c.peer, "connected_s": round(now - c.connected_at, 1),
+                 "last_seen_s": round(now - c.last_seen, 1), "heartbeat": c.heartbeat, "rtt_ms": c.rtt_ms,
+                 "clock_offset_ms": c.clock_offset_ms, "skew_ms": c.skew_ms,
+                 "frames": c.frames, "queued_bytes": c.queued_bytes, "dropped": c.dropped, "degraded": c.degraded}
+                for c in list(self.active.values())]
+
+    async def connect(self, ws: WebSocket, initial=None, frames: bool = False):
+        """`initial()` -> trames texte placées en tête de file, avant toute diffusion ultérieure."""
         await ws.accept()
+        c = _Conn(ws)
+        c.frames = frames
         async with self._lock:
-            self.active.add(ws)
-        peer = f"{getattr(ws.client, 'host', '?')}:{getattr(ws.client, 'port', '?')}"
-        print(f"[WS] connect {peer} — now {len(self.active)} client(s)")
+            self.active[ws] = c
+            now = time.monotonic()
+            for payload in (initial() if initial else ()):
+                self._enqueue(c, False, payload, False, now)
+        c.task = asyncio.create_task(self._writer(c))
+        log.info(f"[WS] connect {c.peer} — now {len(self.active)} client(s)")
 
     async def disconnect(self, ws: WebSocket):
         async with self._lock:
-            if ws in self.active:
-                self.active.remove(ws)
-        peer = f"{getattr(ws.client, 'host', '?')}:{getattr(ws.client, 'port', '?')}"
-        print(f"[WS] disconnect {peer} — now {len(self.active)} client(s)")
-
-    async def broadcast_json(self, message, exclude=None):
-        import asyncio
-        payload = json.dumps(message)
-        conns = list(self.active)
-        tasks = []
-        for w in conns:
-            if exclude and w in exclude: continue
-            tasks.append((w, asyncio.create_task(w.send_text(payload))))
-        results = await asyncio.gather(*(t for _, t in tasks), return_exceptions=True)
-        for (w,_), res in zip(tasks, results):
-            if isinstance(res, Exception):
-                print("[WS] send_text failed -> disconnecting:", res)
-                await self.disconnect(w)
-
-    async def broadcast_bytes(self, data, exclude=None):
-        import asyncio
-        conns = list(self.active); tasks = []
-        for w in conns:
-            if exclude and w in exclude: continue
-            tasks.append((w, asyncio.create_task(w.send_bytes(data))))
-        results = await asyncio.gather(*(t for _, t in tasks), return_exceptions=True)
-        for (w,_), res in zip(tasks, results):
-            if isinstance(res, Exception):
-                await self.disconnect(w)
-                
+            c = self.active.pop(ws, None)
+        if c is not None:
+            self._release(c)
+
+    def _release(self, c: _Conn):
+        if c.task is not None and c.task is not asyncio.current_task():
+            c.task.cancel()
+        c.queue.clear(); c.queued_bytes = 0
+        log.info(f"[WS] disconnect {c.peer} — now {len(self.active)} client(s)"
+              + (f" (dropped {c.dropped} frame(s))" if c.dropped else ""))
+
+    async def _writer(self, c: _Conn):
+        ws = c.ws
+        try:
+            while True:
+                while not c.queue:
+                    c.wakeup.clear()
+                    await c.wakeup.wait()
+                is_bytes, data, size, _, ts = c.queue.popleft()
+                WS_QUEUE_AT_SEND.observe(c.queued_bytes)
+                WS_SEND_LAG.observe(time.monotonic() - ts)
+                c.queued_bytes -= size
+                if is_bytes:
+                    await ws.send_bytes(data)
+                else:
+                    await ws.send_text(data)
+                self._progress.set()
+                if c.degraded and c.queued_bytes <= self.max_queue_bytes // 2:
+                    c.degraded = False
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            log.info(f"[WS] send failed {c.peer} -> disconnecting: {e}")
+            await self.disconnect(ws)
+            await self._close(ws)
+
+    def _enqueue(self, c: _Conn, is_bytes: bool, data, bulk: bool, now: float, front: bool = False):
+        size = len(data)
+        over = c.queued_bytes + size > self.max_queue_bytes or c.lag(now) > self.max_lag_s
+        if c.degraded and bulk:
+            c.dropped += 1
+            WS_DROPPED.inc("degraded")
+            return
+        if over:
+            if self.slow_policy == POLICY_DROP:
+                c.dropped += 1
+                WS_DROPPED.inc("drop")
+                return
+            if self.slow_policy == POLICY_DEGRADE and bulk:
+                c.degraded = True
+                c.dropped += 1
+                WS_DROPPED.inc("degraded")
+                log.info(f"[WS] slow consumer {c.peer} -> degraded (queue={c.queued_bytes}B lag={c.lag(now):.1f}s)")
+                return
+            # en mode dégradé les petites trames de contrôle passent, jusqu'à 2x la limite
+            if self.slow_policy != POLICY_DEGRADE or c.queued_bytes + size > 2 * self.max_queue_bytes:
+                log.info(f"[WS] slow consumer {c.peer} -> disconnect (queue={c.queued_bytes}B lag={c.lag(now):.1f}s)")
+                WS_DROPPED.inc("disconnect")
+                if self.active.pop(c.ws, None) is not None:   # plus aucune trame pour lui
+                    self._release(c)
+                    background(self._close(c.ws, 1013), f"ws.close:{c.peer}")   # 1013 = "try again later"
+                return
+        if front:
+            # en tête de file avec l'horodatage de l'ancienne tête : le retard mesuré (lag) reste celui de la file
+            c.queue.appendleft((is_bytes, data, size, bulk, c.queue[0][4] if c.queue else now))
+        else:
+            c.queue.append((is_bytes, data, size, bulk, now))
+        c.queued_bytes += size
+        c.wakeup.set()
+
+    @staticmethod
+    async def _close(ws: WebSocket, code: int = 1000):
+        try: await ws.close(code=code)
+        except Exception: pass
+
+    def _fanout(self, is_bytes: bool, data, exclude, bulk: bool, source: str = "local", audience: str | None = None):
+        now = time.monotonic()
+        for ws, c in list(self.active.items()):
+            if exclude and ws in exclude: continue
+            if audience is not None and c.frames != (audience == AUDIENCE_FRAMES): continue
+            self._enqueue(c, is_bytes, data, bulk, now)
+        FANOUT_SECONDS.observe(time.monotonic() - now, source)
+
+    async def broadcast_json(self, message, exclude=None, bulk: bool = False, audience: str | None = None):
+        await self.broadcast_text(json.dumps(message), exclude=exclude, bulk=bulk, audience=audience)
+
+    async def broadcast_text(self, payload: str, exclude=None, bulk: bool = False, audience: str | None = None):
+        # trame déjà encodée (une seule fois), mise en file pour nos clients (non bloquant)
+        # puis publiée aux autres workers ; sleep(0) laisse tourner les writers entre deux trames
+        self._fanout(False, payload, exclude, bulk, audience=audience)
+        await self.backplane.publish(False, payload, bulk, audience)
+        await asyncio.sleep(0)
+
+    async def broadcast_bytes(self, data, exclude=None, bulk: bool = True, audience: str | None = None):
+        self._fanout(True, data, exclude, bulk, audience=audience)
+        await self.backplane.publish(True, data, bulk, audience)
+        await asyncio.sleep(0)
+
+    async def wait_drained(self, window_bytes: int, timeout_s: float | None = None):
+        """Fenêtre d'envoi des blobs : attend que le client le plus chargé ait au plus `window_bytes`
+        en file avant de produire le morceau suivant. Les clients dégradés, ou déjà en retard de plus
+        de max_lag_s (la politique du client lent s'applique à eux), ne retiennent personne."""
+        deadline = time.monotonic() + (self.max_lag_s if timeout_s is None else timeout_s)
+        while True:
+            now = time.monotonic()
+            if max((c.queued_bytes for c in self.active.values()
+                    if not c.degraded and c.lag(now) <= self.max_lag_s), default=0) <= window_bytes:
+                return
+            if now >= deadline:
+                return
+            self._progress.clear()
+            try:
+                await asyncio.wait_for(self._progress.wait(), deadline - now)
+            except asyncio.TimeoutError:
+                return
+
+    def queue_stats(self) -> dict:
+        """Instantané des files sortantes (pour /metrics)."""
+        qs = [c.queued_bytes for c in self.active.values()]
+        now = time.monotonic()
+        return {"total": sum(qs), "max": max(qs, default=0),
+                "max_lag": max((c.lag(now) for c in self.active.values()), default=0.0),
+                "degraded": sum(c.degraded for c in self.active.values())}
+
     def receivers_count(self, exclude=None):
         if exclude: return max(0, len(self.active)-len(exclude))
         return len(self.active)
@@ -0,0 +1,71 @@
+# livetchat/shared/frames.py
+# Trames binaires versionnées pour les blobs poussés sur le WS (serveur et clients).
+# Entête fixe (32 octets, ordre réseau) puis la charge utile :
+#
+#   magic "LT" | version (u8) | type (u8) | event_id (16 octets, uuid) | seq (u32) | offset (u64)
+#
+#   START : seq = 0, offset = taille totale, charge = métadonnées JSON (kind, username, ...)
+#   CHUNK : seq = n° du morceau, offset = position dans le blob, charge = octets bruts
+#   END   : seq = nombre de morceaux, offset = taille totale, charge vide
+#
+# Par rapport au mode texte/base64 : pas de +33 %, pas de JSON par morceau, et chaque trame dit
+# à quel événement et à quelle position elle appartient (le mode binaire historique ne le disait pas).
+# Négocié à la connexion (/ws?frames=<version>) : les autres clients reçoivent le JSON/base64.
+import json, struct, uuid
+from dataclasses import dataclass
+
+MAGIC = b"LT"
+VERSION = 1
+HEADER = struct.Struct("!2sBB16sIQ")
+
+START, CHUNK, END = 1, 2, 3
+TYPE_NAMES = {START: "start", CHUNK: "chunk", END: "end"}
+
+
+class FrameError(ValueError):
+    pass
+
+
+@dataclass(slots=True)
+class Frame:
+    type: int
+    event_id: str        # uuid en hexadécimal (32 caractères)
+    seq: int
+    offset: int
+    payload: memoryview
+
+    def meta(self) -> dict:
+        """Métadonnées d'une trame START."""
+        return json.loads(bytes(self.payload))
+
+
+def is_frame(data) -> bool:
+    return len(data) >= HEADER.size and bytes(data[:2]) == MAGIC
+
+
+def event_bytes(event_id: str) -> bytes:
+    return uuid.UUID(event_id).bytes
+
+
+def encode(ftype: int, event_id: str | bytes, seq: int = 0, offset: int = 0, payload=b"") -> bytes:
+    """Une trame ; `event_id` en hex (ou déjà en 16 octets, pour éviter de le reconvertir par morceau)."""
+    eid = event_id if isinstance(event_id, bytes) else event_bytes(event_id)
+    return HEADER.pack(MAGIC, VERSION, ftype, eid, seq, offset) + payload
+
+
+def encode_start(event_id: str, meta: dict, total: int) -> bytes:
+    return encode(START, event_id, 0, total, json.dumps(meta, separators=(",", ":")).encode("utf-8"))
+
+
+def decode(data) -> Frame:
+    """Trame -> Frame (charge = vue sans copie). FrameError si ce n'en est pas une, ou d'une version inconnue."""
+    if len(data) < HEADER.size:
+        raise FrameError("trame trop courte")
+    magic, version, ftype, eid, seq, offset = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise FrameError("magic invalide")
+    if version != VERSION:
+        raise FrameError(f"version {version} non gérée")
+    if ftype not in TYPE_NAMES:
+        raise FrameError(f"type {ftype} inconnu")
+    return Frame(ftype, eid.hex(), seq, offset, memoryview(data)[HEADER.size:])
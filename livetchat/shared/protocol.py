@@ -9,6 +9,11 @@ START_AFTER_AUDIO_MS = 1500
 ALLOWED_IMAGE_MIME = {"image/jpeg", "image/png", "image/gif"}
 ALLOWED_VIDEO_MIME = {"video/mp4"}
 ALLOWED_AUDIO_MIME = {"audio/mpeg", "audio/wav", "audio/ogg", "audio/mp4"}
+EXT_MIME = {
+    ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".gif": "image/gif",
+    ".mp4": "video/mp4",
+    ".mp3": "audio/mpeg", ".wav": "audio/wav", ".ogg": "audio/ogg", ".m4a": "audio/mp4",
+}
 EVENT_IMAGE_START = "image_start"
 EVENT_IMAGE_END   = "image_end"
 EVENT_VIDEO_START = "video_start"
@@ -0,0 +1,78 @@
+# livetchat/shared/timesync.py
+# Estimation de l'horloge serveur côté client, façon NTP, sur la connexion WS :
+#   client -> {"type": "time_sync", "t0": <ms client>}
+#   serveur -> {"type": "time_sync", "t0": ..., "t1": <ms réception>, "t2": <ms envoi>}
+#   client (réception en t3) : offset = ((t1 - t0) + (t2 - t3)) / 2 ; rtt = (t3 - t0) - (t2 - t1)
+# Un échantillon pris derrière une trame lente (blob en cours d'envoi) est faussé : comme le
+# filtre de NTP, on garde celui au plus petit RTT parmi les derniers, puis on lisse l'offset.
+import time
+from collections import deque
+
+SYNC_WINDOW = 8          # échantillons récents considérés
+SYNC_ALPHA = 0.3         # lissage exponentiel de l'offset (1 = pas de lissage)
+# rafale à la connexion pour converger vite, puis entretien (dérive des horloges)
+SYNC_BURST = 5
+SYNC_BURST_GAP_S = 0.2
+SYNC_EVERY_S = 10.0
+SYNC_MIN_INTERVAL_S = 0.1   # côté serveur : time_sync plus rapprochés ignorés
+
+
+def now_ms() -> float:
+    return time.time() * 1000
+
+
+class ClockSync:
+
+    def __init__(self, window: int = SYNC_WINDOW, alpha: float = SYNC_ALPHA):
+        self.samples: deque = deque(maxlen=window)   # (rtt, offset)
+        self.alpha = alpha
+        self.offset_ms: float | None = None          # horloge serveur - horloge locale
+        self.rtt_ms: float | None = None
+
+    @property
+    def synced(self) -> bool:
+        return self.offset_ms is not None
+
+    def request(self) -> dict:
+        """Requête time_sync ; porte l'estimation courante, affichée par le serveur (/debug/ws)."""
+        req = {"type": "time_sync", "t0": now_ms()}
+        if self.synced:
+            req["offset_ms"] = round(self.offset_ms, 1)
+        return req
+
+    def sample(self, t0: float, t1: float, t2: float, t3: float | None = None):
+        t3 = now_ms() if t3 is None else t3
+        rtt = (t3 - t0) - (t2 - t1)
+        if rtt < 0:                  # horloge locale recalée entre t0 et t3
+            return
+        self.samples.append((rtt, ((t1 - t0) + (t2 - t3)) / 2))
+        rtt, offset = min(self.samples)
+        self.rtt_ms = rtt
+        if self.offset_ms is None:
+            self.offset_ms = offset
+        else:
+            self.offset_ms += self.alpha * (offset - self.offset_ms)
+
+    def server_now_ms(self) -> float:
+        return now_ms() + (self.offset_ms or 0.0)
+
+    def to_local_ms(self, server_ms: float) -> float:
+        return server_ms - (self.offset_ms or 0.0)
+
+
+def sync_loop(clock: ClockSync, current, send, alive=lambda: True):
+    """Corps d'un thread : `current()` = connexion courante (None si aucune) ; à chaque nouvelle
+    connexion, rafale de SYNC_BURST requêtes, puis une toutes les SYNC_EVERY_S via `send(obj)`."""
+    conn, sent, due = None, 0, 0.0
+    while alive():
+        if current() is not conn:
+            conn, sent, due = current(), 0, 0.0
+        now = time.monotonic()
+        if conn is not None and now >= due:
+            try:
+                send(clock.request())
+                sent += 1
+            except Exception:
+                pass
+            due = now + (SYNC_BURST_GAP_S if sent < SYNC_BURST else SYNC_EVERY_S)
+        time.sleep(0.05)
@@ -1,4 +1,8 @@
-import time
+import time, hashlib
 
 def now_ms():
     return int(time.time()*1000)
+
+def content_hasher():
+    """Hash de contenu partagé serveur/client (SHA-256 : accéléré matériellement, ~2x plus rapide que MD5)."""
+    return hashlib.sha256()
@@ -0,0 +1,43 @@
+# tests/conftest.py
+# Réglages du serveur appliqués avant le premier import de livetchat.server.main (qui les lit au
+# chargement), comme bench/server.py : données dans un dossier temporaire, variantes coupées.
+import os, tempfile
+
+import pytest
+
+from livetchat.server import settings
+
+DATA_DIR = tempfile.mkdtemp(prefix="livetchat-tests-")
+for _k, _v in {
+    "IMAGE_DIR": f"{DATA_DIR}/images", "VIDEO_DIR": f"{DATA_DIR}/videos", "AUDIO_DIR": f"{DATA_DIR}/audios",
+    "UPLOAD_TMP_DIR": f"{DATA_DIR}/tmp", "MEDIA_INDEX": f"{DATA_DIR}/index.jsonl",
+    "DOWNLOAD_DIR": f"{DATA_DIR}/download", "BACKPLANE_DIR": f"{DATA_DIR}/backplane",
+    "BACKPLANE": "inprocess", "VARIANT_BOXES": [], "NOTICE_BATCH_MS": 0,
+}.items():
+    setattr(settings, _k, _v)
+os.makedirs(settings.DOWNLOAD_DIR, exist_ok=True)
+
+PNG = b"\x89PNG\r\n\x1a\n"
+
+
+@pytest.fixture(scope="session")
+def server():
+    """(module main, TestClient) : une seule app pour toute la session, lifespan compris."""
+    from starlette.testclient import TestClient
+    from livetchat.server import main
+    with TestClient(main.app) as client:
+        yield main, client
+
+
+@pytest.fixture
+def fresh_limiter(server, monkeypatch):
+    """Limiteur neuf (rafale de 3 requêtes, pas de recharge notable) pour un test déterministe."""
+    from livetchat.server.ratelimit import RateLimiter
+    main, _ = server
+    limiter = RateLimiter(0.001, 3, 0, 0)
+    monkeypatch.setattr(main, "limiter", limiter)
+    return limiter
+
+
+def png_bytes(n: int = 1000) -> bytes:
+    return PNG + os.urandom(n)
@@ -0,0 +1,84 @@
+import asyncio
+
+from livetchat.server.backplane import InProcessBackplane, UnixSocketBackplane
+from livetchat.server.broadcaster import FRAME_CHUNK
+from livetchat.shared import frames
+
+
+def test_in_process_fanout_skips_sender():
+    async def scenario():
+        hub, got = [], {"a": [], "b": [], "c": []}
+        planes = {k: InProcessBackplane(hub) for k in got}
+        for k, bp in planes.items():
+            await bp.start(lambda *frame, k=k: got[k].append(frame))
+        await planes["a"].publish(False, "notice", False)
+        await planes["a"].publish(True, b"chunk", True, "frames")
+        await planes["c"].stop()
+        await planes["b"].publish(False, "late", False)
+        return planes, got
+    planes, got = asyncio.run(scenario())
+    assert got["a"] == [(False, "late", False, None)]
+    assert got["b"] == [(False, "notice", False, None), (True, b"chunk", True, "frames")]
+    assert len(got["c"]) == 2
+    assert planes["b"].stats()["peers"][planes["a"].origin]["frames"] == 2
+
+
+def test_unix_frames_cross_workers(tmp_path):
+    async def scenario():
+        a, b = UnixSocketBackplane(str(tmp_path)), UnixSocketBackplane(str(tmp_path))
+        got = []
+        await a.start(lambda *frame: None)
+        await b.start(lambda *frame: got.append(frame))
+        await a.publish(False, "é", False)
+        await a.publish(True, b"\x00\n\x01", True, "legacy")
+        await asyncio.sleep(0.05)
+        await a.stop(); await b.stop()
+        return got
+    assert asyncio.run(scenario()) == [(False, "é", False, None), (True, b"\x00\n\x01", True, "legacy")]
+
+
+class _Sock:
+    """sendto() : EAGAIN vers les pairs de `full`, sinon noté dans `sent`."""
+    def __init__(self):
+        self.full, self.sent = set(), []
+
+    def sendto(self, frame, peer):
+        if peer in self.full:
+            raise BlockingIOError
+        self.sent.append((peer, frame))
+
+
+def test_full_peer_only_delays_itself():
+    async def scenario():
+        bp = UnixSocketBackplane("/nonexistent")
+        bp.MAX_BACKLOG = 2
+        bp._sock, bp._loop = _Sock(), asyncio.get_running_loop()
+        bp._peer_paths = lambda: ["slow", "fast"]
+        bp._sock.full.add("slow")
+        for i in range(3):
+            await bp.publish(False, str(i), False)
+        assert [p for p, _ in bp._sock.sent] == ["fast"] * 3     # servi malgré le pair saturé
+        assert len(bp._backlogs["slow"]) == 2                     # plafond atteint : jeté pour lui seul
+        bp._sock.full.clear()
+        await asyncio.sleep(bp.RETRY_S * 4)
+        return bp
+    bp = asyncio.run(scenario())
+    slow = [f.rsplit(b"\n", 1)[1] for p, f in bp._sock.sent if p == "slow"]
+    assert slow == [b"0", b"1"] and not bp._backlogs
+
+
+def test_frame_chunks_fit_a_unix_datagram_and_oversized_ones_count_as_lost(tmp_path):
+    async def scenario():
+        a, b = UnixSocketBackplane(str(tmp_path)), UnixSocketBackplane(str(tmp_path))
+        got = []
+        await a.start(lambda *frame: None)
+        await b.start(lambda *frame: got.append(frame))
+        chunk = frames.encode(frames.CHUNK, "0" * 32, 0, 0, bytes(FRAME_CHUNK))
+        await a.publish(True, chunk, True, "frames")
+        await a.publish(True, bytes(4 << 20), True, "frames")     # EMSGSIZE
+        await asyncio.sleep(0.05)
+        await a.stop(); await b.stop()
+        return a, b, got, chunk
+    a, b, got, chunk = asyncio.run(scenario())
+    assert [g[1] for g in got] == [chunk]
+    assert a.stats()["peers"][b.origin]["lost"] == 1
@@ -0,0 +1,105 @@
+import asyncio, base64, json, os, types
+
+import pytest
+
+from livetchat.server import broadcaster
+from livetchat.server.backplane import InProcessBackplane
+from livetchat.server.ws_manager import ConnectionManager
+from livetchat.shared import frames
+from livetchat.shared.protocol import CHUNK_SIZE
+
+
+class RecordingWS:
+    """Client qui lit tout : garde les messages reçus et la file la plus longue observée."""
+
+    def __init__(self):
+        self.client = types.SimpleNamespace(host="127.0.0.1", port=1234)
+        self.messages: list = []
+        self.peak = 0
+        self.conn = None
+
+    async def accept(self): pass
+    async def close(self, code=1000): pass
+
+    async def send_bytes(self, data):
+        self.peak = max(self.peak, self.conn.queued_bytes)
+        self.messages.append(bytes(data))
+
+    async def send_text(self, data):
+        self.peak = max(self.peak, self.conn.queued_bytes)
+        self.messages.append(data)
+
+
+async def _broadcast(push, content, n_frames=1, n_legacy=1):
+    m = ConnectionManager(backplane=InProcessBackplane(hub=[]))
+    clients = {}
+    for negotiated, n in ((True, n_frames), (False, n_legacy)):
+        for _ in range(n):
+            ws = RecordingWS()
+            await m.connect(ws, frames=negotiated)
+            ws.conn = m.active[ws]
+            clients.setdefault(negotiated, []).append(ws)
+    await push(m, "image", username="bob", display_time=2, display_text="", content=content,
+               content_type="image/png", start_after_ms=300)
+    while any(c.queue for c in m.active.values()):
+        await asyncio.sleep(0)
+    for ws in list(m.active):
+        await m.disconnect(ws)
+    return clients
+
+
+def _legacy_blob(messages) -> tuple[dict, bytes]:
+    start, *chunks, end = messages
+    start = json.loads(start)
+    assert json.loads(end) == {"type": "image_end", "event_id": start["event_id"]}
+    if start["encoding"] == "bin":
+        return start, b"".join(chunks)
+    parts = [json.loads(c) for c in chunks]
+    assert all(p["type"] == "image_chunk_b64" and p["event_id"] == start["event_id"] for p in parts)
+    return start, b"".join(base64.b64decode(p["b64"]) for p in parts)
+
+
+DATA = os.urandom(3 * broadcaster.FRAME_CHUNK + 12_345)
+
+
+@pytest.fixture(params=["bytes", "file"])
+def content(request, tmp_path):
+    if request.param == "bytes":
+        return DATA
+    path = tmp_path / "blob.png"
+    path.write_bytes(DATA)
+    return str(path)
+
+
+def test_bin_chunks_share_one_window(content):
+    clients = asyncio.run(_broadcast(broadcaster.broadcast_blob_bin, content, n_frames=0, n_legacy=2))
+    for ws in clients[False]:
+        start, blob = _legacy_blob(ws.messages)
+        assert (start["encoding"], start["content_length"], blob) == ("bin", len(DATA), DATA)
+        assert max(len(m) for m in ws.messages[1:-1]) == CHUNK_SIZE
+        assert ws.peak <= (broadcaster.INFLIGHT_CHUNKS + 1) * CHUNK_SIZE
+
+
+def test_b64_chunks_decode_independently(content):
+    clients = asyncio.run(_broadcast(broadcaster.broadcast_blob_textb64, content, n_frames=0))
+    [ws] = clients[False]
+    start, blob = _legacy_blob(ws.messages)
+    assert (start["encoding"], blob) == ("b64", DATA)
+    assert max(len(json.loads(m)["b64"]) for m in ws.messages[1:-1]) == broadcaster.TEXT_B64_CHUNK
+
+
+def test_frames_and_legacy_audiences_get_the_same_blob(content):
+    clients = asyncio.run(_broadcast(broadcaster.broadcast_blob_frames, content))
+    [fws], [lws] = clients[True], clients[False]
+    decoded = [frames.decode(m) for m in fws.messages]
+    assert [f.type for f in decoded] == [frames.START] + [frames.CHUNK] * 4 + [frames.END]
+    meta = decoded[0].meta()
+    assert meta["encoding"] == "frames" and decoded[0].offset == len(DATA)
+    assert {f.event_id for f in decoded} == {meta["event_id"]}
+    assert [(f.seq, f.offset) for f in decoded[1:-1]] == [(i, i * broadcaster.FRAME_CHUNK) for i in range(4)]
+    assert b"".join(bytes(f.payload) for f in decoded[1:-1]) == DATA
+    assert (decoded[-1].seq, decoded[-1].offset) == (4, len(DATA))
+    assert fws.peak <= (broadcaster.INFLIGHT_CHUNKS + 1) * (broadcaster.FRAME_CHUNK + frames.HEADER.size)
+
+    start, blob = _legacy_blob(lws.messages)        # texte/base64 pour qui n'a pas négocié
+    assert (start["encoding"], start["event_id"], blob) == ("b64", meta["event_id"], DATA)
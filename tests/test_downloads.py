@@ -0,0 +1,63 @@
+import threading, time
+
+from livetchat.client.downloads import DownloadPool
+
+
+class FakePool(DownloadPool):
+    """_fetch sans réseau : renvoie l'URL en octets ; "gate" bloque le worker jusqu'à release."""
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.release = threading.Event()
+        self.fetched: list[str] = []
+
+    def _fetch(self, job):
+        self.fetched.append(job.url)
+        if job.url == "gate":
+            self.release.wait(5)
+        if job.url.startswith("fail"):
+            raise OSError(job.url)
+        if job.url == "slow":                     # la fenêtre se ferme pendant le téléchargement
+            time.sleep(max(0.0, job.deadline - time.monotonic()) + 0.01)
+        return job.url.encode()
+
+
+def _drain(pool: FakePool, jobs):
+    """Un seul worker occupé par "gate" pendant qu'on met les jobs en file, puis on le libère."""
+    done, errors = [], []
+    pool.submit("gate", "video", time.monotonic() + 60, lambda _: None)
+    for url, kind, deadline in jobs:
+        pool.submit(url, kind, deadline, done.append, errors.append)
+    pool.release.set()
+    pool._q.join()
+    return done, errors
+
+
+def test_audio_then_images_then_videos_in_arrival_order():
+    pool = FakePool(workers=1)
+    later = time.monotonic() + 60
+    done, _ = _drain(pool, [("v1", "video", later), ("i1", "image", later), ("a1", "audio", later),
+                            ("i2", "image", later), ("x1", "other", later), ("a2", "audio", later)])
+    assert done == [b"a1", b"a2", b"i1", b"i2", b"v1", b"x1"]
+    assert pool.stats == {"done": 7, "expired": 0, "failed": 0}
+
+
+def test_expired_jobs_are_skipped_but_started_ones_finish():
+    pool = FakePool(workers=1)
+    now = time.monotonic()
+    done, errors = _drain(pool, [("old", "audio", now - 1), ("slow", "image", now + 0.2),
+                                 ("fail", "image", now + 60)])
+    assert "old" not in pool.fetched
+    assert done == [b"slow"]                       # fenêtre passée pendant le téléchargement : livré
+    assert [str(e) for e in errors] == ["fail"]
+    assert pool.stats == {"done": 2, "expired": 1, "failed": 1}
+
+
+def test_stats_stay_exact_with_several_workers():
+    pool = FakePool(workers=8)
+    pool.release.set()
+    later = time.monotonic() + 60
+    for i in range(2000):
+        pool.submit(f"fail{i}" if i % 3 == 0 else f"ok{i}", "image", later if i % 5 else 0, lambda _: None)
+    pool._q.join()
+    assert sum(pool.stats.values()) == 2000 and pool.stats["expired"] == 400
@@ -0,0 +1,47 @@
+import uuid
+
+import pytest
+
+from livetchat.shared import frames
+
+
+def test_start_chunk_end_roundtrip():
+    eid = uuid.uuid4().hex
+    start = frames.decode(frames.encode_start(eid, {"kind": "image", "username": "é"}, 1234))
+    assert (start.type, start.event_id, start.seq, start.offset) == (frames.START, eid, 0, 1234)
+    assert start.meta() == {"kind": "image", "username": "é"}
+
+    payload = bytes(range(256)) * 4
+    chunk = frames.decode(frames.encode(frames.CHUNK, frames.event_bytes(eid), 3, 4096, memoryview(payload)))
+    assert (chunk.type, chunk.event_id, chunk.seq, chunk.offset) == (frames.CHUNK, eid, 3, 4096)
+    assert bytes(chunk.payload) == payload
+
+    end = frames.decode(frames.encode(frames.END, eid, 4, 1234))
+    assert (end.type, end.seq, end.offset, bytes(end.payload)) == (frames.END, 4, 1234, b"")
+
+
+def test_header_is_fixed_size():
+    assert frames.HEADER.size == 32
+    assert len(frames.encode(frames.END, uuid.uuid4().hex)) == 32
+
+
+def test_payload_is_a_view():
+    data = frames.encode(frames.CHUNK, uuid.uuid4().hex, 0, 0, b"abc")
+    assert isinstance(frames.decode(data).payload, memoryview)
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"LT\x01", "courte"),
+    (b"XX" + bytes(30), "magic"),
+    (frames.HEADER.pack(frames.MAGIC, frames.VERSION + 1, frames.CHUNK, bytes(16), 0, 0), "version"),
+    (frames.HEADER.pack(frames.MAGIC, frames.VERSION, 99, bytes(16), 0, 0), "type"),
+])
+def test_decode_rejects(data, message):
+    with pytest.raises(frames.FrameError, match=message):
+        frames.decode(data)
+
+
+def test_is_frame():
+    assert frames.is_frame(frames.encode(frames.END, uuid.uuid4().hex))
+    assert not frames.is_frame(b"LT")
+    assert not frames.is_frame(b"\x89PNG" + bytes(40))
@@ -0,0 +1,70 @@
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from livetchat.server import hotcache
+from livetchat.server.hotcache import HotCache
+
+
+class Counts:
+    def __init__(self):
+        self.seen: list[str] = []
+
+    def inc(self, label=None):
+        self.seen.append(label)
+
+
+@pytest.fixture
+def requests_seen(monkeypatch):
+    counts = Counts()
+    monkeypatch.setattr(hotcache, "HOT_REQUESTS", counts)
+    return counts.seen
+
+
+def test_lru_within_byte_budget():
+    c = HotCache(budget_bytes=100, max_item_bytes=60)
+    c.put("a", b"a" * 40); c.put("b", b"b" * 40)
+    assert c.get("a") is not None                 # "a" devient le plus récent
+    c.put("c", b"c" * 40)                         # 120 > 100 : "b" sort
+    assert (c.get("b"), len(c), c.bytes) == (None, 2, 80)
+    c.put("big", b"x" * 61)                       # > max_item : jamais en cache
+    assert c.get("big") is None and c.bytes == 80
+    c.put("a", b"a" * 10)                         # remplacement : compté une seule fois
+    c.discard("c")
+    assert (len(c), c.bytes) == (1, 10)
+
+
+def test_concurrent_misses_read_the_file_once(tmp_path, monkeypatch, requests_seen):
+    path = tmp_path / "m.png"
+    path.write_bytes(b"z" * 1000)
+    opened, release = [], threading.Event()
+
+    def slow_open(p, mode):
+        opened.append(p)
+        release.wait(5)
+        return open(p, mode)
+    monkeypatch.setattr(hotcache, "open", slow_open, raising=False)
+
+    c = HotCache()
+    with ThreadPoolExecutor(8) as pool:
+        results = [pool.submit(c.fetch, str(path), 1000) for _ in range(8)]
+        deadline = time.monotonic() + 5
+        while len(requests_seen) < 8 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        release.set()
+        assert {r.result() for r in results} == {b"z" * 1000}
+    assert opened == [str(path)]
+    assert sorted(requests_seen) == ["coalesced"] * 7 + ["miss"]
+    assert c.fetch(str(path), 1000) == b"z" * 1000 and requests_seen[-1] == "hit"
+
+
+def test_failed_read_is_not_cached(tmp_path, requests_seen):
+    c = HotCache()
+    missing = str(tmp_path / "absent.png")
+    with pytest.raises(FileNotFoundError):
+        c.fetch(missing, 10)
+    assert c._inflight == {} and len(c) == 0      # l'échec n'est pas mis en cache
+    (tmp_path / "absent.png").write_bytes(b"ok")
+    assert c.fetch(missing, 2) == b"ok"
+    assert c.fetch(str(tmp_path / "huge"), 10**12) is None    # non cacheable : pas de lecture
@@ -0,0 +1,182 @@
+import hashlib, sys, time, types
+
+import pytest
+
+from livetchat.shared import frames
+from conftest import png_bytes
+
+
+def _form(data: bytes, **extra):
+    return {"display_time": "2", "display_text": "", "username": "guest", **extra}
+
+
+def _upload(client, data: bytes, name="pic.png"):
+    return client.post("/upload/", data=_form(data), files={"file": (name, data, "image/png")})
+
+
+@pytest.fixture
+def uploaded(server):
+    _, client = server
+    data = png_bytes(20_000)
+    r = _upload(client, data)
+    assert r.status_code == 200, r.text
+    return data, r.json()["filename"]
+
+
+@pytest.mark.parametrize("hot", [True, False], ids=["hot-cache", "file-response"])
+def test_get_etag_304_and_range_206(server, uploaded, monkeypatch, hot):
+    main, client = server
+    if not hot:
+        monkeypatch.setattr(main, "_hot_fetch", lambda path, size: None)
+    data, name = uploaded
+    url = f"/files/images/{name}"
+
+    r = client.get(url)
+    assert r.status_code == 200 and r.content == data
+    etag = r.headers["etag"]
+
+    r = client.get(url, headers={"If-None-Match": etag})
+    assert r.status_code == 304 and not r.content
+
+    r = client.get(url, headers={"Range": "bytes=100-199"})
+    assert r.status_code == 206
+    assert r.content == data[100:200]
+    assert r.headers["content-range"] == f"bytes 100-199/{len(data)}"
+
+
+def test_get_unknown_is_404(server):
+    _, client = server
+    assert client.get("/files/images/" + "0" * 64 + ".png").status_code == 404
+
+
+def test_by_hash_miss_then_upload_then_hit(server, fresh_limiter):
+    """404 -> /upload/ -> by-hash 200 : le 404 ne coûte rien, une rafale de 3 suffit pour 3 médias."""
+    _, client = server
+    for _ in range(3):
+        data = png_bytes(5_000)
+        sha = hashlib.sha256(data).hexdigest()
+        r = client.post("/upload/by-hash/", data=_form(data, sha256=sha, filename="a.png"))
+        assert r.status_code == 404 and r.json() == {"error": "UNKNOWN_HASH"}
+        assert _upload(client, data, "a.png").status_code == 200
+    r = client.post("/upload/by-hash/", data=_form(data, sha256=sha, filename="a.png"))
+    assert r.status_code == 429 and "retry-after" in r.headers        # rafale épuisée par les 3 uploads
+    fresh_limiter.refund("ip:testclient")
+    r = client.post("/upload/by-hash/", data=_form(data, sha256=sha, filename="a.png"))
+    assert r.status_code == 200 and r.json()["is_new"] is False
+
+
+def test_by_hash_rejects_files_and_bad_hash(server):
+    _, client = server
+    data = png_bytes(100)
+    r = client.post("/upload/by-hash/", data=_form(data, sha256="0" * 64),
+                    files={"file": ("a.png", data, "image/png")})
+    assert r.status_code == 422
+    r = client.post("/upload/by-hash/", data=_form(data, sha256="nope"))
+    assert r.status_code == 422
+
+
+def test_small_form_is_bounded_before_parsing(server, fresh_limiter):
+    _, client = server
+    big = {"sha256": "0" * 64, "display_time": "1", "display_text": "x" * 70_000}
+    r = client.post("/upload/by-hash/", data=big)
+    assert r.status_code == 413 and r.json() == {"error": "TOO_LARGE"}
+    r = client.post("/upload/sessions/", content=iter([b"size=10&display_time=1"]),
+                    headers={"Content-Type": "application/x-www-form-urlencoded"})
+    assert r.status_code == 413                                   # pas de Content-Length
+
+
+def test_pulled_notice_carries_server_time_target(server, fresh_limiter):
+    main, client = server
+    data = png_bytes(100_000)                     # au-delà d'INLINE_MAX_BYTES : téléchargé par les clients
+    assert _upload(client, data).status_code == 200
+    [notice] = main.notices.replay.since(main.notices.seq.current - 1, main.notices.seq.current)
+    assert "inline" not in notice
+    assert notice["start_after_ms"] == main.PULL_START_AFTER_MS["image"]
+    assert abs(notice["server_ts_ms"] - time.time() * 1000) < 5000
+
+
+@pytest.mark.parametrize("encoding, query, announced", [
+    ("frames", "?frames=1", 1), ("frames", "", None), ("bin", "?frames=1", None)])
+def test_hello_announces_binary_encoding(server, monkeypatch, encoding, query, announced):
+    main, client = server
+    monkeypatch.setattr(main, "INLINE_ENCODING", encoding)
+    with client.websocket_connect("/ws" + query) as ws:
+        hello = ws.receive_json()
+    assert hello["type"] == "hello" and hello["frames"] == announced
+
+
+def test_upload_sniff_mismatch_is_415_and_not_stored(server, fresh_limiter):
+    main, client = server
+    before = len(main.store.entries)
+    data = b"<html>" + bytes(1000)
+    r = client.post("/upload/", data=_form(data), files={"file": ("pic.png", data, "image/png")})
+    assert (r.status_code, r.json()["error"]) == (415, "CONTENT_MISMATCH")
+    assert len(main.store.entries) == before
+
+
+@pytest.mark.parametrize("interval, expected", [(15.0, (15.0, 45.0)), (0, (None, None))])
+def test_protocol_pings_follow_heartbeat_setting(server, monkeypatch, interval, expected):
+    main, _ = server
+    calls = []
+    monkeypatch.setitem(sys.modules, "uvicorn", types.SimpleNamespace(run=lambda *a, **kw: calls.append(kw)))
+    monkeypatch.setattr(main, "WS_HEARTBEAT_S", interval)
+    monkeypatch.setattr(main, "WS_HEARTBEAT_TIMEOUT_S", 45.0)
+    main.main()
+    assert (calls[0]["ws_ping_interval"], calls[0]["ws_ping_timeout"]) == expected
+
+
+@pytest.mark.parametrize("username_after_file", [False, True], ids=["before", "after"])
+def test_user_bucket_applies_wherever_username_is(server, fresh_limiter, username_after_file):
+    _, client = server
+    fresh_limiter.acquire("user:mallory", 0, 3)            # seau du pseudo vide, celui de l'IP plein
+    data = png_bytes(1000)
+    file_part = (b'--B\r\nContent-Disposition: form-data; name="file"; filename="p.png"\r\n\r\n'
+                 + data + b"\r\n")
+    user_part = b'--B\r\nContent-Disposition: form-data; name="username"\r\n\r\nmallory\r\n'
+    time_part = b'--B\r\nContent-Disposition: form-data; name="display_time"\r\n\r\n1\r\n'
+    parts = [file_part, user_part] if username_after_file else [user_part, file_part]
+    r = client.post("/upload/", content=b"".join(parts) + time_part + b"--B--\r\n",
+                    headers={"content-type": "multipart/form-data; boundary=B"})
+    assert (r.status_code, r.json()["error"]) == (429, "RATE_LIMITED")
+
+
+def _scrape(client) -> dict[str, float]:
+    """Échantillons de /metrics (format texte Prometheus) : "nom{labels}" -> valeur."""
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    samples = {}
+    for line in r.text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name, _, value = line.rpartition(" ")
+        samples[name] = float(value)                  # chaque ligne : "<série> <nombre>"
+    return samples
+
+
+def test_metrics_count_uploads(server, fresh_limiter):
+    _, client = server
+    before = _scrape(client)
+    assert _upload(client, png_bytes(2000)).status_code == 200
+    after = _scrape(client)
+    key = 'livetchat_upload_seconds_count{outcome="ok"}'
+    assert after[key] == before.get(key, 0) + 1
+    assert after['livetchat_uploads_total{outcome="ok"}'] == before.get('livetchat_uploads_total{outcome="ok"}', 0) + 1
+    assert after['livetchat_upload_seconds_bucket{outcome="ok",le="+Inf"}'] == after[key]
+
+
+@pytest.mark.parametrize("name, data", [("small.png", png_bytes(2000)), ("small.mp3", b"ID3\x03" + bytes(3000))])
+def test_small_media_is_pushed_inline_before_its_notice(server, fresh_limiter, name, data):
+    main, client = server
+    with client.websocket_connect(f"/ws?frames={frames.VERSION}") as ws:
+        assert ws.receive_json()["type"] == "hello"
+        r = client.post("/upload/", data=_form(data), files={"file": (name, data)})
+        assert r.status_code == 200, r.text
+        start = frames.decode(ws.receive_bytes())
+        chunks = []
+        while (f := frames.decode(ws.receive_bytes())).type == frames.CHUNK:
+            chunks.append(bytes(f.payload))
+        notice = ws.receive_json()
+    assert start.type == frames.START and f.type == frames.END
+    assert b"".join(chunks) == data and start.meta()["content_length"] == len(data)
+    assert notice["type"] == "media_notice" and notice["filename"] == r.json()["filename"]
+    assert notice["inline"] == start.event_id
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from livetchat.server.listings import MediaListing, BadCursor
+from livetchat.server.store import MediaStore
+
+
+def _store(tmp_path, n):
+    store = MediaStore({"image": str(tmp_path / "images"), "video": str(tmp_path / "videos")},
+                       str(tmp_path / "index.jsonl"))
+    for i in range(n):
+        tmp = tmp_path / f"{i}.part"
+        tmp.write_bytes(bytes(10))
+        asyncio.run(store.put(str(tmp), f"{i:064x}", kind="image", ext=".png", size=10, name=f"{i}.png"))
+    for i in range(n):
+        store.entries[f"{i:064x}"].created = float(i)   # ordre de création déterministe
+    store.versions["image"] += 1
+    return store
+
+
+def test_pages_newest_first_with_cursor(tmp_path):
+    listing = MediaListing(_store(tmp_path, 5))
+    p1 = listing.page("image", limit=2)
+    assert [it["names"] for it in p1["items"]] == [["4.png"], ["3.png"]] and p1["total"] == 5
+    p2 = listing.page("image", p1["next_cursor"], limit=2)
+    p3 = listing.page("image", p2["next_cursor"], limit=2)
+    assert [it["names"][0] for it in p2["items"] + p3["items"]] == ["2.png", "1.png", "0.png"]
+    assert p3["next_cursor"] is None
+    assert listing.page("video")["items"] == []
+    with pytest.raises(BadCursor):
+        listing.page("image", "nope_x")
+
+
+def test_etag_follows_writes_not_reads(tmp_path):
+    store = _store(tmp_path, 2)
+    listing = MediaListing(store)
+    etag = listing.etag("image")
+    store.touch(f"{0:064x}")                         # GET /files/* : rien de listé ne change
+    assert listing.etag("image") == etag
+    assert "last_access" not in listing.page("image")["items"][0]
+    store.claim(f"{0:064x}", "autre.png")            # nouveau nom : listé -> nouvelle version
+    assert listing.etag("image") != etag
+    assert listing.etag("video") != listing.etag("image")
+
+
+def test_listing_304(server):
+    _, client = server
+    r = client.get("/files/images/", params={"limit": 1})
+    assert r.status_code == 200 and r.headers["etag"]
+    r = client.get("/files/images/", params={"limit": 1}, headers={"If-None-Match": r.headers["etag"]})
+    assert r.status_code == 304
+    assert client.get("/files/images/", params={"cursor": "bad"}).status_code == 400
+
+
+def test_etag_is_the_same_on_every_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr("livetchat.server.listings.REFRESH_S", 0)
+    a = _store(tmp_path, 2)
+    b = MediaStore(dict(a.roots), a.index_path)
+    b.load()
+    la, lb = MediaListing(a), MediaListing(b)
+    etag = la.etag("image")
+    assert lb.etag("image") == etag and la.etag("video") == lb.etag("video")
+    tmp = tmp_path / "new.part"
+    tmp.write_bytes(bytes(10))
+    asyncio.run(b.put(str(tmp), "f" * 64, kind="image", ext=".png", size=10, name="new.png"))
+    assert lb.etag("image") == la.etag("image") != etag
+    assert la.etag("video") == lb.etag("video")          # autre type : inchangé
+
+    c = MediaStore(dict(a.roots), a.index_path)          # redémarrage avec compaction du journal
+    monkeypatch.setattr(c, "_read_tail", lambda real=c._read_tail: real() + 10_000)
+    c.load()
+    assert len(open(a.index_path).readlines()) == 3
+    assert MediaListing(c).etag("image") == la.etag("image") == lb.etag("image")
@@ -0,0 +1,53 @@
+import hashlib, os
+
+import pytest
+
+from livetchat.server import routes_manifest
+
+
+@pytest.fixture
+def exe(server, monkeypatch):
+    """Exe du manifest + compteur des hachages complets ; cache remis à zéro."""
+    monkeypatch.setattr(routes_manifest, "_exe_cache", {"key": None, "sha256": None, "computed_at": 0.0})
+    hashed = []
+    real = routes_manifest.sha256_file
+    monkeypatch.setattr(routes_manifest, "sha256_file", lambda p: hashed.append(p) or real(p))
+    yield routes_manifest.EXE_PATH, hashed
+    try:
+        os.remove(routes_manifest.EXE_PATH)
+    except FileNotFoundError:
+        pass
+
+
+def test_hash_cached_until_the_exe_changes(server, exe):
+    _, client = server
+    path, hashed = exe
+    with open(path, "wb") as f:
+        f.write(b"v1")
+    for _ in range(3):
+        r = client.get("/manifest.json")
+        assert r.status_code == 200 and r.json()["sha256"] == hashlib.sha256(b"v1").hexdigest()
+    assert len(hashed) == 1
+
+    with open(path + ".new", "wb") as f:             # nouvelle version déposée par rename
+        f.write(b"v2-longer")
+    os.replace(path + ".new", path)
+    r = client.get("/manifest.json")
+    assert r.json()["sha256"] == hashlib.sha256(b"v2-longer").hexdigest() and len(hashed) == 2
+
+
+def test_if_none_match_is_304(server, exe):
+    _, client = server
+    path, _ = exe
+    with open(path, "wb") as f:
+        f.write(b"v1")
+    etag = client.get("/manifest.json").headers["etag"]
+    r = client.get("/manifest.json", headers={"If-None-Match": etag})
+    assert r.status_code == 304 and r.headers["etag"] == etag and not r.content
+    assert client.get("/manifest.json", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_missing_exe_is_503(server, exe):
+    _, client = server
+    r = client.get("/manifest.json")
+    assert (r.status_code, r.json()) == (503, {"error": "exe_missing"})
@@ -0,0 +1,115 @@
+import asyncio, json
+
+from livetchat.client.notices import SeenSeqs
+from livetchat.server.backplane import InProcessBackplane
+from livetchat.server.notices import NoticeBatcher
+from livetchat.server.replay import SeqAllocator
+from livetchat.server.ws_manager import ConnectionManager, _Conn
+
+
+class FakeWS:
+    client = None
+
+
+def _batcher(**kw):
+    """Un client sans tâche d'écriture : ce qui lui est envoyé reste dans sa file."""
+    m = ConnectionManager()
+    c = _Conn(FakeWS())
+    m.active[c.ws] = c
+    return NoticeBatcher(m, **kw), c
+
+
+def _sent(c):
+    return [json.loads(e[1]) for e in c.queue]
+
+
+def _notice(i):
+    return {"type": "media_notice", "filename": f"{i}.png"}
+
+
+def test_burst_within_window_is_one_batch_frame():
+    async def scenario():
+        b, c = _batcher(window_ms=20)
+        for i in range(3):
+            await b.publish(_notice(i))
+        assert not c.queue                           # rien avant la fin de la fenêtre
+        await asyncio.sleep(0.05)                    # flush lancé par le timer
+        return b, c
+    b, c = asyncio.run(scenario())
+    [frame] = _sent(c)
+    assert frame["type"] == "media_notice_batch"
+    assert [(n["filename"], n["seq"]) for n in frame["notices"]] == [("0.png", 1), ("1.png", 2), ("2.png", 3)]
+    assert [n["seq"] for n in b.replay.since(0, 3)] == [1, 2, 3]
+
+
+def test_single_notice_keeps_legacy_shape_and_max_batch_flushes_now():
+    async def scenario():
+        b, c = _batcher(window_ms=0)
+        await b.publish(_notice(0))
+        b2, c2 = _batcher(window_ms=10_000, max_batch=2)
+        await b2.publish(_notice(1))
+        await b2.publish(_notice(2))
+        return c, c2
+    c, c2 = asyncio.run(scenario())
+    assert _sent(c) == [{"type": "media_notice", "filename": "0.png", "seq": 1}]
+    assert [len(f["notices"]) for f in _sent(c2)] == [2]
+
+
+def test_hello_replays_missed_notices():
+    async def scenario():
+        b, _ = _batcher(window_ms=0)
+        for i in range(3):
+            await b.publish(_notice(i))
+        return b
+    b = asyncio.run(scenario())
+    hello, replay = map(json.loads, b.hello(1, b.seq.epoch))
+    assert hello == {"type": "hello", "epoch": b.seq.epoch, "seq": 3, "frames": None}
+    assert [n["seq"] for n in replay["notices"]] == [2, 3]
+    assert json.loads(b.hello(1, "other-epoch")[1])["type"] == "replay_gap"
+
+
+def test_two_workers_seqs_out_of_order_are_all_kept(tmp_path):
+    """Worker A réserve le seq 1 mais diffuse après B (seq 2) : le client de A reçoit 2 puis 1."""
+    async def scenario():
+        hub, path = [], str(tmp_path / "seq")
+        workers = []
+        for _ in range(2):
+            m = ConnectionManager(backplane=InProcessBackplane(hub=hub))
+            await m.start()
+            c = _Conn(FakeWS())
+            m.active[c.ws] = c
+            workers.append((NoticeBatcher(m, window_ms=0, seq=SeqAllocator(path)), c))
+        (a, ca), (b, cb) = workers
+        reserved, gate, reserve = asyncio.Event(), asyncio.Event(), a.seq.reserve
+
+        async def slow_reserve(n):
+            first = await reserve(n)
+            reserved.set()
+            await gate.wait()          # A perd la main entre la réservation et la diffusion
+            return first
+        a.seq.reserve = slow_reserve
+        late = asyncio.create_task(a.publish(_notice("a")))
+        await reserved.wait()
+        await b.publish(_notice("b"))
+        gate.set()
+        await late
+        return a, ca, cb
+    a, ca, cb = asyncio.run(scenario())
+    for c in (ca, cb):
+        assert sorted(n["seq"] for n in _sent(c)) == [1, 2]
+    assert [n["seq"] for n in _sent(ca)] == [2, 1]
+    assert [n["seq"] for n in a.replay.since(0, 2)] == [1, 2]
+
+    seen = SeenSeqs()
+    seen.reset(0)                                    # hello
+    assert [seen.accept(n["seq"]) for n in _sent(ca)] == [True, True]
+    assert not seen.accept(1) and seen.high == 2     # doublon (replay + direct) ignoré
+
+
+def test_seen_seqs_window_is_bounded():
+    seen = SeenSeqs(window=4)
+    assert all(seen.accept(s) for s in range(1, 20))
+    assert not seen.accept(15) and not seen.accept(3)   # doublon / trop vieux pour la fenêtre
+    assert seen.accept(20) and len(seen._seen) <= 8
+    seen.reset(100)                                      # nouvel epoch
+    assert seen.accept(99) and seen.high == 100
@@ -0,0 +1,55 @@
+from livetchat.server.ratelimit import RateLimiter, TokenBucket, InflightGate, retry_after
+
+
+def test_token_bucket_burst_then_refill():
+    b = TokenBucket(rate=2.0, burst=3, now=0.0)
+    for _ in range(3):
+        assert b.wait(1, 0.0) == 0.0
+        b.tokens -= 1
+    assert b.wait(1, 0.0) == 0.5           # 1 jeton à 2/s
+    assert b.wait(1, 0.5) == 0.0           # rechargé
+    assert b.wait(1, 100.0) == 0.0 and b.tokens == 3   # jamais au-delà de la rafale
+
+
+def test_token_bucket_oversized_request_waits_for_full_bucket():
+    b = TokenBucket(rate=1.0, burst=10, now=0.0)
+    b.tokens = 4
+    assert b.wait(50, 0.0) == 6.0
+
+
+def test_limiter_requests_and_bytes():
+    lim = RateLimiter(0.001, 2, 0.001, 1000)
+    assert lim.acquire("ip:a", 600) == 0
+    assert lim.acquire("ip:a", 600) > 0      # octets épuisés : rien n'est pris
+    assert lim.acquire("ip:a", 400) == 0
+    assert lim.acquire("ip:a", 0) > 0        # requêtes épuisées
+    assert lim.acquire("ip:b", 0) == 0       # clés indépendantes
+
+
+def test_limiter_refund_and_bytes_only():
+    lim = RateLimiter(0.001, 1, 0.001, 1000)
+    assert lim.acquire("ip:a") == 0
+    assert lim.acquire("ip:a") > 0
+    lim.refund("ip:a")
+    assert lim.acquire("ip:a") == 0
+    assert lim.acquire("ip:a", 500, requests=0) == 0    # octets seuls, seau de requêtes vide
+    lim.refund("ip:unknown")                            # clé inconnue : sans effet
+
+
+def test_limiter_disabled():
+    lim = RateLimiter(0, 0, 0, 0)
+    assert all(lim.acquire("ip:a", 10**9) == 0 for _ in range(100))
+    assert len(lim) == 0
+
+
+def test_inflight_gate():
+    g = InflightGate(1)
+    assert g.enter() and not g.enter()
+    g.leave()
+    assert g.enter()
+    assert all(InflightGate(0).enter() for _ in range(10))
+
+
+def test_retry_after_rounds_up():
+    assert retry_after(0.1) == {"Retry-After": "1"}
+    assert retry_after(2.01) == {"Retry-After": "3"}
@@ -0,0 +1,61 @@
+import asyncio
+
+from livetchat.server import replay
+from livetchat.server.replay import ReplayBuffer, SeqAllocator
+
+
+def _fill(buf, seqs):
+    for s in seqs:
+        buf.add(s, {"seq": s})
+
+
+def test_since_returns_missed_in_order():
+    buf = ReplayBuffer(10)
+    _fill(buf, [3, 1, 2, 4])
+    assert [e["seq"] for e in buf.since(1, 4)] == [2, 3, 4]
+    assert buf.since(4, 4) == []
+
+
+def test_since_reports_gap_when_evicted():
+    buf = ReplayBuffer(3)
+    _fill(buf, range(1, 6))            # 1 et 2 sortis du tampon
+    assert buf.since(0, 5) is None
+    assert [e["seq"] for e in buf.since(2, 5)] == [3, 4, 5]
+
+
+def test_since_drops_old_events(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(replay.time, "monotonic", lambda: now[0])
+    buf = ReplayBuffer(10, max_age_s=60)
+    _fill(buf, [1, 2])
+    now[0] += 61
+    assert buf.since(0, 2) is None
+
+
+def test_seq_allocator_in_memory():
+    seq = SeqAllocator()
+    assert seq.take(3) == 1 and seq.current == 3
+    seq.seen(10)
+    assert seq.take(1) == 11
+
+
+def test_seq_allocator_shared_file(tmp_path):
+    path = str(tmp_path / "seq")
+    a, b = SeqAllocator(path), SeqAllocator(path)
+    assert a.epoch == b.epoch
+    assert a.take(2) == 1
+    assert b.take(1) == 3               # même compteur pour les deux workers
+    assert a.take(1) == 4
+
+
+def test_seq_allocator_reserve_off_loop(tmp_path):
+    path = str(tmp_path / "seq")
+    a, b = SeqAllocator(path), SeqAllocator(path)
+
+    async def scenario():
+        sizes = (2, 3, 1)
+        firsts = await asyncio.gather(a.reserve(2), b.reserve(3), a.reserve(1))
+        return sorted(s for first, n in zip(firsts, sizes) for s in range(first, first + n))
+    assert asyncio.run(scenario()) == [1, 2, 3, 4, 5, 6]      # plages disjointes, sans trou
+    assert a.take(1) == 7 and SeqAllocator().current == 0
+    assert asyncio.run(SeqAllocator().reserve(2)) == 1        # en mémoire : pas de thread
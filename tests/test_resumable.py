@@ -0,0 +1,130 @@
+import asyncio, hashlib
+
+import pytest
+
+from livetchat.server.resumable import UploadSessions, merge_ranges
+from livetchat.server.uploads import UploadRejected
+from conftest import png_bytes
+
+
+@pytest.mark.parametrize("pairs, merged", [
+    ([], []),
+    ([(0, 10)], [[0, 10]]),
+    ([(10, 20), (0, 10)], [[0, 20]]),            # contiguës, dans le désordre
+    ([(0, 10), (5, 15), (30, 40)], [[0, 15], [30, 40]]),
+    ([(0, 100), (10, 20)], [[0, 100]]),          # incluse
+])
+def test_merge_ranges(pairs, merged):
+    assert merge_ranges(pairs) == merged
+
+
+async def _body(*parts, pause: float = 0):
+    for p in parts:
+        if pause:
+            await asyncio.sleep(pause)
+        yield p
+
+
+def _new(sessions, data, name="a.png"):
+    return sessions.create(name, len(data), hashlib.sha256(data).hexdigest(), {"display_time": "1"})["id"]
+
+
+def _rejected(coro_or_fn, error):
+    with pytest.raises(UploadRejected) as e:
+        if asyncio.iscoroutine(coro_or_fn):
+            asyncio.run(coro_or_fn)
+        else:
+            coro_or_fn()
+    assert e.value.error == error
+    return e.value
+
+
+@pytest.mark.parametrize("name, size, sha, error", [
+    ("a.exe", 10, "0" * 64, "UNSUPPORTED_FORMAT"),
+    ("a.png", 0, "0" * 64, "CONTENT_MISMATCH"),
+    ("a.png", 10**12, "0" * 64, "TOO_LARGE"),
+    ("a.png", 10, "xyz", "BAD_FORM"),
+])
+def test_create_rejects(tmp_path, name, size, sha, error):
+    _rejected(lambda: UploadSessions(str(tmp_path)).create(name, size, sha, {}), error)
+
+
+def test_out_of_order_chunks_then_commit(tmp_path):
+    s = UploadSessions(str(tmp_path))
+    data = png_bytes(50_000)
+    sid = _new(s, data)
+    assert asyncio.run(s.write(sid, 30_000, _body(data[30_000:]))) == [[30_000, len(data)]]
+    _rejected(s.commit(sid), "INCOMPLETE")
+    assert asyncio.run(s.write(sid, 0, _body(data[:10_000], data[10_000:30_000]))) == [[0, len(data)]]
+    meta, path = asyncio.run(s.commit(sid))
+    assert meta["sha256"] == hashlib.sha256(data).hexdigest()
+    with open(path, "rb") as f:
+        assert f.read() == data
+    _rejected(s.write(sid, 0, _body(data[:10])), "UNKNOWN_SESSION")
+
+
+def test_hash_mismatch(tmp_path):
+    s = UploadSessions(str(tmp_path))
+    data = png_bytes(1000)
+    sid = s.create("a.png", len(data), "0" * 64, {})["id"]
+    asyncio.run(s.write(sid, 0, _body(data)))
+    _rejected(s.commit(sid), "HASH_MISMATCH")
+
+
+def test_sniff_and_bounds(tmp_path):
+    s = UploadSessions(str(tmp_path))
+    data = png_bytes(1000)
+    sid = _new(s, data)
+    _rejected(s.write(sid, 0, _body(b"not an image" + bytes(100))), "CONTENT_MISMATCH")
+    _rejected(s.write(sid, len(data), _body(b"x")), "BAD_RANGE")
+    _rejected(s.write(sid, 900, _body(bytes(200))), "TOO_LARGE")
+
+
+def test_commit_waits_for_streaming_chunk(tmp_path):
+    """Un commit pendant un PUT est refusé (409) : rien n'est écrit dans un fichier déjà rangé."""
+    s = UploadSessions(str(tmp_path))
+    data = png_bytes(100_000)
+    sid = _new(s, data)
+
+    async def scenario():
+        await s.write(sid, 0, _body(data[:50_000]))
+        put = asyncio.create_task(s.write(sid, 50_000, _body(data[50_000:75_000], data[75_000:], pause=0.05)))
+        await asyncio.sleep(0.02)
+        with pytest.raises(UploadRejected) as e:
+            await s.commit(sid)
+        assert e.value.error == "IN_PROGRESS"
+        assert await put == [[0, len(data)]]
+        return await s.commit(sid)
+
+    _, path = asyncio.run(scenario())
+    with open(path, "rb") as f:
+        assert hashlib.sha256(f.read()).hexdigest() == hashlib.sha256(data).hexdigest()
+
+
+def test_record_after_abort_is_ignored(tmp_path):
+    s = UploadSessions(str(tmp_path))
+    sid = _new(s, png_bytes(100))
+    s.abort(sid)
+    s._record(sid, 0, 10)          # PUT terminé après l'annulation : pas d'exception
+    assert s.received(sid) == []
+
+
+def test_chunk_puts_are_charged_and_gated(server, monkeypatch):
+    from livetchat.server.ratelimit import RateLimiter, InflightGate
+    main, client = server
+    monkeypatch.setattr(main, "limiter", RateLimiter(0, 0, 0.001, 1000))     # octets seuls, rafale de 1000
+    data = png_bytes(3000)
+    r = client.post("/upload/sessions/", data={"filename": "a.png", "size": str(len(data)), "display_time": "1",
+                                                "sha256": hashlib.sha256(data).hexdigest()})
+    sid = r.json()["id"]
+    assert client.put(f"/upload/sessions/{sid}", params={"offset": 0}, content=data[:1000]).status_code == 200
+    r = client.put(f"/upload/sessions/{sid}", params={"offset": 0}, content=data[:1000])    # même morceau : refacturé
+    assert r.status_code == 429 and "retry-after" in r.headers
+
+    gate = InflightGate(1)
+    assert gate.enter()
+    monkeypatch.setattr(main, "upload_gate", gate)
+    monkeypatch.setattr(main, "limiter", RateLimiter(0, 0, 0, 0))
+    r = client.put(f"/upload/sessions/{sid}", params={"offset": 1000}, content=data[1000:2000])
+    assert r.status_code == 429 and r.json() == {"error": "BUSY"}
+    assert client.get(f"/upload/sessions/{sid}").json()["received"] == [[0, 1000]]
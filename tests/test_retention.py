@@ -0,0 +1,35 @@
+import asyncio
+
+from livetchat.server.retention import Retention, select_victims
+from livetchat.server.store import MediaEntry, MediaStore
+
+
+def _entry(h, atime, size=100, created=0.0):
+    return MediaEntry(hash=h, kind="image", ext=".png", size=size, created=created, atime=atime)
+
+
+def test_expired_first_then_lru_until_under_quota():
+    entries = [_entry("c", 900), _entry("a", 100), _entry("b", 500), _entry("d", 990)]
+    victims = select_victims(entries, usage=400, quota=250, max_age_s=600, grace_s=0, limit=10, now=1000)
+    # "a" expiré (900 s > 600), puis "b" (le plus ancien restant) : 400 - 200 <= 250
+    assert [(e.hash, r) for e, r in victims] == [("a", "age"), ("b", "quota")]
+
+
+def test_grace_and_limit():
+    entries = [_entry("a", 100), _entry("b", 200), _entry("new", 100, created=990)]
+    victims = select_victims(entries, usage=10**6, quota=1, max_age_s=0, grace_s=60, limit=1, now=1000)
+    assert [e.hash for e, _ in victims] == ["a"]
+    assert select_victims(entries, usage=100, quota=1000, max_age_s=0, grace_s=0, limit=10, now=1000) == []
+
+
+def test_pass_evicts_from_disk_and_index(tmp_path):
+    store = MediaStore({"image": str(tmp_path / "images")}, str(tmp_path / "index.jsonl"))
+    for h in ("a" * 64, "b" * 64):
+        tmp = tmp_path / h
+        tmp.write_bytes(bytes(1000))
+        asyncio.run(store.put(str(tmp), h, kind="image", ext=".png", size=1000, name="x.png"))
+    store.entries["a" * 64].atime = 0.0            # le moins récemment utilisé
+    gc = Retention(store, {"image": 1500}, grace_s=0)
+    assert asyncio.run(gc.run_pass()) == 1
+    assert list(store.entries) == ["b" * 64] and store.usage["image"] == 1000
+    assert not (tmp_path / "images" / "aa" / "aa" / ("a" * 64 + ".png")).exists()
@@ -0,0 +1,81 @@
+import asyncio, json
+
+from livetchat.server import store as store_mod
+from livetchat.server.store import MediaStore
+
+H1, H2 = "a" * 64, "b" * 64
+
+
+def _store(tmp_path) -> MediaStore:
+    return MediaStore({"image": str(tmp_path / "images"), "audio": str(tmp_path / "audios")},
+                      str(tmp_path / "index.jsonl"))
+
+
+def _put(s: MediaStore, tmp_path, h: str, name: str, size: int = 100, kind: str = "image"):
+    tmp = tmp_path / f"{h}.tmp"
+    tmp.write_bytes(bytes(size))
+    return asyncio.run(s.put(str(tmp), h, kind=kind, ext=".png" if kind == "image" else ".mp3", size=size, name=name))
+
+
+def _lines(tmp_path) -> list[dict]:
+    return [json.loads(l) for l in (tmp_path / "index.jsonl").read_text().splitlines()]
+
+
+def test_put_dedups_and_replays_from_the_journal(tmp_path):
+    s = _store(tmp_path)
+    e, new = _put(s, tmp_path, H1, "a.png")
+    assert new and e.filename == H1 + ".png"
+    assert (tmp_path / "images" / "aa" / "aa" / e.filename).stat().st_size == 100
+    e, new = _put(s, tmp_path, H1, "copie.png")          # même contenu : nom de plus, pas de fichier
+    assert not new and e.names == ["a.png", "copie.png"]
+    assert not (tmp_path / f"{H1}.tmp").exists()
+    _put(s, tmp_path, H2, "b.mp3", size=50, kind="audio")
+    s.set_variants(H1, 640, 480, [{"filename": f"{H1}.320x240.webp", "size": 10}])
+    asyncio.run(s.delete(H2))
+
+    again = _store(tmp_path)                              # redémarrage : tout vient du journal
+    again.load()
+    assert list(again.entries) == [H1]
+    e = again.entries[H1]
+    assert (e.names, e.width, e.height) == (["a.png", "copie.png"], 640, 480)
+    assert again.usage == {"image": 110, "audio": 0}
+    assert again.resolve("image", f"{H1}.320x240.webp")[0] is e
+    assert again.resolve("audio", f"{H1}.png") is None
+
+
+def test_other_workers_appends_are_seen(tmp_path):
+    a, b = _store(tmp_path), _store(tmp_path)
+    a.load(); b.load()
+    _put(a, tmp_path, H1, "a.png")
+    assert b.get(H1) is not None                          # relecture de la fin du journal sur miss
+    e, new = _put(b, tmp_path, H1, "b.png")
+    assert not new and e.names == ["a.png", "b.png"]
+
+
+def test_load_compacts_a_long_history(tmp_path):
+    s = _store(tmp_path)
+    _put(s, tmp_path, H1, "a.png")
+    _put(s, tmp_path, H2, "b.png")
+    asyncio.run(s.delete(H2))
+    for i in range(1100):
+        s._append({"op": "touch", "hash": H1, "atime": float(i)})
+    assert len(_lines(tmp_path)) > 2 * 1 + 1000
+
+    again = _store(tmp_path)
+    again.load()
+    assert [(r["op"], r["hash"]) for r in _lines(tmp_path)] == [("put", H1)]
+    assert again.entries[H1].names == ["a.png"] and again.usage["image"] == 100
+    _put(again, tmp_path, H2, "b.png")                    # le journal compacté reste appendable
+    third = _store(tmp_path)
+    third.load()
+    assert sorted(third.entries) == [H1, H2]
+
+
+def test_touch_is_persisted_at_most_once_per_period(tmp_path, monkeypatch):
+    s = _store(tmp_path)
+    _put(s, tmp_path, H1, "a.png")
+    monkeypatch.setattr(store_mod, "TOUCH_PERSIST_S", 0)
+    s.touch(H1)
+    monkeypatch.setattr(store_mod, "TOUCH_PERSIST_S", 3600)
+    s.touch(H1); s.touch(H1)
+    assert [r["op"] for r in _lines(tmp_path)] == ["put", "touch"]
@@ -0,0 +1,27 @@
+from livetchat.shared.timesync import ClockSync
+
+
+def test_offset_from_one_exchange():
+    c = ClockSync()
+    assert not c.synced
+    # serveur en avance de 1000 ms, 10 ms de trajet dans chaque sens, 2 ms de traitement
+    c.sample(t0=0, t1=1010, t2=1012, t3=22)
+    assert c.synced and c.offset_ms == 1000 and c.rtt_ms == 20
+    assert c.to_local_ms(5000) == 4000
+
+
+def test_min_rtt_sample_wins_then_smoothing():
+    c = ClockSync(window=4, alpha=0.5)
+    c.sample(0, 1010, 1010, 20)                    # rtt 20, offset 1000
+    c.sample(100, 1400, 1400, 400)                 # derrière une trame lente : rtt 300, offset faussé (1150)
+    assert c.offset_ms == 1000 and c.rtt_ms == 20
+    c.sample(200, 1205, 1205, 210)                 # rtt 10, offset 1000 -> meilleur échantillon
+    assert c.rtt_ms == 10 and c.offset_ms == 1000
+    c.sample(300, 1324, 1324, 308)                 # rtt 8, offset 1020 : lissé
+    assert c.offset_ms == 1010
+
+
+def test_negative_rtt_is_ignored():
+    c = ClockSync()
+    c.sample(100, 50, 60, 90)                      # horloge locale recalée en arrière
+    assert not c.synced and not c.samples
@@ -0,0 +1,104 @@
+import asyncio, hashlib, os
+
+import pytest
+from starlette.requests import Request
+
+from livetchat.server import uploads
+from livetchat.server.uploads import receive_upload, UploadRejected
+from conftest import png_bytes
+
+BOUNDARY = "xYzZY"
+
+
+def _multipart(*parts) -> bytes:
+    """parts : (nom, valeur) pour un champ texte, (nom, nom de fichier, octets) pour un fichier."""
+    out = b""
+    for p in parts:
+        disp = f'form-data; name="{p[0]}"' + (f'; filename="{p[1]}"' if len(p) == 3 else "")
+        out += f"--{BOUNDARY}\r\nContent-Disposition: {disp}\r\n\r\n".encode()
+        out += (p[2] if len(p) == 3 else p[1].encode()) + b"\r\n"
+    return out + f"--{BOUNDARY}--\r\n".encode()
+
+
+def _request(body: bytes, chunk: int = 1000) -> Request:
+    chunks = [body[i:i + chunk] for i in range(0, len(body), chunk)] or [b""]
+
+    async def receive():
+        data = chunks.pop(0)
+        return {"type": "http.request", "body": data, "more_body": bool(chunks)}
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()),
+               (b"content-length", str(len(body)).encode())]
+    return Request({"type": "http", "method": "POST", "headers": headers}, receive)
+
+
+def _receive(tmp_path, body: bytes, **kw):
+    return asyncio.run(receive_upload(_request(body), str(tmp_path), **kw))
+
+
+def _rejected(tmp_path, body: bytes) -> UploadRejected:
+    with pytest.raises(UploadRejected) as e:
+        _receive(tmp_path, body)
+    assert os.listdir(tmp_path) == []              # rien ne reste sur disque
+    return e.value
+
+
+def test_streams_file_and_fields(tmp_path):
+    data = png_bytes(5000)
+    up = _receive(tmp_path, _multipart(("username", "bob"), ("file", "a.png", data), ("display_time", "2")),
+                  keep_bytes=10_000)
+    assert (up.kind, up.filename, up.size) == ("image", "a.png", len(data))
+    assert up.digest == hashlib.sha256(data).hexdigest() and up.data == data
+    assert up.fields == {"username": "bob", "display_time": "2"}
+    with open(up.tmp_path, "rb") as f:
+        assert f.read() == data
+
+
+def test_text_field_named_file_is_not_the_file(tmp_path):
+    e = _rejected(tmp_path, _multipart(("file", "\x89PNG\r\n\x1a\n" + "x" * 100)))
+    assert (e.error, e.reason) == ("BAD_FORM", "file_without_filename")
+
+
+def test_other_file_parts_are_ignored(tmp_path):
+    data = png_bytes(100)
+    up = _receive(tmp_path, _multipart(("avatar", "b.png", b"junk"), ("file", "a.png", data)))
+    assert up.size == len(data) and up.fields == {}
+
+
+def test_malformed_multipart_is_bad_form(tmp_path):
+    body = f"--{BOUNDARY}\r\nContent-Disposition form-data\r\n\r\n".encode()   # entête sans ':'
+    e = _rejected(tmp_path, body)
+    assert (e.error, e.status_code) == ("BAD_FORM", 422)
+
+
+def test_missing_file(tmp_path):
+    assert _rejected(tmp_path, _multipart(("username", "bob"))).reason == "missing_file"
+
+
+@pytest.mark.parametrize("name, data", [
+    ("a.png", b"GIF89a" + bytes(100)),              # autre format d'image : seul le type compte
+    ("a.mp4", b"\x00\x00\x00\x18ftypmp42" + bytes(100)),
+    ("a.mp3", b"ID3\x03" + bytes(100)),
+    ("tiny.png", b"\x89PNG\r\n\x1a\n"),               # plus court que SNIFF_BYTES
+])
+def test_sniff_accepts_real_content(tmp_path, name, data):
+    assert _receive(tmp_path, _multipart(("file", name, data))).size == len(data)
+
+
+@pytest.mark.parametrize("name, data", [
+    ("a.png", b"<html><script>" + bytes(100)),
+    ("a.mp4", b"\x89PNG\r\n\x1a\n" + bytes(100)),
+    ("a.mp3", b"MZ\x90\x00" + bytes(100)),
+    ("tiny.png", b"MZ"),
+])
+def test_sniff_rejects_mismatched_content(tmp_path, name, data):
+    e = _rejected(tmp_path, _multipart(("file", name, data)))
+    assert (e.error, e.status_code) == ("CONTENT_MISMATCH", 415)
+
+
+def test_declared_mime_and_size_are_enforced_while_streaming(tmp_path, monkeypatch):
+    body = _multipart(("file", "a.png", png_bytes(100))).replace(
+        b'filename="a.png"\r\n', b'filename="a.png"\r\nContent-Type: text/html\r\n')
+    assert _rejected(tmp_path, body).reason == "mime=text/html"
+    monkeypatch.setitem(uploads.MAX_BYTES, "image", 5000)
+    e = _rejected(tmp_path, _multipart(("file", "a.png", png_bytes(6000))))
+    assert (e.error, e.status_code) == ("TOO_LARGE", 413)
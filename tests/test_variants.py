@@ -0,0 +1,92 @@
+import asyncio, io, os, time
+from concurrent.futures import Executor, Future
+
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image
+
+from livetchat.server.store import MediaStore
+from livetchat.server.variants import VariantBuilder, render_variants
+
+H = "c" * 64
+
+
+class SyncPool(Executor):
+    """Pool exécuté sur place (pas de process) ; `after()` appelé une fois le rendu fini."""
+
+    def __init__(self, after=None):
+        self.after = after
+
+    def submit(self, fn, *args, **kwargs):
+        f = Future()
+        try:
+            f.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            f.set_exception(e)
+        if self.after:
+            self.after()
+        return f
+
+
+def _png(w=400, h=300) -> bytes:
+    buf = io.BytesIO()
+    Image.frombytes("RGB", (w, h), os.urandom(w * h * 3)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_render_variants_downscales_only(tmp_path):
+    src = tmp_path / f"{H}.png"
+    src.write_bytes(_png())
+    info = render_variants(str(src), str(tmp_path), H, [(200, 200), (100, 100), (1920, 1080)], webp=True)
+    assert (info["width"], info["height"]) == (400, 300)
+    assert [(v["w"], v["h"], v["filename"]) for v in info["variants"]] == [
+        (200, 150, f"{H}.200x150.webp"), (100, 75, f"{H}.100x75.webp")]
+    for v in info["variants"]:
+        assert os.path.getsize(tmp_path / v["filename"]) == v["size"] < src.stat().st_size
+        with Image.open(tmp_path / v["filename"]) as im:
+            assert im.size == (v["w"], v["h"])
+
+
+def _builder(tmp_path, after=None):
+    store = MediaStore({"image": str(tmp_path / "images")}, str(tmp_path / "index.jsonl"))
+    tmp = tmp_path / "up.png"
+    tmp.write_bytes(_png())
+    entry, _ = asyncio.run(store.put(str(tmp), H, kind="image", ext=".png", size=tmp.stat().st_size, name="a.png"))
+    builder = VariantBuilder(store, [(200, 200)])
+    builder._pool = SyncPool(after and (lambda: after(store)))
+    return store, builder, entry
+
+
+def test_build_attaches_variants(tmp_path):
+    store, builder, entry = _builder(tmp_path)
+    asyncio.run(builder._build(entry))
+    assert [v["filename"] for v in store.entries[H].variants] == [f"{H}.200x150.webp"]
+    assert store.resolve("image", f"{H}.200x150.webp") is not None
+
+
+def test_variants_of_a_deleted_entry_are_removed(tmp_path):
+    store, builder, entry = _builder(tmp_path, after=lambda s: s._delete_sync(H))
+    asyncio.run(builder._build(entry))
+    assert H not in store.entries
+    assert not (tmp_path / "images" / "cc").exists()        # variantes et préfixes vides supprimés
+
+
+def test_notice_carries_variants_when_ready(server, fresh_limiter, monkeypatch):
+    main, client = server
+    builder = VariantBuilder(main.store, [(200, 200)])
+    builder._pool = SyncPool()
+    monkeypatch.setattr(main, "variants", builder)
+    data = _png()                                   # > INLINE_MAX_BYTES : notice "pull", variantes attendues
+    r = client.post("/upload/", data={"display_time": "1"}, files={"file": ("v.png", data, "image/png")})
+    assert r.status_code == 200, r.text
+    filename = r.json()["filename"]
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        seq = main.notices.seq.current
+        notice = next((n for n in main.notices.replay.since(seq - 1, seq) or () if n["filename"] == filename), None)
+        if notice:
+            break
+        time.sleep(0.01)
+    assert (notice["width"], notice["height"]) == (400, 300)
+    assert [v["w"] for v in notice["variants"]] == [200]
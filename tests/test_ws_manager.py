@@ -0,0 +1,128 @@
+import asyncio, json, time, types
+
+from livetchat.server.ws_manager import (ConnectionManager, _Conn, POLICY_DROP, POLICY_DEGRADE,
+                                         POLICY_DISCONNECT, AUDIENCE_FRAMES)
+
+
+class FakeWS:
+    def __init__(self):
+        self.client = types.SimpleNamespace(host="127.0.0.1", port=1234)
+        self.closed = None
+
+    async def close(self, code=1000):
+        self.closed = code
+
+
+def _setup(policy, max_queue_bytes=100, frames=False):
+    """Connexion sans tâche d'écriture : la file ne se vide pas (client qui ne lit plus)."""
+    m = ConnectionManager(max_queue_bytes=max_queue_bytes, max_lag_s=10, slow_policy=policy)
+    c = _Conn(FakeWS())
+    c.frames = frames
+    m.active[c.ws] = c
+    return m, c
+
+
+def test_drop_policy_drops_overflow_only():
+    m, c = _setup(POLICY_DROP)
+    m._enqueue(c, True, b"x" * 80, True, 0.0)
+    m._enqueue(c, True, b"x" * 30, True, 0.0)      # déborde : jetée
+    m._enqueue(c, False, "y" * 20, False, 0.0)     # tient encore
+    assert (len(c.queue), c.queued_bytes, c.dropped) == (2, 100, 1)
+    assert c.ws in m.active
+
+
+def test_degrade_policy_keeps_notices():
+    m, c = _setup(POLICY_DEGRADE)
+    m._enqueue(c, True, b"x" * 80, True, 0.0)
+    m._enqueue(c, True, b"x" * 30, True, 0.0)      # bulk qui déborde -> dégradé
+    assert c.degraded and c.dropped == 1
+    m._enqueue(c, True, b"x" * 5, True, 0.0)       # bulk suivant jeté même s'il tient
+    assert c.dropped == 2
+    m._enqueue(c, False, "n" * 50, False, 0.0)     # notice : passe jusqu'à 2x la limite
+    assert c.queued_bytes == 130 and c.ws in m.active
+
+
+def test_degrade_policy_disconnects_past_twice_the_limit():
+    async def scenario():
+        m, c = _setup(POLICY_DEGRADE)
+        m._enqueue(c, True, b"x" * 90, True, 0.0)
+        m._enqueue(c, False, "n" * 111, False, 0.0)
+        await asyncio.sleep(0)
+        return m, c
+    m, c = asyncio.run(scenario())
+    assert c.ws not in m.active and c.ws.closed == 1013 and not c.queue
+
+
+def test_disconnect_policy():
+    async def scenario():
+        m, c = _setup(POLICY_DISCONNECT)
+        m._enqueue(c, False, "n" * 101, False, 0.0)
+        await asyncio.sleep(0)
+        return m, c
+    m, c = asyncio.run(scenario())
+    assert c.ws not in m.active and c.ws.closed == 1013
+
+
+def test_lag_counts_as_slow():
+    m, c = _setup(POLICY_DROP, max_queue_bytes=10**6)
+    m._enqueue(c, False, "a", False, 0.0)
+    m._enqueue(c, False, "b", False, 11.0)         # tête en file depuis 11 s > max_lag_s
+    assert len(c.queue) == 1 and c.dropped == 1
+
+
+def test_fanout_respects_audience():
+    m, legacy = _setup(POLICY_DROP)
+    framed = _Conn(FakeWS()); framed.frames = True
+    m.active[framed.ws] = framed
+    m._fanout(True, b"f", None, True, audience=AUDIENCE_FRAMES)
+    m._fanout(False, "all", None, False)
+    assert [e[1] for e in framed.queue] == [b"f", "all"]
+    assert [e[1] for e in legacy.queue] == ["all"]
+
+
+def test_time_sync_jumps_queue_and_is_rate_limited():
+    m, c = _setup(POLICY_DROP, max_queue_bytes=10**6)
+    t = time.monotonic()
+    m._enqueue(c, True, b"chunk", True, t)
+    m.time_sync(c.ws, {"t0": 1, "offset_ms": 12.34}, 2.0)
+    head = c.queue[0]
+    assert json.loads(head[1])["type"] == "time_sync" and head[4] == t   # garde l'horodatage de la file
+    assert c.clock_offset_ms == 12.3
+    m.time_sync(c.ws, {"t0": 2}, 3.0)                 # trop rapproché : ignoré
+    assert len(c.queue) == 2
+
+
+def test_time_sync_stays_under_queue_limits():
+    m, c = _setup(POLICY_DROP)
+    m._enqueue(c, True, b"x" * 100, True, time.monotonic())
+    m.time_sync(c.ws, {"t0": 1}, 2.0)
+    assert len(c.queue) == 1 and c.dropped == 1
+
+
+def test_heartbeat_reaps_silent_clients_and_pings_the_others():
+    async def scenario():
+        m, stale = _setup(POLICY_DROP, max_queue_bytes=10**6)
+        fresh = _Conn(FakeWS())
+        m.active[fresh.ws] = fresh
+        legacy = _Conn(FakeWS())                      # n'a jamais répondu : laissé aux pings protocolaires
+        m.active[legacy.ws] = legacy
+        stale.heartbeat = fresh.heartbeat = True
+        stale.last_seen = legacy.last_seen = time.monotonic() - 60
+        m.start_heartbeat(0.01, 1.0)
+        await asyncio.sleep(0.05)
+        m._reaper.cancel()
+        await asyncio.sleep(0)                        # fermeture lancée en tâche de fond
+        return m, stale, fresh, legacy
+    m, stale, fresh, legacy = asyncio.run(scenario())
+    assert stale.ws not in m.active and stale.ws.closed == 1001
+    assert fresh.ws in m.active and legacy.ws in m.active
+    assert json.loads(fresh.queue[0][1])["type"] == "ping"
+
+
+def test_pong_refreshes_last_seen():
+    m, c = _setup(POLICY_DROP)
+    c.last_seen = time.monotonic() - 60
+    m.seen(c.ws, pong_t=int(time.time() * 1000) - 40)
+    assert time.monotonic() - c.last_seen < 1 and c.heartbeat and 40 <= c.rtt_ms < 1000
+    m.start_heartbeat(0, 1.0)                         # 0 = désactivé
+    assert m._reaper is None